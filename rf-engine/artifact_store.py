@@ -0,0 +1,46 @@
+import hashlib
+import re
+
+# Content-addressed ids: same bytes, same id
+_ARTIFACT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ArtifactStore:
+    """
+    Large task outputs (rasters, images) kept in Redis next to the task
+    instead of inside its JSON result. Tasks return the id; clients fetch
+    the bytes from GET /artifacts/{id} with the stored content type.
+    Entries expire after ttl seconds.
+    """
+
+    def __init__(self, redis_client, ttl=24 * 60 * 60):
+        self.redis = redis_client
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(artifact_id):
+        return f"artifact:{artifact_id}"
+
+    @staticmethod
+    def is_valid_id(artifact_id):
+        return bool(_ARTIFACT_ID.match(artifact_id or ""))
+
+    def put(self, data, content_type):
+        artifact_id = hashlib.sha256(data).hexdigest()[:32]
+        key = self._key(artifact_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(key, mapping={"content_type": content_type, "data": data})
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        return artifact_id
+
+    def get(self, artifact_id):
+        """
+        Returns (bytes, content_type), or None when unknown or expired.
+        """
+        if not self.is_valid_id(artifact_id):
+            return None
+        entry = self.redis.hgetall(self._key(artifact_id))
+        if not entry or b"data" not in entry:
+            return None
+        return entry[b"data"], entry.get(b"content_type", b"application/octet-stream").decode()
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker for an upstream dependency.
+
+    closed    -> calls go through; opens once at least min_calls outcomes in
+                 the window and the error rate reaches error_rate
+    open      -> calls fail fast for open_seconds
+    half_open -> one trial call; success closes, failure re-opens
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, error_rate=0.5, min_calls=5, window_seconds=60.0, open_seconds=30.0):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._outcomes = deque()  # (timestamp, ok)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._state
+
+    def allow(self):
+        """
+        Returns True if a call may be attempted now.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._trial_in_flight = False
+                self._outcomes.clear()
+                return
+            self._record(time.monotonic(), True)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+            self._record(now, False)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._open(now)
+
+    def stats(self):
+        with self._lock:
+            self._refresh(time.monotonic())
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "window_calls": len(self._outcomes),
+                "window_failures": failures
+            }
+
+    def _record(self, now, ok):
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._trial_in_flight = False
+        self._outcomes.clear()
+
+    def _refresh(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
@@ -1,13 +1,18 @@
+import logging
 import numpy as np
 import math
 import heapq
 import rf_physics
-from rf_physics import haversine_distance, calculate_path_loss
+from core.coverage import bitmap
+from core.selection import select_sites
+from rf_physics import calculate_path_loss
 
-def calculate_viewshed(tile_manager, tx_lat, tx_lon, tx_h, radius_m, rx_h=2.0, freq_mhz=915.0, resolution_m=30, model='bullington'):
+logger = logging.getLogger(__name__)
+
+def _profile_grid(tx_lat, tx_lon, radius_m, resolution_m):
     """
-    Calculate viewshed for a single point.
-    Returns: (lat_grid, lon_grid, visibility_grid)
+    Grid shared by the per-pixel engines.
+    Returns (lats, lons, dist_grid, cell_r, cell_c) - the cells to evaluate.
     """
     # 1. Define Bounds
     lat_deg_per_m = 1 / 111320.0
@@ -38,96 +43,220 @@ def calculate_viewshed(tile_manager, tx_lat, tx_lon, tx_h, radius_m, rx_h=2.0, f
     lats = np.linspace(min_lat, max_lat, rows)
     lons = np.linspace(min_lon, max_lon, cols)
     
-    grid = np.zeros((rows, cols))
-    
-    # 3. Iterate and Check LOS
-    # This is O(N*M), where N*M ~ 2500-10000. 
-    # Profile fetch is expensive.
+    lat_grid, lon_grid = np.meshgrid(lats, lons, indexing='ij')
+    dist_grid = rf_physics.haversine_distance_batch(tx_lat, tx_lon, lat_grid, lon_grid)
+    cell_r, cell_c = np.nonzero((dist_grid <= radius_m) & (dist_grid >= 10))
+    return lats, lons, dist_grid, cell_r, cell_c
+
+def _profile_chunks(tile_manager, tx_lat, tx_lon, lats, lons, cell_r, cell_c, samples=15, chunk=4096):
+    """
+    Yields (r, c, profiles) for chunks of cells: one profile lookup per chunk.
+    A chunk whose lookup fails is skipped, leaving its cells unevaluated.
+    """
+    for i in range(0, len(cell_r), chunk):
+        r = cell_r[i:i + chunk]
+        c = cell_c[i:i + chunk]
+        ends = np.column_stack((lats[r], lons[c]))
+        starts = np.broadcast_to((tx_lat, tx_lon), ends.shape)
+        try:
+            profiles = tile_manager.get_elevation_profiles(starts, ends, samples=samples)
+        except Exception as e:
+            logger.warning(f"Profile lookup failed for {len(r)} cells: {e}")
+            continue
+        yield r, c, profiles
+
+def calculate_viewshed(tile_manager, tx_lat, tx_lon, tx_h, radius_m, rx_h=2.0, freq_mhz=915.0, resolution_m=30, model='bullington', k_factor=1.333, clutter_height=0.0):
+    """
+    Calculate viewshed for a single point.
+    Returns: (lat_grid, lon_grid, visibility_grid)
+    """
+    lats, lons, dist_grid, cell_r, cell_c = _profile_grid(tx_lat, tx_lon, radius_m, resolution_m)
+    grid = np.zeros((len(lats), len(lons)))
     
-    # Optimization: Only check points within radius
-    for r in range(rows):
-        for c in range(cols):
-            # Distance Check
-            dist_m = haversine_distance(tx_lat, tx_lon, lats[r], lons[c])
-            if dist_m > radius_m or dist_m < 10: 
-                continue
-            
-            # Get Profile
-            # Use fewer samples for speed (e.g. 15). 
-            # 15 samples over 5km = ~300m resolution profile. sufficient for large obstacles.
-            try:
-                profile = tile_manager.get_elevation_profile(
-                    tx_lat, tx_lon, lats[r], lons[c], samples=15
-                )
-                
-                # Analyze Link
-                # True LOS check via analyze_link (checks Fresnel/Clearance)
-                # If we want pure Visual LOS, we check if min_clearance_ratio >= 0 (ignoring Fresnel zone size, just line)
-                # analyze_link calculates clearance relative to Fresnel zone.
-                # If we strictly want Visual LOS: clearance > 0.
-                # analyze_link returns 'min_clearance_ratio' = clearance / fresnel_radius
-                # So ratio >= 0 means clearance >= 0 means Visible.
-                
-                link = rf_physics.analyze_link(profile, dist_m, freq_mhz, tx_h, rx_h)
-                
-                if link['min_clearance_ratio'] >= 0.0:
-                    grid[r, c] = 1.0 # Visible
-                    
-            except Exception as e:
-                # Fallback or skip
-                continue
+    # 3. Check LOS for every cell within radius in batches: one profile
+    # lookup and one analyze_links_batch pass per chunk of cells.
+    # Use fewer samples for speed (e.g. 15). 
+    # 15 samples over 5km = ~300m resolution profile. sufficient for large obstacles.
+    for r, c, profiles in _profile_chunks(tile_manager, tx_lat, tx_lon, lats, lons, cell_r, cell_c):
+        # min_clearance_ratio = clearance / fresnel_radius, so ratio >= 0
+        # means the LOS line clears the terrain: Visible
+        links = rf_physics.analyze_links_batch(
+            profiles, dist_grid[r, c], freq_mhz, tx_h, rx_h,
+            k_factor=k_factor, clutter_height=clutter_height, model=None # visibility only
+        )
+        # A profile with unknown (NaN) terrain cannot prove visibility
+        known = np.isfinite(profiles).all(axis=1)
+        grid[r, c] = ((links['min_clearance_ratio'] >= 0.0) & known).astype(float)
             
     return grid, lats, lons
 
-def greedy_coverage(tile_manager, candidates, n_select, radius_m=5000, rx_h=2.0, freq_mhz=915.0, model='bullington'):
+def calculate_rssi_grid(tile_manager, tx_lat, tx_lon, tx_h, radius_m, rx_h=2.0, freq_mhz=915.0, resolution_m=30, model='bullington', k_factor=1.333, clutter_height=0.0,
+                        tx_power_dbm=20.0, tx_gain_dbi=2.15, rx_gain_dbi=2.15, environment='suburban', itm_params=None):
+    """
+    Received signal strength for a single point, same grid as calculate_viewshed.
+    RSSI = tx power + gains - path loss (selected model).
+    Returns: (rssi_grid float32 dBm, NaN outside the radius, lats, lons)
+    """
+    lats, lons, dist_grid, cell_r, cell_c = _profile_grid(tx_lat, tx_lon, radius_m, resolution_m)
+    grid = np.full((len(lats), len(lons)), np.nan, dtype=np.float32)
+    budget = tx_power_dbm + tx_gain_dbi + rx_gain_dbi
+    
+    for r, c, profiles in _profile_chunks(tile_manager, tx_lat, tx_lon, lats, lons, cell_r, cell_c):
+        loss = rf_physics.calculate_path_loss_batch(
+            dist_grid[r, c], profiles, freq_mhz, tx_h, rx_h,
+            model=model, environment=environment, k_factor=k_factor,
+            clutter_height=clutter_height, itm_params=itm_params
+        )
+        grid[r, c] = budget - loss
+    
+    return grid, lats, lons
+
+def calculate_viewshed_radial(tile_manager, tx_lat, tx_lon, tx_h, radius_m, rx_h=2.0, freq_mhz=915.0, resolution_m=30, model='bullington', k_factor=1.333, clutter_height=0.0):
+    """
+    Calculate viewshed for a single point using a radial line-of-sight sweep.
+    The terrain window is loaded once as a raster and visibility is propagated
+    outwards along rays to every border cell (R2 sweep), carrying the maximum
+    elevation angle seen so far instead of re-analyzing a profile per cell.
+    Returns: (visibility_grid, lats, lons) - same contract as calculate_viewshed.
+    """
+    # 1. Define Bounds
+    lat_deg_per_m = 1 / 111320.0
+    lon_deg_per_m = 1 / (111320.0 * math.cos(math.radians(tx_lat)))
+
+    lat_radius = radius_m * lat_deg_per_m
+    lon_radius = radius_m * lon_deg_per_m
+
+    min_lat, max_lat = tx_lat - lat_radius, tx_lat + lat_radius
+    min_lon, max_lon = tx_lon - lon_radius, tx_lon + lon_radius
+
+    # 2. Define Grid Resolution
+    # The sweep is cheap enough to go finer than the per-pixel engine,
+    # so the grid is capped by dimension instead of by a 100m floor.
+    MAX_DIM = 1024
+    eff_res_m = max(float(resolution_m), (2 * radius_m) / MAX_DIM)
+
+    rows = max(3, int((max_lat - min_lat) / (eff_res_m * lat_deg_per_m)))
+    cols = max(3, int((max_lon - min_lon) / (eff_res_m * lon_deg_per_m)))
+
+    lats = np.linspace(min_lat, max_lat, rows)
+    lons = np.linspace(min_lon, max_lon, cols)
+
+    # 3. Load terrain window once (plus the exact TX point)
+    elev = tile_manager.get_elevation_grid(lats, lons)
+    tx_ground = tile_manager.get_elevations_batch([(tx_lat, tx_lon)])[0]
+
+    # Local metric offsets of every cell from the transmitter
+    dy_m = (lats - tx_lat) / lat_deg_per_m
+    dx_m = (lons - tx_lon) / lon_deg_per_m
+    dist_m = np.sqrt(dy_m[:, None] ** 2 + dx_m[None, :] ** 2)
+
+    r0 = (tx_lat - min_lat) / (max_lat - min_lat) * (rows - 1)
+    c0 = (tx_lon - min_lon) / (max_lon - min_lon) * (cols - 1)
+
+    visible = _radial_sweep(
+        elev, dist_m, r0, c0, tx_ground + tx_h, rx_h,
+        k_factor=k_factor, clutter_height=clutter_height
+    )
+
+    # Same footprint rules as the per-pixel engine
+    visible &= (dist_m <= radius_m) & (dist_m >= 10)
+
+    return visible.astype(np.float64), lats, lons
+
+def _radial_sweep(elev, dist_m, r0, c0, tx_alt, rx_h, k_factor=1.333, clutter_height=0.0):
+    """
+    R2-style visibility sweep over an elevation raster.
+    elev/dist_m: (rows, cols) terrain heights and distances from the TX.
+    r0, c0: fractional raster position of the TX.
+    Returns a boolean (rows, cols) visibility mask.
+
+    Earth curvature is folded into the heights (h - d^2 / 2R), which makes the
+    bulge-corrected clearance test of analyze_link equivalent to comparing
+    elevation slopes from the TX: a target is visible when its slope is at
+    least the maximum terrain slope of every cell before it on the ray.
+    """
+    rows, cols = elev.shape
+    R_eff = k_factor * rf_physics.EARTH_RADIUS_KM * 1000
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        adjusted = elev - (dist_m ** 2) / (2 * R_eff)
+        terrain_slope = (adjusted + clutter_height - tx_alt) / dist_m
+        target_slope = (adjusted + rx_h - tx_alt) / dist_m
+    terrain_slope[dist_m <= 0] = -np.inf
+    target_slope[dist_m <= 0] = -np.inf
+
+    # Rays towards every border cell
+    border = np.zeros((rows, cols), dtype=bool)
+    border[[0, -1], :] = True
+    border[:, [0, -1]] = True
+    border_r, border_c = np.nonzero(border)
+    border_r = border_r.astype(np.float64)
+    border_c = border_c.astype(np.float64)
+
+    span = np.maximum(np.abs(border_r - r0), np.abs(border_c - c0))
+    span = np.maximum(span, 1.0)
+    n_steps = int(np.ceil(span.max()))
+
+    # (n_rays, n_steps) sample positions, one cell apart along the major axis,
+    # starting with the cell that contains the TX
+    k = np.arange(0, n_steps + 1)[None, :]
+    frac = k / span[:, None]
+    in_ray = frac <= 1.0 + 1e-9
+    frac = np.minimum(frac, 1.0)
+
+    # Round half up: with the TX on a half cell, rint's round-half-even
+    # would skip every other column along the ray
+    ri = np.floor(r0 + (border_r[:, None] - r0) * frac + 0.5).astype(np.int64)
+    ci = np.floor(c0 + (border_c[:, None] - c0) * frac + 0.5).astype(np.int64)
+    ri = np.clip(ri, 0, rows - 1)
+    ci = np.clip(ci, 0, cols - 1)
+    flat_idx = ri * cols + ci
+
+    # Rounding can land on the same cell twice in a row; keep the first hit
+    repeat = np.zeros_like(in_ray)
+    repeat[:, 1:] = flat_idx[:, 1:] == flat_idx[:, :-1]
+    valid = in_ray & ~repeat
+
+    ray_terrain = np.where(valid, terrain_slope.ravel()[flat_idx], -np.inf)
+    ray_target = target_slope.ravel()[flat_idx]
+
+    # Horizon seen before each sample: running max of terrain slopes
+    horizon = np.maximum.accumulate(ray_terrain, axis=1)
+    horizon_before = np.empty_like(horizon)
+    horizon_before[:, 0] = -np.inf
+    horizon_before[:, 1:] = horizon[:, :-1]
+
+    hits = valid & (ray_target >= horizon_before)
+
+    visible = np.zeros(rows * cols, dtype=bool)
+    visible[flat_idx[hits]] = True
+    return visible.reshape(rows, cols)
+
+def greedy_coverage(tile_manager, candidates, n_select, radius_m=5000, rx_h=2.0, freq_mhz=915.0, model='bullington', method='lazy'):
     """
     Select N nodes that maximize coverage area.
     candidates: List of NodeConfig objects
+    method: see core.selection.select_sites
     """
-    selected_indices = []
-    current_coverage = set() # Set of covered grid indices (global coordinate space?)
-    
-    # Pre-calculate individual viewsheds
+    # Pre-calculate individual viewsheds as covered buckets:
+    # round lat/lon to ~100m precision (3 decimal places) so grids from
+    # different candidates line up
     viewsheds = []
     for node in candidates:
         grid, grid_lats, grid_lons = calculate_viewshed(
             tile_manager, node.lat, node.lon, node.height, radius_m,
             rx_h=rx_h, freq_mhz=freq_mhz, model=model
         )
-        # Store as set of "covered buckets" to allow union
-        # Simple bucket hashing: (lat_idx, lon_idx) approx
-        covered_points = set()
-        rows, cols = grid.shape
-        for r in range(rows):
-            for c in range(cols):
-                if grid[r, c] > 0:
-                    # Create a unique spatially aware hash
-                    # Round lat/lon to ~100m precision (3 decimal places)
-                    lat_key = round(grid_lats[r], 3)
-                    lon_key = round(grid_lons[c], 3)
-                    covered_points.add((lat_key, lon_key))
-        viewsheds.append(covered_points)
-        
-    # Greedy Selection
-    for _ in range(n_select):
-        best_idx = -1
-        best_gain = 0
-        
-        for i in range(len(candidates)):
-            if i in selected_indices: continue
-            
-            # Calculate gain (marginal coverage)
-            new_points = viewsheds[i] - current_coverage
-            gain = len(new_points)
-            
-            if gain > best_gain:
-                best_gain = gain
-                best_idx = i
-                
-        if best_idx != -1:
-            selected_indices.append(best_idx)
-            current_coverage.update(viewsheds[best_idx])
-        else:
-            break
-            
-    return [candidates[i] for i in selected_indices]
+        rows_idx, cols_idx = np.nonzero(grid > 0)
+        viewsheds.append(np.column_stack((np.round(grid_lats[rows_idx], 3), np.round(grid_lons[cols_idx], 3))))
+    if not viewsheds:
+        return []
+    
+    # Number the buckets, then one bitmap per candidate
+    buckets, bucket_idx = np.unique(np.concatenate(viewsheds), axis=0, return_inverse=True)
+    bucket_idx = np.asarray(bucket_idx).ravel()
+    bounds = np.cumsum([0] + [len(v) for v in viewsheds])
+    bitmaps = [bitmap(bucket_idx[bounds[i]:bounds[i + 1]], len(buckets)) for i in range(len(candidates))]
+    
+    picked = select_sites(bitmaps, n_select, method=method)
+    return [candidates[i] for i in picked['indices']]
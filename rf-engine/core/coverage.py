@@ -0,0 +1,63 @@
+import numpy as np
+
+# Set bits per byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class MasterGrid:
+    """
+    Geometry of the composite raster (row 0 = north) plus packed-bitmap
+    helpers for coverage on it. A bitmap is a uint8 array of
+    ceil(rows * cols / 8) bytes, one bit per master pixel.
+    """
+
+    def __init__(self, min_lat, max_lat, min_lon, max_lon, rows, cols):
+        self.min_lat = min_lat
+        self.max_lat = max_lat
+        self.min_lon = min_lon
+        self.max_lon = max_lon
+        self.rows = rows
+        self.cols = cols
+
+    @property
+    def size(self):
+        return self.rows * self.cols
+
+    def project(self, grid_lats, grid_lons):
+        """
+        Flat master-pixel index for every cell of a node grid, shape
+        (len(grid_lats), len(grid_lons)); -1 where the cell falls outside.
+        """
+        y = ((self.max_lat - np.asarray(grid_lats)) / (self.max_lat - self.min_lat) * (self.rows - 1)).astype(int)
+        x = ((np.asarray(grid_lons) - self.min_lon) / (self.max_lon - self.min_lon) * (self.cols - 1)).astype(int)
+        inside = ((y >= 0) & (y < self.rows))[:, None] & ((x >= 0) & (x < self.cols))[None, :]
+        return np.where(inside, y[:, None] * self.cols + x[None, :], -1)
+
+    def empty(self):
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def bitmap(self, flat_idx):
+        return bitmap(flat_idx, self.size)
+
+    def to_mask(self, bits):
+        return np.unpackbits(bits, count=self.size).astype(bool).reshape(self.rows, self.cols)
+
+
+def bitmap(flat_idx, size):
+    """
+    Packed bitmap of size bits with flat_idx set.
+    """
+    mask = np.zeros(size, dtype=bool)
+    mask[flat_idx] = True
+    return np.packbits(mask)
+
+
+def popcount(bits):
+    return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+
+def marginal_gain(bits, covered):
+    """
+    Pixels in bits that are not already covered.
+    """
+    return popcount(bits & ~covered)
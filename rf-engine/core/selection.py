@@ -0,0 +1,109 @@
+import heapq
+import math
+
+import numpy as np
+
+from core.coverage import marginal_gain, popcount
+
+# Greedy guarantee for monotone submodular coverage: f(S) >= (1 - 1/e) * OPT
+GREEDY_GUARANTEE = 1.0 - 1.0 / math.e
+
+METHODS = ('greedy', 'lazy', 'stochastic')
+
+
+def select_sites(bitmaps, k, method='lazy', epsilon=0.1, seed=None):
+    """
+    Pick up to k coverage bitmaps (core.coverage packed bits) maximizing the
+    union, stopping early once no candidate adds anything.
+
+    method:
+      'greedy'     - evaluate every remaining candidate each round
+      'lazy'       - CELF: same picks as 'greedy' (ties to the lowest index), but
+                     candidates are kept in a max-heap of stale gains, which stay
+                     upper bounds by submodularity, and only the top is re-evaluated
+      'stochastic' - each round evaluates a random sample of
+                     ceil(n / k * ln(1 / epsilon)) candidates; (1 - 1/e - epsilon)
+                     in expectation
+
+    Returns {"indices", "gains", "covered", "coverage", "evaluations",
+    "evaluations_saved", "guarantee", "upper_bound"}. upper_bound caps the
+    optimal coverage: the tighter of coverage / guarantee and coverage plus the
+    k largest gains still possible (exact for 'greedy', stale bounds for 'lazy').
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown selection method '{method}'. Expected one of {METHODS}")
+
+    n = len(bitmaps)
+    k = min(int(k), n)
+    covered = np.zeros_like(bitmaps[0]) if n else np.zeros(0, dtype=np.uint8)
+    indices, gains = [], []
+    evaluations = 0
+    residual = None  # upper bounds on each candidate's gain w.r.t. the final selection
+
+    if method == 'lazy':
+        # (-gain, idx, round the gain was computed in)
+        heap = [(-popcount(bits), i, 0) for i, bits in enumerate(bitmaps)]
+        evaluations += n
+        heapq.heapify(heap)
+        for rnd in range(k):
+            while heap:
+                neg_gain, i, fresh_in = heap[0]
+                if fresh_in == rnd:
+                    break
+                evaluations += 1
+                heapq.heapreplace(heap, (-marginal_gain(bitmaps[i], covered), i, rnd))
+            if not heap or heap[0][0] >= 0:
+                break
+            neg_gain, i, _ = heapq.heappop(heap)
+            indices.append(i)
+            gains.append(-neg_gain)
+            covered |= bitmaps[i]
+        residual = [-g for g, _, _ in heap]
+    else:
+        rng = np.random.default_rng(seed)
+        remaining = list(range(n))
+        sample_size = n
+        if method == 'stochastic' and k > 0:
+            sample_size = min(n, max(1, math.ceil(n / k * math.log(1.0 / epsilon))))
+
+        for _ in range(k):
+            pool = remaining
+            if len(remaining) > sample_size:
+                pool = sorted(rng.choice(remaining, size=sample_size, replace=False).tolist())
+
+            best_idx, best_gain = -1, 0
+            for i in pool:
+                gain = marginal_gain(bitmaps[i], covered)
+                evaluations += 1
+                if gain > best_gain:
+                    best_idx, best_gain = i, gain
+            if best_idx == -1:
+                break
+            indices.append(best_idx)
+            gains.append(best_gain)
+            covered |= bitmaps[best_idx]
+            remaining.remove(best_idx)
+
+        if method == 'greedy':
+            residual = [marginal_gain(bitmaps[i], covered) for i in remaining]
+
+    # What plain greedy would have evaluated for the same number of rounds
+    rounds = len(indices) + (1 if len(indices) < k else 0)
+    naive = sum(n - r for r in range(rounds))
+
+    coverage = popcount(covered) if n else 0
+    guarantee = GREEDY_GUARANTEE - (epsilon if method == 'stochastic' else 0.0)
+    upper_bound = coverage / guarantee if guarantee > 0 else float('inf')
+    if residual is not None:
+        upper_bound = min(upper_bound, coverage + sum(sorted(residual, reverse=True)[:k]))
+
+    return {
+        "indices": indices,
+        "gains": gains,
+        "covered": covered,
+        "coverage": coverage,
+        "evaluations": evaluations,
+        "evaluations_saved": max(0, naive - evaluations),
+        "guarantee": guarantee,
+        "upper_bound": upper_bound
+    }
@@ -0,0 +1,87 @@
+import numpy as np
+import scipy.ndimage
+
+PROMINENCE_METHODS = ('focal', 'topographic')
+
+# 8-connected neighbour offsets
+_NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def focal_prominence(elev, window_rows, window_cols):
+    """
+    Height of every cell above the mean of the (window_rows x window_cols)
+    box around it, clamped at 0. Same approximation as
+    OptimizationService.calculate_prominence, for a whole raster at once.
+    Edges repeat the border cells.
+    """
+    elev = np.asarray(elev, dtype=np.float64)
+    mean = scipy.ndimage.uniform_filter(elev, size=(window_rows, window_cols), mode='nearest')
+    return np.maximum(elev - mean, 0.0)
+
+
+def topographic_prominence(elev):
+    """
+    True topographic prominence of every summit of the raster: the summit's
+    height above its key col, the highest saddle it must descend to before
+    reaching higher ground. Every other cell gets 0.
+
+    Cells are added from the highest down and joined into 8-connected
+    components (union-find). Each component keeps its highest cell. When a cell
+    joins components, it is their col. Every component except the one with the
+    highest summit ends there, and its summit's prominence is summit - col.
+    Summits whose key col lies outside the raster are measured down to the
+    raster's lowest cell.
+    """
+    elev = np.asarray(elev, dtype=np.float64)
+    rows, cols = elev.shape
+    flat = elev.ravel()
+    prominence = np.zeros(flat.size)
+    if flat.size == 0:
+        return prominence.reshape(elev.shape)
+
+    parent = [-1] * flat.size  # -1: not added yet
+    summit = {}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for idx in np.argsort(-flat, kind='stable').tolist():
+        r, c = divmod(idx, cols)
+        roots = set()
+        for dr, dc in _NEIGHBOURS:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < rows and 0 <= nc < cols:
+                nb = nr * cols + nc
+                if parent[nb] != -1:
+                    roots.add(find(nb))
+        if not roots:
+            parent[idx] = idx
+            summit[idx] = idx
+            continue
+
+        main = max(roots, key=lambda root: (flat[summit[root]], -summit[root]))
+        for root in roots:
+            if root != main:
+                peak = summit.pop(root)
+                prominence[peak] = flat[peak] - flat[idx]
+                parent[root] = main
+        parent[idx] = main
+
+    floor = flat.min()
+    for peak in summit.values():
+        prominence[peak] = flat[peak] - floor
+    return prominence.reshape(elev.shape)
+
+
+def sample_grid(grid, lats, lons, at_lats, at_lons, order=1):
+    """
+    Sample a raster on ascending lats/lons axes at arbitrary points, bilinear
+    (order=1) or nearest cell (order=0). Points outside the raster take the
+    nearest edge value.
+    """
+    r = np.interp(np.asarray(at_lats, dtype=np.float64), lats, np.arange(len(lats)))
+    c = np.interp(np.asarray(at_lons, dtype=np.float64), lons, np.arange(len(lons)))
+    return scipy.ndimage.map_coordinates(np.asarray(grid, dtype=np.float64), [r, c], order=order, mode='nearest')
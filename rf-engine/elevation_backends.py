@@ -0,0 +1,321 @@
+import abc
+import glob
+import logging
+import math
+import os
+import re
+import threading
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+# SRTM-style file name: lower-left (south-west) corner, e.g. N45W123.hgt
+_CORNER_RE = re.compile(r"([NS])(\d{1,2})([EW])(\d{1,3})", re.IGNORECASE)
+
+
+class OpenTopoDataBackend:
+    """
+    Elevation points from an OpenTopoData HTTP service.
+    Supports custom OpenTopoData instances via ELEVATION_API_URL env variable.
+
+    OpenTopoData supports batch requests (up to 100 points per call),
+    which reduces API calls significantly compared to individual point queries.
+    """
+    name = "opentopodata"
+
+    def __init__(self, session, executor, base_url=None, dataset=None):
+        self.session = session
+        self.executor = executor
+        self.base_url = base_url or os.environ.get('ELEVATION_API_URL', 'http://opentopodata:5000')
+        self.dataset = dataset or os.environ.get('ELEVATION_DATASET', 'srtm30m')
+
+    def fetch_points(self, lats, lons):
+        """
+        Returns an ndarray of elevations for the given points, or None if any
+        batch failed.
+        """
+        # OpenTopoData supports up to 100 locations per request
+        batch_size = 100
+
+        batches = []
+        for i in range(0, len(lats), batch_size):
+            batch_lats = lats[i:i + batch_size]
+            batch_lons = lons[i:i + batch_size]
+            locations = "|".join([f"{lat},{lon}" for lat, lon in zip(batch_lats, batch_lons)])
+            batches.append(locations)
+
+        url = f"{self.base_url}/v1/{self.dataset}"
+        dataset = self.dataset
+        base_url = self.base_url
+
+        def fetch_batch(locations, batch_num):
+            try:
+                # No artificial delay needed for local deployments
+                response = self.session.get(
+                    url,
+                    params={'locations': locations},
+                    timeout=10
+                )
+
+                if response.status_code == 200:
+                    data = response.json()
+                    if data.get('status') == 'OK' and 'results' in data:
+                        # No-data points (e.g. ocean) come back as null
+                        return [result.get('elevation') or 0.0 for result in data['results']]
+                    else:
+                        error_msg = data.get('error', 'Unknown error')
+                        logger.error(f"OpenTopoData batch {batch_num} error: {error_msg}")
+                        return None
+                elif response.status_code == 404:
+                    logger.error(f"Dataset '{dataset}' not found. Check ELEVATION_DATASET env var and data files.")
+                    return None
+                else:
+                    logger.warning(f"OpenTopoData batch {batch_num} failed with status {response.status_code}")
+                    return None
+
+            except requests.exceptions.Timeout:
+                logger.error(f"OpenTopoData request timed out for batch {batch_num}")
+                return None
+            except requests.exceptions.ConnectionError:
+                logger.error(f"Cannot connect to OpenTopoData at {base_url}. Is the container running?")
+                return None
+            except Exception as e:
+                logger.error(f"Exception fetching OpenTopoData batch {batch_num}: {e}")
+                return None
+
+        # Execute batches in parallel
+        futures = [self.executor.submit(fetch_batch, locs, i) for i, locs in enumerate(batches)]
+
+        all_elevations = []
+        for future in futures:
+            batch_result = future.result()
+            if batch_result is None:
+                return None
+            all_elevations.extend(batch_result)
+
+        if len(all_elevations) != len(lats):
+            logger.error(f"Expected {len(lats)} elevation points, got {len(all_elevations)}")
+            return None
+        return np.array(all_elevations, dtype=np.float32)
+
+
+class _DEMFile(abc.ABC):
+    """
+    One raster of a local dataset. Rows run north to south.
+    Pixel (row, col) sits at lat = top - (row + center) * yres,
+    lon = left + (col + center) * xres, where center is 0.5 for area
+    pixels (GeoTIFF) and 0 for point samples (HGT).
+
+    The backend is built at import, before Celery's prefork workers fork,
+    so the file itself is opened lazily, once per process (handle()).
+    """
+
+    def __init__(self, path, left, bottom, right, top, xres, yres, center, nodata):
+        self.path = path
+        self.left, self.bottom, self.right, self.top = left, bottom, right, top
+        self.xres, self.yres = xres, yres
+        self.center = center
+        self.nodata = nodata
+        self.lock = threading.Lock()
+        self._opened = None # (pid, handle)
+
+    def contains(self, lats, lons):
+        return (lats >= self.bottom) & (lats <= self.top) & (lons >= self.left) & (lons <= self.right)
+
+    def handle(self):
+        """
+        The open file for this process; reopened after a fork.
+        """
+        pid = os.getpid()
+        opened = self._opened
+        if opened is None or opened[0] != pid:
+            with self.lock:
+                opened = self._opened
+                if opened is None or opened[0] != pid:
+                    opened = self._opened = (pid, self._open())
+        return opened[1]
+
+    @abc.abstractmethod
+    def _open(self):
+        """
+        Open the file for reading in the current process.
+        """
+
+    @abc.abstractmethod
+    def read_window(self, row0, row1, col0, col1):
+        """
+        Raw pixels of rows row0:row1 and cols col0:col1.
+        """
+
+    def sample(self, lats, lons):
+        """
+        Bilinear interpolation of the points from one windowed read.
+        """
+        rows = (self.top - lats) / self.yres - self.center
+        cols = (lons - self.left) / self.xres - self.center
+
+        height, width = self.shape
+        row0 = int(max(0, math.floor(rows.min())))
+        col0 = int(max(0, math.floor(cols.min())))
+        row1 = int(min(height, math.floor(rows.max()) + 2))
+        col1 = int(min(width, math.floor(cols.max()) + 2))
+
+        window = self.read_window(row0, row1, col0, col1).astype(np.float64)
+        if self.nodata is not None:
+            window[window == self.nodata] = np.nan
+
+        r = np.clip(rows - row0, 0, window.shape[0] - 1)
+        c = np.clip(cols - col0, 0, window.shape[1] - 1)
+        r0 = np.floor(r).astype(np.int64)
+        c0 = np.floor(c).astype(np.int64)
+        r1 = np.minimum(r0 + 1, window.shape[0] - 1)
+        c1 = np.minimum(c0 + 1, window.shape[1] - 1)
+        fr = r - r0
+        fc = c - c0
+
+        top = window[r0, c0] * (1 - fc) + window[r0, c1] * fc
+        bottom = window[r1, c0] * (1 - fc) + window[r1, c1] * fc
+        return top * (1 - fr) + bottom * fr
+
+
+class _HGTFile(_DEMFile):
+    """
+    SRTM .hgt: square big-endian int16 grid, memory-mapped on first use.
+    """
+
+    def __init__(self, path, lat, lon, size):
+        step = 1.0 / (size - 1)
+        super().__init__(path, lon, lat, lon + 1, lat + 1, step, step, 0.0, -32768)
+        self.shape = (size, size)
+
+    def _open(self):
+        return np.memmap(self.path, dtype='>i2', mode='r', shape=self.shape)
+
+    def read_window(self, row0, row1, col0, col1):
+        return np.asarray(self.handle()[row0:row1, col0:col1])
+
+
+class _GeoTIFFFile(_DEMFile):
+    """
+    GeoTIFF read through rasterio windows (GDAL block cache, no full load).
+    dataset only supplies the georeferencing; GDAL handles are not fork-safe,
+    so reads go through a per-process handle.
+    """
+
+    def __init__(self, path, dataset):
+        bounds = dataset.bounds
+        xres, yres = dataset.res
+        super().__init__(path, bounds.left, bounds.bottom, bounds.right, bounds.top,
+                         xres, yres, 0.5, dataset.nodata)
+        self.shape = (dataset.height, dataset.width)
+
+    def _open(self):
+        import rasterio
+        return rasterio.open(self.path)
+
+    def read_window(self, row0, row1, col0, col1):
+        from rasterio.windows import Window
+        dataset = self.handle()
+        # rasterio dataset handles are not thread-safe
+        with self.lock:
+            return dataset.read(1, window=Window(col0, row0, col1 - col0, row1 - row0))
+
+
+class LocalDEMBackend:
+    """
+    Reads the same .tif/.hgt rasters the OpenTopoData container serves, straight
+    from disk. The dataset is looked up by name in the OpenTopoData config.yaml.
+    """
+    name = "local"
+
+    def __init__(self, config_path=None, dataset=None):
+        self.config_path = config_path or os.environ.get('ELEVATION_CONFIG', '/app/data/config.yaml')
+        self.dataset = dataset or os.environ.get('ELEVATION_DATASET', 'srtm30m')
+        self.path = self._dataset_path()
+        self.files = self._index_files()
+        logger.info(f"Local DEM backend: {len(self.files)} rasters for dataset '{self.dataset}' in {self.path}")
+
+    def _dataset_path(self):
+        import yaml
+        with open(self.config_path) as f:
+            config = yaml.safe_load(f) or {}
+
+        for entry in config.get('datasets', []):
+            if entry.get('name') == self.dataset:
+                path = entry['path']
+                if not os.path.isabs(path):
+                    path = os.path.join(os.path.dirname(self.config_path), path)
+                return path
+        raise ValueError(f"Dataset '{self.dataset}' not found in {self.config_path}")
+
+    def _index_files(self):
+        files = []
+        for path in sorted(glob.glob(os.path.join(self.path, '**', '*'), recursive=True)):
+            ext = os.path.splitext(path)[1].lower()
+            try:
+                if ext == '.hgt':
+                    files.append(self._open_hgt(path))
+                elif ext in ('.tif', '.tiff'):
+                    files.append(self._open_geotiff(path))
+            except Exception as e:
+                logger.error(f"Skipping unreadable DEM file {path}: {e}")
+        return files
+
+    def _open_hgt(self, path):
+        match = _CORNER_RE.search(os.path.basename(path))
+        if not match:
+            raise ValueError("HGT file name must encode its south-west corner (e.g. N45W123.hgt)")
+        ns, lat, ew, lon = match.groups()
+        lat = int(lat) * (1 if ns.upper() == 'N' else -1)
+        lon = int(lon) * (1 if ew.upper() == 'E' else -1)
+        size = int(round(math.sqrt(os.path.getsize(path) / 2)))
+        return _HGTFile(path, lat, lon, size)
+
+    def _open_geotiff(self, path):
+        try:
+            import rasterio
+        except ImportError:
+            raise RuntimeError("rasterio is required to read GeoTIFF elevation data")
+        # Georeferencing only; each process opens the file on its first read
+        with rasterio.open(path) as dataset:
+            if dataset.crs is not None and not dataset.crs.is_geographic:
+                raise ValueError(f"Unsupported projected CRS {dataset.crs}; expected geographic coordinates")
+            return _GeoTIFFFile(path, dataset)
+
+    def fetch_points(self, lats, lons):
+        """
+        Returns an ndarray of elevations (NaN where no raster covers a point),
+        or None if no raster covers any of the points.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        result = np.full(len(lats), np.nan)
+        remaining = np.ones(len(lats), dtype=bool)
+
+        for dem in self.files:
+            mask = remaining & dem.contains(lats, lons)
+            if not mask.any():
+                continue
+            result[mask] = dem.sample(lats[mask], lons[mask])
+            remaining &= ~mask
+            if not remaining.any():
+                break
+
+        if remaining.all():
+            logger.error(f"No '{self.dataset}' raster covers the requested area")
+            return None
+        return result.astype(np.float32)
+
+
+def create_backend(session, executor):
+    """
+    Select the elevation backend from ELEVATION_BACKEND (opentopodata | local).
+    """
+    backend = os.environ.get('ELEVATION_BACKEND', 'opentopodata').lower()
+    if backend == 'local':
+        return LocalDEMBackend()
+    if backend != 'opentopodata':
+        logger.warning(f"Unknown ELEVATION_BACKEND '{backend}', falling back to opentopodata")
+    return OpenTopoDataBackend(session, executor)
@@ -0,0 +1,649 @@
+"""
+NumPy port of the ITS Irregular Terrain Model (Longley-Rice) v1.4,
+point-to-point mode with time/location/situation variability.
+
+Mirrors libmeshrf/vendor/itm/src function by function, but every function
+works on arrays of links:
+
+    terrain = terrain_statistics(elevs, dist_m, h_tx, h_rx)   # once per profile
+    result = p2p_loss(terrain, f_mhz, ...)                    # any number of frequencies
+
+terrain_statistics() does the profile work (horizons, delta_h, effective
+heights) for an (M, S) matrix of evenly spaced profiles. p2p_loss() is
+purely elementwise: frequencies and environment parameters broadcast
+against the M links, and an (M, F) frequency matrix evaluates every profile
+at F frequencies without repeating the terrain analysis.
+
+Inputs ITM rejects produce NaN losses. Warning flags are not reported.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+A_0 = 6370e3     # actual earth radius, meters
+A_9000 = 9000e3  # 9000 km effective earth radius used by the variability curves
+THIRD = 1.0 / 3.0
+SQRT2 = np.sqrt(2.0)
+
+MODE_LINE_OF_SIGHT = 1
+MODE_DIFFRACTION = 2
+MODE_TROPOSCATTER = 3
+
+CLIMATE_CONTINENTAL_TEMPERATE = 5
+POLARIZATION_HORIZONTAL = 0
+POLARIZATION_VERTICAL = 1
+
+Terrain = namedtuple("Terrain", [
+    "d", "h_tx", "h_rx", "N_s", "gamma_e",
+    "theta_hzn_tx", "theta_hzn_rx", "d_hzn_tx", "d_hzn_rx",
+    "h_e_tx", "h_e_rx", "delta_h"
+])
+
+
+def _fdim(x, y):
+    return np.where(x > y, x - y, 0.0)
+
+
+# --- Terrain ---
+
+def _linear_least_squares_fit(z, xi, n, d_start, d_end):
+    """
+    LinearLeastSquaresFit over rows of z (end points half weighted).
+    n is the index of the last sample of each row. Returns (fit_y1, fit_y2).
+    """
+    i_start = np.trunc(_fdim(d_start / xi, 0.0))
+    i_end = n - np.trunc(_fdim(n, d_end / xi))
+
+    swap = i_end <= i_start
+    i_start = np.where(swap, np.trunc(_fdim(i_start, 1.0)), i_start)
+    i_end = np.where(swap, n - np.trunc(_fdim(n, i_end + 1.0)), i_end)
+
+    x_length = i_end - i_start
+    mid_shifted_end = i_end - 0.5 * x_length
+
+    idx = np.arange(z.shape[1])[None, :]
+    lo = i_start[:, None]
+    hi = i_end[:, None]
+    weight = np.where((idx > lo) & (idx < hi), 1.0, np.where((idx == lo) | (idx == hi), 0.5, 0.0))
+    offset = idx - lo - 0.5 * x_length[:, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sum_y = (weight * z).sum(axis=1) / x_length
+        scaled_sum_y = (weight * z * offset).sum(axis=1) * 12.0 / ((x_length * x_length + 2.0) * x_length)
+
+    fit_y1 = sum_y - scaled_sum_y * mid_shifted_end
+    fit_y2 = sum_y + scaled_sum_y * (n - mid_shifted_end)
+    return fit_y1, fit_y2
+
+
+def _find_horizons(elevs, xi, a_e, h_tx, h_rx):
+    m, samples = elevs.shape
+    n = samples - 1
+    d = n * xi
+
+    z_tx = elevs[:, 0] + h_tx
+    z_rx = elevs[:, -1] + h_rx
+
+    theta_tx = (z_rx - z_tx) / d - d / (2 * a_e)
+    theta_rx = -(z_rx - z_tx) / d - d / (2 * a_e)
+    d_hzn_tx = d.copy()
+    d_hzn_rx = d.copy()
+
+    if n > 1:
+        rows = np.arange(m)
+        d_tx = np.arange(1, n)[None, :] * xi[:, None]
+        d_rx = d[:, None] - d_tx
+        interior = elevs[:, 1:n]
+
+        angles = (interior - z_tx[:, None]) / d_tx - d_tx / (2 * a_e[:, None])
+        k = np.argmax(angles, axis=1)
+        better = angles[rows, k] > theta_tx
+        theta_tx = np.where(better, angles[rows, k], theta_tx)
+        d_hzn_tx = np.where(better, d_tx[rows, k], d_hzn_tx)
+
+        angles = -(z_rx[:, None] - interior) / d_rx - d_rx / (2 * a_e[:, None])
+        k = np.argmax(angles, axis=1)
+        better = angles[rows, k] > theta_rx
+        theta_rx = np.where(better, angles[rows, k], theta_rx)
+        d_hzn_rx = np.where(better, d_rx[rows, k], d_hzn_rx)
+
+    return theta_tx, theta_rx, d_hzn_tx, d_hzn_rx
+
+
+def _compute_delta_h(elevs, xi, d_start, d_end):
+    """
+    Terrain irregularity: interdecile range of the terrain about a linear
+    fit, resampled to between 35 and 245 points (ComputeDeltaH).
+    """
+    m, samples = elevs.shape
+    n_pfl = samples - 1
+    rows = np.arange(m)[:, None]
+
+    x_start = d_start / xi
+    x_end = d_end / xi
+    span = x_end - x_start
+    short = span < 2.0
+
+    p10 = np.clip(np.trunc(0.1 * (np.where(short, 2.0, span) + 8.0)), 4, 25).astype(np.int64)
+    n = 10 * p10 - 5
+    p90 = n - p10
+    np_s = (n - 1).astype(np.float64)
+
+    # Linear interpolation of the profile at n evenly spaced points
+    step = np.where(short, 0.0, span) / np_s
+    j = np.arange(245)[None, :]
+    t = x_start[:, None] + j * step[:, None]
+    i0 = np.trunc(x_start)[:, None]
+    i = np.minimum(i0 + np.maximum(np.ceil(t - i0 - 1.0), 0.0), np.maximum(i0, n_pfl - 1))
+    i = np.clip(i, 0, n_pfl - 1).astype(np.int64)
+    x = t - (i + 1)
+    s = elevs[rows, i + 1] + (elevs[rows, i + 1] - elevs[rows, i]) * x
+
+    valid = j < n[:, None]
+    s = np.where(valid, s, 0.0)
+
+    fit_y1, fit_y2 = _linear_least_squares_fit(s, 1.0, np_s, 0.0, np_s)
+    slope = (fit_y2 - fit_y1) / np_s
+    diffs = np.where(valid, s - (fit_y1[:, None] + j * slope[:, None]), -np.inf)
+
+    descending = -np.sort(-diffs, axis=1)
+    q10 = descending[rows[:, 0], p10 - 1]
+    q90 = descending[rows[:, 0], p90]
+
+    delta_h = (q10 - q90) / (1.0 - 0.8 * np.exp(-(d_end - d_start) / 50e3))
+    return np.where(short, 0.0, delta_h)
+
+
+def terrain_statistics(elevs, dist_m, h_tx, h_rx, N_0=301.0):
+    """
+    Everything ITM derives from the terrain profile (InitializePointToPoint's
+    refractivity terms plus QuickPfl). elevs: (M, S) evenly spaced samples
+    from TX to RX; dist_m, h_tx, h_rx, N_0: scalars or length-M arrays.
+    """
+    elevs = np.atleast_2d(np.asarray(elevs, dtype=np.float64))
+    m, samples = elevs.shape
+    if samples < 2:
+        raise ValueError("ITM needs at least two profile samples")
+    n = samples - 1
+
+    dist_m, h_tx, h_rx, N_0 = (
+        np.broadcast_to(np.asarray(v, dtype=np.float64), (m,)) for v in (dist_m, h_tx, h_rx, N_0)
+    )
+    xi = dist_m / n
+    d = n * xi
+
+    # Mean path height over the middle 80% of the profile
+    p10 = int(0.1 * n)
+    h_sys = elevs[:, p10:n - p10 + 1].mean(axis=1)
+
+    N_s = np.where(h_sys == 0.0, N_0, N_0 * np.exp(-h_sys / 9460.0))
+    gamma_e = 157e-9 * (1.0 - 0.04665 * np.exp(N_s / 179.3))
+    a_e = 1 / gamma_e
+
+    theta_tx, theta_rx, d_hzn_tx, d_hzn_rx = _find_horizons(elevs, xi, a_e, h_tx, h_rx)
+
+    d_start = np.minimum(15.0 * h_tx, 0.1 * d_hzn_tx)
+    d_end = d - np.minimum(15.0 * h_rx, 0.1 * d_hzn_rx)
+    delta_h = _compute_delta_h(elevs, xi, d_start, d_end)
+
+    z_tx = elevs[:, 0]
+    z_rx = elevs[:, -1]
+    n_arr = np.full(m, float(n))
+
+    # Line-of-sight-ish paths: effective heights from one fit over the path,
+    # horizons re-estimated from them
+    fit_tx, fit_rx = _linear_least_squares_fit(elevs, xi, n_arr, d_start, d_end)
+    he_tx = h_tx + _fdim(z_tx, fit_tx)
+    he_rx = h_rx + _fdim(z_rx, fit_rx)
+    dh_tx = np.sqrt(2.0 * he_tx * a_e) * np.exp(-0.07 * np.sqrt(delta_h / np.maximum(he_tx, 5.0)))
+    dh_rx = np.sqrt(2.0 * he_rx * a_e) * np.exp(-0.07 * np.sqrt(delta_h / np.maximum(he_rx, 5.0)))
+
+    stretch = dh_tx + dh_rx <= d
+    q = np.where(stretch, (d / (dh_tx + dh_rx)) ** 2, 1.0)
+    he_tx = np.where(stretch, he_tx * q, he_tx)
+    he_rx = np.where(stretch, he_rx * q, he_rx)
+    dh_tx = np.where(stretch, np.sqrt(2.0 * he_tx * a_e) * np.exp(-0.07 * np.sqrt(delta_h / np.maximum(he_tx, 5.0))), dh_tx)
+    dh_rx = np.where(stretch, np.sqrt(2.0 * he_rx * a_e) * np.exp(-0.07 * np.sqrt(delta_h / np.maximum(he_rx, 5.0))), dh_rx)
+
+    q_tx = np.sqrt(2.0 * he_tx * a_e)
+    q_rx = np.sqrt(2.0 * he_rx * a_e)
+    th_tx = (0.65 * delta_h * (q_tx / dh_tx - 1.0) - 2.0 * he_tx) / q_tx
+    th_rx = (0.65 * delta_h * (q_rx / dh_rx - 1.0) - 2.0 * he_rx) / q_rx
+
+    # Trans-horizon paths: effective heights from fits up to each horizon
+    fit_tx_h, _ = _linear_least_squares_fit(elevs, xi, n_arr, d_start, 0.9 * d_hzn_tx)
+    _, fit_rx_h = _linear_least_squares_fit(elevs, xi, n_arr, d - 0.9 * d_hzn_rx, d_end)
+    he_tx_h = h_tx + _fdim(z_tx, fit_tx_h)
+    he_rx_h = h_rx + _fdim(z_rx, fit_rx_h)
+
+    los = d_hzn_tx + d_hzn_rx > 1.5 * d
+    return Terrain(
+        d=d, h_tx=h_tx, h_rx=h_rx, N_s=N_s, gamma_e=gamma_e,
+        theta_hzn_tx=np.where(los, th_tx, theta_tx),
+        theta_hzn_rx=np.where(los, th_rx, theta_rx),
+        d_hzn_tx=np.where(los, dh_tx, d_hzn_tx),
+        d_hzn_rx=np.where(los, dh_rx, d_hzn_rx),
+        h_e_tx=np.where(los, he_tx, he_tx_h),
+        h_e_rx=np.where(los, he_rx, he_rx_h),
+        delta_h=delta_h
+    )
+
+
+# --- Propagation ---
+
+def _terrain_roughness(d, delta_h):
+    return delta_h * (1.0 - 0.8 * np.exp(-d / 50e3))
+
+
+def _sigma_h(delta_h):
+    return 0.78 * delta_h * np.exp(-0.5 * delta_h ** 0.25)
+
+
+def _fresnel_integral(v2):
+    return np.where(v2 < 5.76, 6.02 + 9.11 * np.sqrt(np.maximum(v2, 0.0)) - 1.27 * v2, 12.953 + 10 * np.log10(v2))
+
+
+def _knife_edge_diffraction(d, f, a_e, theta_los, d_hzn_tx, d_hzn_rx):
+    d_ML = d_hzn_tx + d_hzn_rx
+    theta_nlos = d / a_e - theta_los
+    d_nlos = d - d_ML
+
+    v_1 = 0.0795775 * (f / 47.7) * theta_nlos ** 2 * d_hzn_tx * d_nlos / (d_nlos + d_hzn_tx)
+    v_2 = 0.0795775 * (f / 47.7) * theta_nlos ** 2 * d_hzn_rx * d_nlos / (d_nlos + d_hzn_rx)
+    return _fresnel_integral(v_1) + _fresnel_integral(v_2)
+
+
+def _height_function(x_km, K):
+    w = -np.log(K)
+    low = -117.0 + np.where(x_km > 1.0, 17.372 * np.log(x_km), 0.0)
+    near = np.where((K < 1e-5) | (x_km * w ** 3 > 5495.0), low, 2.5e-5 * x_km ** 2 / K - 8.686 * w - 15.0)
+
+    far = 0.05751 * x_km - 4.343 * np.log(x_km)
+    w_far = 0.0134 * x_km * np.exp(-0.005 * x_km)
+    far = np.where(x_km < 2000, (1.0 - w_far) * far + w_far * (17.372 * np.log(x_km) - 117.0), far)
+
+    return np.where(x_km < 200.0, near, far)
+
+
+def _smooth_earth_diffraction(d, f, a_e, theta_los, d_hzn_tx, d_hzn_rx, h_e_tx, h_e_rx, Z_g):
+    theta_nlos = d / a_e - theta_los
+    d_ML = d_hzn_tx + d_hzn_rx
+
+    a_0 = (d - d_ML) / (d / a_e - theta_los)
+    a_1 = 0.5 * d_hzn_tx ** 2 / h_e_tx
+    a_2 = 0.5 * d_hzn_rx ** 2 / h_e_rx
+
+    f_third = f ** THIRD
+    abs_Z_g = np.abs(Z_g)
+
+    def terms(a):
+        C_0 = ((4.0 / 3.0) * A_0 / a) ** THIRD
+        K = 0.017778 * C_0 * f ** -THIRD / abs_Z_g
+        return C_0, K, 1.607 - K
+
+    C_00, _, B_00 = terms(a_0)
+    C_01, K_1, B_01 = terms(a_1)
+    C_02, K_2, B_02 = terms(a_2)
+
+    x_1 = B_01 * C_01 ** 2 * f_third * (d_hzn_tx / 1000.0)
+    x_2 = B_02 * C_02 ** 2 * f_third * (d_hzn_rx / 1000.0)
+    x_0 = B_00 * C_00 ** 2 * f_third * (a_0 * theta_nlos / 1000.0) + x_1 + x_2
+
+    G_x = 0.05751 * x_0 - 10.0 * np.log10(x_0)
+    return G_x - _height_function(x_1, K_1) - _height_function(x_2, K_2) - 20
+
+
+def _diffraction_loss(d, t, f, Z_g, a_e, theta_los, d_sML):
+    A_k = _knife_edge_diffraction(d, f, a_e, theta_los, t.d_hzn_tx, t.d_hzn_rx)
+    A_se = _smooth_earth_diffraction(d, f, a_e, theta_los, t.d_hzn_tx, t.d_hzn_rx, t.h_e_tx, t.h_e_rx, Z_g)
+
+    sigma_h_d = _sigma_h(_terrain_roughness(d_sML, t.delta_h))
+    A_fo = np.minimum(15.0, 5 * np.log10(1.0 + 1e-5 * t.h_tx * t.h_rx * f * sigma_h_d))
+
+    delta_h_d = _terrain_roughness(d, t.delta_h)
+    q = t.h_tx * t.h_rx
+    qk = t.h_e_tx * t.h_e_rx - q
+    q = q + 10.0  # point-to-point mode
+    term1 = np.sqrt(1.0 + qk / q)
+
+    d_ML = t.d_hzn_tx + t.d_hzn_rx
+    q = (term1 + (-theta_los * a_e + d_ML) / d) * np.minimum(delta_h_d * f / 47.7, 6283.2)
+    w = 25.1 / (25.1 + np.sqrt(q))
+
+    return w * A_se + (1.0 - w) * A_k + A_fo
+
+
+def _line_of_sight_loss(d, t, Z_g, M_d, A_d0, d_sML, f):
+    sigma_h_d = _sigma_h(_terrain_roughness(d, t.delta_h))
+    wn = f / 47.7
+
+    h_sum = t.h_e_tx + t.h_e_rx
+    sin_psi = h_sum / np.sqrt(d ** 2 + h_sum ** 2)
+
+    R_e = (sin_psi - Z_g) / (sin_psi + Z_g) * np.exp(-np.minimum(10.0, wn * sigma_h_d * sin_psi))
+    q = R_e.real ** 2 + R_e.imag ** 2
+    R_e = np.where((q < 0.25) | (q < sin_psi), R_e * np.sqrt(sin_psi / q), R_e)
+
+    delta_phi = wn * 2.0 * t.h_e_tx * t.h_e_rx / d
+    delta_phi = np.where(delta_phi > np.pi / 2.0, np.pi - (np.pi / 2.0) ** 2 / delta_phi, delta_phi)
+
+    rr = np.cos(delta_phi) - 1j * np.sin(delta_phi) + R_e
+    A_t = -10 * np.log10(rr.real ** 2 + rr.imag ** 2)
+
+    A_d = M_d * d + A_d0
+    w = 1 / (1 + f * t.delta_h / np.maximum(10e3, d_sML))
+    return w * A_t + (1 - w) * A_d
+
+
+_H0_A = np.array([25.0, 80.0, 177.0, 395.0, 705.0])
+_H0_B = np.array([24.0, 45.0, 68.0, 80.0, 105.0])
+
+
+def _h0_curve(j, r):
+    return 10 * np.log10(1 + _H0_A[j] * (1 / r) ** 4 + _H0_B[j] * (1.0 / r) ** 2)
+
+
+def _h0_function(r, eta_s):
+    eta_s = np.clip(eta_s, 1, 5)
+    i = np.trunc(eta_s).astype(np.int64)
+    q = eta_s - i
+    result = _h0_curve(i - 1, r)
+    return np.where(q != 0.0, (1.0 - q) * result + q * _h0_curve(np.minimum(i, 4), r), result)
+
+
+def _f_function(td):
+    i = np.where(td <= 10e3, 0, np.where(td <= 70e3, 1, 2))
+    a = np.array([133.4, 104.6, 71.8])[i]
+    b = np.array([0.332e-3, 0.212e-3, 0.157e-3])[i]
+    c = np.array([-10, -2.5, 5])[i]
+    return a + b * td + c * np.log10(td)
+
+
+def _troposcatter_loss(d, t, a_e, f, theta_los, h0):
+    """
+    Returns (A_scat, h0) - h0 carries the frequency gain function between
+    the two calls like the reference implementation's in/out pointer.
+    """
+    wn = f / 47.7
+    reuse = h0 > 15.0
+
+    ad = t.d_hzn_tx - t.d_hzn_rx
+    rr = t.h_e_rx / t.h_e_tx
+    flip = ad < 0.0
+    ad = np.where(flip, -ad, ad)
+    rr = np.where(flip, 1.0 / rr, rr)
+
+    theta = t.theta_hzn_tx + t.theta_hzn_rx + d / a_e
+    r_1 = 2.0 * wn * theta * t.h_e_tx
+    r_2 = 2.0 * wn * theta * t.h_e_rx
+    # A_scat is not defined (infinite) when both are below 0.2
+    undefined = ~reuse & (r_1 < 0.2) & (r_2 < 0.2)
+
+    s = (d - ad) / (d + ad)
+    q = np.minimum(np.maximum(0.1, rr / s), 10.0)
+    s = np.maximum(0.1, s)
+
+    h_0 = (d - ad) * (d + ad) * theta * 0.25 / d
+    eta_s = (h_0 / 1.7556e3) * (1.0 + (0.031 - t.N_s * 2.32e-3 + t.N_s ** 2 * 5.67e-6) * np.exp(-np.minimum(1.7, h_0 / 8.0e3) ** 6))
+
+    H_00 = (_h0_function(r_1, eta_s) + _h0_function(r_2, eta_s)) / 2
+    Delta_H_0 = np.minimum(H_00, 6.0 * (0.6 - np.log10(np.maximum(eta_s, 1.0))) * np.log10(s) * np.log10(q))
+
+    H_0 = np.maximum(H_00 + Delta_H_0, 0.0)
+    special = 10 * np.log10(((1.0 + SQRT2 / r_1) * (1.0 + SQRT2 / r_2)) ** 2 * (r_1 + r_2) / (r_1 + r_2 + 2 * SQRT2))
+    H_0 = np.where(eta_s < 1.0, eta_s * H_0 + (1.0 - eta_s) * special, H_0)
+    H_0 = np.where((H_0 > 15.0) & (h0 >= 0.0), h0, H_0)
+    H_0 = np.where(reuse, h0, H_0)
+
+    th = d / a_e - theta_los
+    A_scat = _f_function(th * d) + 10 * np.log10(wn * 47.7 * th ** 4) - 0.1 * (t.N_s - 301.0) * np.exp(-th * d / 40e3) + H_0
+
+    return np.where(undefined, 1001.0, A_scat), np.where(undefined, h0, H_0)
+
+
+def _longley_rice(t, f, Z_g):
+    """
+    Reference attenuation and propagation mode (LongleyRice, P2P mode).
+    """
+    a_e = 1 / t.gamma_e
+    d = t.d
+
+    d_sML = np.sqrt(2.0 * t.h_e_tx * a_e) + np.sqrt(2.0 * t.h_e_rx * a_e)
+    d_ML = t.d_hzn_tx + t.d_hzn_rx
+    theta_los = -np.maximum(t.theta_hzn_tx + t.theta_hzn_rx, -d_ML / a_e)
+
+    error = (t.N_s < 150) | (t.N_s > 400) | (a_e < 4000000) | (a_e > 13333333) | (Z_g.real <= np.abs(Z_g.imag))
+
+    # Diffraction line through two points beyond the horizon
+    scale = (a_e ** 2 / f) ** THIRD
+    d_3 = np.maximum(d_sML, d_ML + 5.0 * scale)
+    d_4 = d_3 + 10.0 * scale
+    A_3 = _diffraction_loss(d_3, t, f, Z_g, a_e, theta_los, d_sML)
+    A_4 = _diffraction_loss(d_4, t, f, Z_g, a_e, theta_los, d_sML)
+    M_d = (A_4 - A_3) / (d_4 - d_3)
+    A_d0 = A_3 - M_d * d_3
+
+    # Line of sight
+    A_sML = d_sML * M_d + A_d0
+    d_0 = 0.04 * f * t.h_e_tx * t.h_e_rx
+    positive = A_d0 >= 0.0
+    d_0 = np.where(positive, np.minimum(d_0, 0.5 * d_ML), d_0)
+    d_1 = np.where(positive, d_0 + 0.25 * (d_ML - d_0), np.maximum(-A_d0 / M_d, 0.25 * d_ML))
+
+    A_1 = _line_of_sight_loss(d_1, t, Z_g, M_d, A_d0, d_sML, f)
+    A_0 = _line_of_sight_loss(d_0, t, Z_g, M_d, A_d0, d_sML, f)
+
+    q = np.log(d_sML / d_0)
+    kHat_2 = np.maximum(0.0, ((d_sML - d_0) * (A_1 - A_0) - (d_1 - d_0) * (A_sML - A_0)) /
+                        ((d_sML - d_0) * np.log(d_1 / d_0) - (d_1 - d_0) * q))
+    flag = (d_0 < d_1) & ((A_d0 > 0.0) | (kHat_2 > 0.0))
+
+    kHat_1 = (A_sML - A_0 - kHat_2 * q) / (d_sML - d_0)
+    clamp = kHat_1 < 0.0
+    kHat_1 = np.where(clamp, 0.0, kHat_1)
+    kHat_2 = np.where(clamp, _fdim(A_sML, A_0) / q, kHat_2)
+    kHat_1 = np.where(clamp & (kHat_2 == 0.0), M_d, kHat_1)
+
+    kHat_1_alt = _fdim(A_sML, A_1) / (d_sML - d_1)
+    kHat_1_alt = np.where(kHat_1_alt == 0.0, M_d, kHat_1_alt)
+    kHat_1 = np.where(flag, kHat_1, kHat_1_alt)
+    kHat_2 = np.where(flag, kHat_2, 0.0)
+
+    A_o = A_sML - kHat_1 * d_sML - kHat_2 * np.log(d_sML)
+    A_los = A_o + kHat_1 * d + kHat_2 * np.log(d)
+
+    # Trans-horizon: diffraction, or troposcatter beyond d_x
+    d_5 = d_ML + 200e3
+    d_6 = d_ML + 400e3
+    h0 = np.full(np.shape(A_los), -1.0)
+    A_6, h0 = _troposcatter_loss(d_6, t, a_e, f, theta_los, h0)
+    A_5, h0 = _troposcatter_loss(d_5, t, a_e, f, theta_los, h0)
+
+    defined = A_5 < 1000.0
+    M_s = np.where(defined, (A_6 - A_5) / 200e3, M_d)
+    d_x = np.where(
+        defined,
+        np.maximum(np.maximum(d_sML, d_ML + 1.088 * scale * np.log(f)), (A_5 - A_d0 - M_s * d_5) / (M_d - M_s)),
+        10e6
+    )
+    A_s0 = np.where(defined, (M_d - M_s) * d_x + A_d0, A_d0)
+
+    troposcatter = d > d_x
+    A_th = np.where(troposcatter, M_s * d + A_s0, M_d * d + A_d0)
+
+    line_of_sight = d < d_sML
+    A_ref = np.where(line_of_sight, A_los, A_th)
+    A_ref = np.where(A_ref > 0.0, A_ref, 0.0)
+    mode = np.where(line_of_sight, MODE_LINE_OF_SIGHT, np.where(troposcatter, MODE_TROPOSCATTER, MODE_DIFFRACTION))
+
+    return np.where(error, np.nan, A_ref), mode
+
+
+# --- Variability ---
+
+_ALL_YEAR = np.array([
+    [-9.67, -0.62, 1.26, -9.21, -0.62, -0.39, 3.15],
+    [12.7, 9.19, 15.5, 9.05, 9.19, 2.86, 857.9],
+    [144.9e3, 228.9e3, 262.6e3, 84.1e3, 228.9e3, 141.7e3, 2222.e3],
+    [190.3e3, 205.2e3, 185.2e3, 101.1e3, 205.2e3, 315.9e3, 164.8e3],
+    [133.8e3, 143.6e3, 99.8e3, 98.6e3, 143.6e3, 167.4e3, 116.3e3]
+])
+_BSM = np.array([
+    [2.13, 2.66, 6.11, 1.98, 2.68, 6.86, 8.51],
+    [159.5, 7.67, 6.65, 13.11, 7.16, 10.38, 169.8],
+    [762.2e3, 100.4e3, 138.2e3, 139.1e3, 93.7e3, 187.8e3, 609.8e3],
+    [123.6e3, 172.5e3, 242.2e3, 132.7e3, 186.8e3, 169.6e3, 119.9e3],
+    [94.5e3, 136.4e3, 178.6e3, 193.5e3, 133.5e3, 108.9e3, 106.6e3]
+])
+_BSP = np.array([
+    [2.11, 6.87, 10.08, 3.68, 4.75, 8.58, 8.43],
+    [102.3, 15.53, 9.60, 159.3, 8.12, 13.97, 8.19],
+    [636.9e3, 138.7e3, 165.3e3, 464.4e3, 93.2e3, 216.0e3, 136.2e3],
+    [134.8e3, 143.7e3, 225.7e3, 93.1e3, 135.9e3, 152.0e3, 188.5e3],
+    [95.6e3, 98.6e3, 129.7e3, 94.2e3, 113.4e3, 122.7e3, 122.9e3]
+])
+_C_D = np.array([1.224, 0.801, 1.380, 1.000, 1.224, 1.518, 1.518])
+_Z_D = np.array([1.282, 2.161, 1.282, 20.0, 1.282, 1.282, 1.282])
+_BFM = np.array([
+    [1.0, 1.0, 1.0, 1.0, 0.92, 1.0, 1.0],
+    [0.0, 0.0, 0.0, 0.0, 0.25, 0.0, 0.0],
+    [0.0, 0.0, 0.0, 0.0, 1.77, 0.0, 0.0]
+])
+_BFP = np.array([
+    [1.0, 0.93, 1.0, 0.93, 0.93, 1.0, 1.0],
+    [0.0, 0.31, 0.0, 0.19, 0.31, 0.0, 0.0],
+    [0.0, 2.00, 0.0, 1.79, 2.00, 0.0, 0.0]
+])
+
+
+def _curve(c, ci, d_e):
+    c1, c2, x1, x2, x3 = (row[ci] for row in c)
+    return (c1 + c2 / (1.0 + ((d_e - x2) / x3) ** 2)) * (d_e / x1) ** 2 / (1.0 + (d_e / x1) ** 2)
+
+
+def inverse_ccdf(q):
+    """
+    Inverse complementary normal CDF (Abramowitz & Stegun 26.2.23).
+    """
+    q = np.asarray(q, dtype=np.float64)
+    x = np.where(q > 0.5, 1.0 - q, q)
+    T_x = np.sqrt(-2.0 * np.log(x))
+    zeta_x = ((0.010328 * T_x + 0.802853) * T_x + 2.515516) / (((0.001308 * T_x + 0.189269) * T_x + 1.432788) * T_x + 1.0)
+    Q_q = T_x - zeta_x
+    return np.where(q > 0.5, -Q_q, Q_q)
+
+
+def _variability(time, location, situation, t, f, A_ref, climate, mdvar):
+    z_T = inverse_ccdf(time / 100)
+    z_L = inverse_ccdf(location / 100)
+    z_S = inverse_ccdf(situation / 100)
+
+    ci = np.asarray(climate, dtype=np.int64) - 1
+    wn = f / 47.7
+    d = t.d
+
+    d_ex = np.sqrt(2 * A_9000 * t.h_e_tx) + np.sqrt(2 * A_9000 * t.h_e_rx) + (575.7e12 / wn) ** THIRD
+    d_e = np.where(d < d_ex, 130e3 * d / d_ex, 130e3 + d - d_ex)
+
+    mdvar = np.asarray(mdvar, dtype=np.int64)
+    plus20 = mdvar >= 20
+    mdvar = np.where(plus20, mdvar - 20, mdvar)
+    sigma_S = np.where(plus20, 0.0, 5.0 + 3.0 * np.exp(-d_e / 100e3))
+
+    plus10 = mdvar >= 10
+    mdvar = np.where(plus10, mdvar - 10, mdvar)
+
+    V_med = _curve(_ALL_YEAR, ci, d_e)
+
+    single = mdvar == 0
+    accidental = mdvar == 1
+    mobile = mdvar == 2
+    z_L = np.where(single | accidental, z_S, np.where(mobile, z_T, z_L))
+    z_T = np.where(single, z_S, z_T)
+
+    delta_h_d = _terrain_roughness(d, t.delta_h)
+    sigma_L = np.where(plus10, 0.0, 10.0 * wn * delta_h_d / (wn * delta_h_d + 13.0))
+    Y_L = sigma_L * z_L
+
+    q = np.log(0.133 * wn)
+    g_minus = _BFM[0][ci] + _BFM[1][ci] / ((_BFM[2][ci] * q) ** 2 + 1.0)
+    g_plus = _BFP[0][ci] + _BFP[1][ci] / ((_BFP[2][ci] * q) ** 2 + 1.0)
+
+    sigma_T_minus = _curve(_BSM, ci, d_e) * g_minus
+    sigma_T_plus = _curve(_BSP, ci, d_e) * g_plus
+
+    sigma_TD = _C_D[ci] * sigma_T_plus
+    tgtd = (sigma_T_plus - sigma_TD) * _Z_D[ci]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma_T = np.where(z_T < 0.0, sigma_T_minus, np.where(z_T <= _Z_D[ci], sigma_T_plus, sigma_TD + tgtd / z_T))
+    Y_T = sigma_T * z_T
+
+    Y_S_temp = sigma_S ** 2 + Y_T ** 2 / (7.8 + z_S ** 2) + Y_L ** 2 / (24.0 + z_S ** 2)
+
+    Y_R = np.where(single, 0.0, np.where(accidental, Y_T, np.where(mobile, np.sqrt(sigma_T ** 2 + sigma_L ** 2) * z_T, Y_T + Y_L)))
+    Y_S = np.where(
+        single, np.sqrt(sigma_T ** 2 + sigma_L ** 2 + Y_S_temp),
+        np.where(accidental, np.sqrt(sigma_L ** 2 + Y_S_temp), np.sqrt(Y_S_temp))
+    ) * z_S
+
+    result = A_ref - V_med - Y_R - Y_S
+    return np.where(result < 0.0, result * (29.0 - result) / (29.0 - 10.0 * result), result)
+
+
+def _invalid_inputs(t, climate, N_0, f, pol, epsilon, sigma, mdvar, time, location, situation):
+    mdvar = np.asarray(mdvar)
+    bad_mdvar = (mdvar < 0) | ((mdvar > 3) & (mdvar < 10)) | ((mdvar > 13) & (mdvar < 20)) | \
+                ((mdvar > 23) & (mdvar < 30)) | (mdvar > 33)
+    return (
+        (t.h_tx < 0.5) | (t.h_tx > 3000.0) | (t.h_rx < 0.5) | (t.h_rx > 3000.0) |
+        (np.asarray(climate) < 1) | (np.asarray(climate) > 7) |
+        (N_0 < 250) | (N_0 > 400) | (f < 20) | (f > 20000) |
+        ((np.asarray(pol) != POLARIZATION_HORIZONTAL) & (np.asarray(pol) != POLARIZATION_VERTICAL)) |
+        (epsilon < 1) | (sigma <= 0) | bad_mdvar |
+        (situation <= 0) | (situation >= 100) | (time <= 0) | (time >= 100) | (location <= 0) | (location >= 100)
+    )
+
+
+def p2p_loss(terrain, f_mhz, climate=CLIMATE_CONTINENTAL_TEMPERATE, N_0=301.0, pol=POLARIZATION_VERTICAL,
+             epsilon=15.0, sigma=0.005, mdvar=12, time=50.0, location=50.0, situation=50.0):
+    """
+    ITM_P2P_TLS for precomputed terrain statistics. All parameters broadcast
+    against the M links; pass f_mhz as an (M, F) array to evaluate F
+    frequencies per link. N_0 must match the value given to terrain_statistics.
+
+    Returns {"loss_db", "reference_db", "free_space_db", "mode"}; loss_db is
+    the basic transmission loss and is NaN where ITM rejects the inputs.
+    """
+    f = np.asarray(f_mhz, dtype=np.float64)
+    if f.ndim == 2:
+        terrain = Terrain(*(np.expand_dims(v, -1) for v in terrain))
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        ep_r = epsilon + 1j * (18000 * np.asarray(sigma, dtype=np.float64) / f)
+        Z_g = np.sqrt(ep_r - 1.0)
+        Z_g = np.where(np.asarray(pol) == POLARIZATION_VERTICAL, Z_g / ep_r, Z_g)
+
+        A_ref, mode = _longley_rice(terrain, f, Z_g)
+        A_fs = 32.45 + 20.0 * np.log10(f) + 20.0 * np.log10(terrain.d / 1000.0)
+        loss = _variability(
+            np.asarray(time, dtype=np.float64), np.asarray(location, dtype=np.float64),
+            np.asarray(situation, dtype=np.float64), terrain, f, A_ref, climate, mdvar
+        ) + A_fs
+
+    invalid = _invalid_inputs(terrain, climate, N_0, f, pol, epsilon, sigma, mdvar, time, location, situation)
+    return {
+        "loss_db": np.where(invalid, np.nan, loss),
+        "reference_db": A_ref,
+        "free_space_db": A_fs,
+        "mode": mode
+    }
+
+
+def p2p_tls(elevs, dist_m, f_mhz, h_tx, h_rx, N_0=301.0, **params):
+    """
+    One-shot ITM point-to-point loss for an (M, S) profile matrix.
+    Returns the basic transmission loss (dB) per link.
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        terrain = terrain_statistics(elevs, dist_m, h_tx, h_rx, N_0=N_0)
+    return p2p_loss(terrain, f_mhz, N_0=N_0, **params)["loss_db"]
@@ -1,13 +1,127 @@
 
 import numpy as np
+import scipy.ndimage
+from scipy.spatial import cKDTree
 
 import math
+import os
+import time
+from collections import namedtuple
 import rf_physics
+from core.terrain import PROMINENCE_METHODS, focal_prominence, topographic_prominence, sample_grid
+
+# Terrain raster on ascending lats/lons axes: elevation[r, c] is at (lats[r], lons[c])
+TerrainWindow = namedtuple('TerrainWindow', ['lats', 'lons', 'elevation', 'resolution_m'])
+
+# One row per optimize-location candidate
+CANDIDATE_DTYPE = np.dtype([
+    ('lat', 'f8'), ('lon', 'f8'), ('elevation', 'f8'),
+    ('prominence', 'f8'), ('fresnel', 'f8'), ('score', 'f8')
+])
+
+class NodeIndex:
+    """
+    KD-tree over existing nodes on the haversine sphere (x, y, z metres),
+    built once per request and queried for the nodes in link range of many
+    candidates at once.
+    """
+
+    def __init__(self, nodes):
+        self.lats = np.array([n['lat'] for n in nodes], dtype=np.float64)
+        self.lons = np.array([n['lon'] for n in nodes], dtype=np.float64)
+        self.heights = np.array([n['height'] for n in nodes], dtype=np.float64)
+        self.tree = cKDTree(self._xyz(self.lats, self.lons)) if len(nodes) else None
+
+    def __len__(self):
+        return len(self.lats)
+
+    @staticmethod
+    def _xyz(lats, lons):
+        phi, lam = np.radians(lats), np.radians(lons)
+        r = rf_physics.EARTH_RADIUS_KM * 1000
+        return np.column_stack((r * np.cos(phi) * np.cos(lam), r * np.cos(phi) * np.sin(lam), r * np.sin(phi)))
+
+    def pairs(self, lats, lons, max_dist_m):
+        """
+        (point, node) index arrays of every node within max_dist_m (great
+        circle) of each point.
+        """
+        if self.tree is None or len(lats) == 0:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        r = rf_physics.EARTH_RADIUS_KM * 1000
+        chord_m = 2 * r * math.sin(min(max_dist_m / (2 * r), math.pi / 2))
+        found = cKDTree(self._xyz(lats, lons)).sparse_distance_matrix(self.tree, chord_m, output_type='ndarray')
+        return found['i'].astype(np.intp), found['j'].astype(np.intp)
+
+# Largest candidate grid /optimize-location evaluates (coarsened beyond this)
+MAX_OPTIMIZE_CANDIDATES = int(os.environ.get("MAX_OPTIMIZE_CANDIDATES", 250000))
 
 class OptimizationService:
+    # Largest terrain raster side loaded for one optimize request
+    MAX_WINDOW_DIM = 512
+    # Candidates per progress report of a followed grid search
+    CHUNK_SIZE = 4096
+    # Links analyzed per profile lookup in fresnel_clearances
+    PAIR_CHUNK_SIZE = 50000
+    # Existing nodes farther than this from a candidate count as blocked
+    DEFAULT_MAX_LINK_KM = 50.0
+
     def __init__(self, tile_manager):
         self.tile_manager = tile_manager
 
+    def load_window(self, min_lat, min_lon, max_lat, max_lon, resolution_m, margin_km=5.0):
+        """
+        Load the bounding box plus margin_km on every side as one raster, in a
+        single elevation lookup. The spacing is resolution_m, coarsened when the
+        raster would exceed MAX_WINDOW_DIM per side.
+        """
+        mid_lat = (min_lat + max_lat) / 2.0
+        m_per_deg_lon = 111320.0 * max(0.001, math.cos(math.radians(mid_lat)))
+        margin_lat = margin_km * 1000.0 / 111320.0
+        margin_lon = margin_km * 1000.0 / m_per_deg_lon
+        south, north = min_lat - margin_lat, max_lat + margin_lat
+        west, east = min_lon - margin_lon, max_lon + margin_lon
+
+        height_m = (north - south) * 111320.0
+        width_m = (east - west) * m_per_deg_lon
+        resolution_m = max(resolution_m, height_m / (self.MAX_WINDOW_DIM - 1), width_m / (self.MAX_WINDOW_DIM - 1))
+        lats = np.linspace(south, north, int(round(height_m / resolution_m)) + 1)
+        lons = np.linspace(west, east, int(round(width_m / resolution_m)) + 1)
+        elevation = self.tile_manager.get_elevation_grid(lats, lons, resolution_m=resolution_m)
+        return TerrainWindow(lats, lons, np.asarray(elevation, dtype=np.float64), resolution_m)
+
+    def prominence_grid(self, window, radius_km=5.0, method='focal'):
+        """
+        Prominence of every cell of a TerrainWindow.
+        'focal'       - height above the mean of the surrounding +/- radius_km
+                        box (calculate_prominence for the whole raster)
+        'topographic' - true prominence of summits (key col), 0 elsewhere
+        """
+        if method not in PROMINENCE_METHODS:
+            raise ValueError(f"Unknown prominence method '{method}'. Expected one of {PROMINENCE_METHODS}")
+        if method == 'topographic':
+            return topographic_prominence(window.elevation)
+
+        mid_lat = float(np.mean(window.lats))
+        lat_res_m = (window.lats[-1] - window.lats[0]) / max(1, len(window.lats) - 1) * 111320.0
+        lon_res_m = (window.lons[-1] - window.lons[0]) / max(1, len(window.lons) - 1) * 111320.0 * math.cos(math.radians(mid_lat))
+        half_rows = int(round(radius_km * 1000.0 / lat_res_m)) if lat_res_m > 0 else 0
+        half_cols = int(round(radius_km * 1000.0 / lon_res_m)) if lon_res_m > 0 else 0
+        return focal_prominence(window.elevation, 2 * half_rows + 1, 2 * half_cols + 1)
+
+    def sample_prominence(self, window, prominence, lats, lons, spacing_m=None, method='focal'):
+        """
+        Prominence at candidate points. Topographic prominence is non-zero on
+        summits only, so each candidate takes the most prominent summit within
+        its own cell of a spacing_m candidate grid.
+        """
+        if method == 'topographic':
+            if spacing_m:
+                size = max(1, int(math.ceil(spacing_m / window.resolution_m)))
+                prominence = scipy.ndimage.maximum_filter(prominence, size=size, mode='nearest')
+            return sample_grid(prominence, window.lats, window.lons, lats, lons, order=0)
+        return sample_grid(prominence, window.lats, window.lons, lats, lons)
+
     def calculate_prominence(self, lat, lon, radius_km=5.0):
         """
         Calculate topographic prominence: height of peak relative to the lowest
@@ -31,19 +145,401 @@ class OptimizationService:
                 c_lon = min_lon + (j * lon_step)
                 coords.append((c_lat, c_lon))
                 
-        elevs = self.tile_manager.get_elevations_batch(coords)
+        # ~1km sample spacing, so a coarse pyramid level is enough
+        elevs = self.tile_manager.get_elevations_batch(coords, resolution_m=lat_step * 111000)
         
-        if not elevs:
+        if len(elevs) == 0:
             return 0
             
         center_elevation = self.tile_manager.get_elevation(lat, lon)
-        mean_elevation = sum(elevs) / len(elevs)
+        mean_elevation = float(np.mean(elevs))
         
         # Prominence approximation: Peak - Mean
         prominence = center_elevation - mean_elevation
         
         return max(0, prominence)
 
+    @staticmethod
+    def candidate_grid(min_lat, min_lon, max_lat, max_lon, steps_lat, steps_lon):
+        """
+        (steps_lat + 1) x (steps_lon + 1) candidates over the bbox, south-west
+        first and row-major, as a CANDIDATE_DTYPE array with fresnel = 1.
+        """
+        lats = np.linspace(min_lat, max_lat, steps_lat + 1)
+        lons = np.linspace(min_lon, max_lon, steps_lon + 1)
+        candidates = np.zeros(len(lats) * len(lons), dtype=CANDIDATE_DTYPE)
+        candidates['lat'] = np.repeat(lats, len(lons))
+        candidates['lon'] = np.tile(lons, len(lats))
+        candidates['fresnel'] = 1.0
+        return candidates
+
+    def fresnel_clearances(self, candidates, nodes, tx_height, freq_mhz, k_factor=1.333, clutter_height=0.0,
+                           max_link_km=DEFAULT_MAX_LINK_KM):
+        """
+        Fill candidates['fresnel'] with the clearance towards the nodes of a
+        NodeIndex, as check_fresnel_clearance does per candidate: the mean
+        clamped clearance over nodes at least 100m away, 1.0 without any.
+        Only nodes within max_link_km are analyzed, the others count as
+        blocked; their profiles are fetched in one lookup per
+        PAIR_CHUNK_SIZE links.
+        """
+        if not len(nodes):
+            candidates['fresnel'] = 1.0
+            return
+        cand_idx, node_idx = nodes.pairs(candidates['lat'], candidates['lon'], max_link_km * 1000.0)
+        dist_m = rf_physics.haversine_distance_batch(
+            candidates['lat'][cand_idx], candidates['lon'][cand_idx], nodes.lats[node_idx], nodes.lons[node_idx]
+        )
+        close = dist_m < 100 # Skip too close
+        linked = len(nodes) - np.bincount(cand_idx[close], minlength=len(candidates))
+        cand_idx, node_idx, dist_m = cand_idx[~close], node_idx[~close], dist_m[~close]
+
+        total = np.zeros(len(candidates))
+        for start in range(0, len(cand_idx), self.PAIR_CHUNK_SIZE):
+            c = cand_idx[start:start + self.PAIR_CHUNK_SIZE]
+            n = node_idx[start:start + self.PAIR_CHUNK_SIZE]
+            profiles = self.tile_manager.get_elevation_profiles(
+                np.column_stack((candidates['lat'][c], candidates['lon'][c])),
+                np.column_stack((nodes.lats[n], nodes.lons[n])), samples=20
+            )
+            res = rf_physics.analyze_links_batch(
+                profiles, dist_m[start:start + self.PAIR_CHUNK_SIZE], freq_mhz, tx_height, nodes.heights[n],
+                k_factor=k_factor, clutter_height=clutter_height, model=None
+            )
+            # Blocked links count as 0, clearance is clamped at 1.0 (100%)
+            total += np.bincount(c, weights=np.clip(res['min_clearance_ratio'], 0.0, 1.0), minlength=len(candidates))
+
+        candidates['fresnel'] = np.where(linked > 0, total / np.maximum(linked, 1), 1.0)
+
+    @staticmethod
+    def score_candidates(candidates, weights):
+        """
+        Vectorized score_candidate + normalization: elevation and prominence are
+        scaled by their batch maximum, fresnel is already 0-1, and the weighted
+        sum is scaled to 0-100. Fills candidates['score'] and returns
+        (max_elevation, max_prominence).
+        """
+        if len(candidates) == 0:
+            return 1.0, 1.0
+        max_elev = float(candidates['elevation'].max()) or 1.0
+        max_prom = float(candidates['prominence'].max()) or 1.0
+        norm_elev = candidates['elevation'] / max_elev if max_elev > 0 else 0.0
+        norm_prom = candidates['prominence'] / max_prom if max_prom > 0 else 0.0
+
+        candidates['score'] = np.round(100 * (
+            norm_elev * weights.get('elevation', 0.3)
+            + norm_prom * weights.get('prominence', 0.4)
+            + candidates['fresnel'] * weights.get('fresnel', 0.3)
+        ), 1)
+        return max_elev, max_prom
+
+    @staticmethod
+    def top_candidates(candidates, k=5):
+        """
+        Indices of the k best scores, best first, in O(n) (np.argpartition).
+        Ties keep grid order, matching a stable sort of the whole batch.
+        """
+        score = candidates['score']
+        if len(score) > k:
+            kth = score[np.argpartition(-score, k - 1)[k - 1]]
+            above = np.flatnonzero(score > kth)
+            tied = np.flatnonzero(score == kth)[:k - len(above)]
+            idx = np.concatenate((above, tied))
+        else:
+            idx = np.arange(len(score))
+        return idx[np.lexsort((idx, -score[idx]))]
+
+    @staticmethod
+    def candidates_at(lats, lons):
+        """
+        CANDIDATE_DTYPE array for arbitrary points, fresnel = 1.
+        """
+        candidates = np.zeros(len(lats), dtype=CANDIDATE_DTYPE)
+        candidates['lat'] = lats
+        candidates['lon'] = lons
+        candidates['fresnel'] = 1.0
+        return candidates
+
+    def refine_search(self, min_lat, min_lon, max_lat, max_lon, evaluate, weights,
+                      target_m=30.0, coarse_steps=32, top_k=8, refine_factor=4, max_evaluations=20000,
+                      on_stage=None):
+        """
+        Coarse-to-fine search for the best-scoring sites in the bbox.
+
+        Stage 0 evaluates a coarse_steps x coarse_steps grid. Each later stage
+        takes the top_k candidates found so far, at least two spacings apart so
+        windows do not pile up on one summit, and evaluates a window of +/- the
+        previous spacing around each one at 1/refine_factor of that spacing.
+        It stops once the spacing reaches target_m, or when the next stage
+        would go over max_evaluations (it is shrunk to fit first).
+
+        evaluate(lats, lons, spacing_m) returns a CANDIDATE_DTYPE array with
+        elevation, prominence and fresnel filled. Scores are normalized over
+        everything evaluated so far.
+        Returns (candidates, stages, converged). Each stage is
+        {stage, spacing_m, evaluations, seconds}.
+
+        on_stage(progress, batch, candidates, cols), when given, follows every
+        stage, as in optimize_location.
+        """
+        mid_lat = (min_lat + max_lat) / 2.0
+        m_per_deg_lat = 111320.0
+        m_per_deg_lon = 111320.0 * max(0.001, math.cos(math.radians(mid_lat)))
+        height_m = (max_lat - min_lat) * m_per_deg_lat
+        width_m = (max_lon - min_lon) * m_per_deg_lon
+
+        stages = []
+        seen = set()
+        found = []
+
+        def run_stage(lats, lons, spacing_m):
+            started = time.perf_counter()
+            # Windows overlap: evaluate each point once
+            fresh = np.zeros(len(lats), dtype=bool)
+            for i, key in enumerate(zip(np.round(lats, 7).tolist(), np.round(lons, 7).tolist())):
+                if key not in seen:
+                    seen.add(key)
+                    fresh[i] = True
+            batch = evaluate(lats[fresh], lons[fresh], spacing_m) if fresh.any() else self.candidates_at([], [])
+            found.append(batch)
+            stages.append({
+                "stage": len(stages),
+                "spacing_m": round(spacing_m, 1),
+                "evaluations": len(batch),
+                "seconds": round(time.perf_counter() - started, 3)
+            })
+
+        steps_lat = max(1, min(coarse_steps, int(height_m / target_m)))
+        steps_lon = max(1, min(coarse_steps, int(width_m / target_m)))
+        grid = self.candidate_grid(min_lat, min_lon, max_lat, max_lon, steps_lat, steps_lon)
+        spacing_m = max(height_m / steps_lat, width_m / steps_lon)
+        # Stages needed to reach target_m, for progress
+        expected = 1 + max(0, math.ceil(math.log(spacing_m / target_m, refine_factor) - 1e-9))
+
+        def report(candidates):
+            if on_stage is not None:
+                on_stage(min(1.0, len(stages) / expected), found[-1], candidates, 0)
+
+        run_stage(grid['lat'], grid['lon'], spacing_m)
+        candidates = found[0]
+        self.score_candidates(candidates, weights)
+        report(candidates)
+
+        converged = spacing_m <= target_m
+        evaluations = len(candidates)
+        while not converged:
+            step_m = max(spacing_m / refine_factor, target_m)
+            half = int(math.ceil(spacing_m / step_m))
+            per_window = (2 * half + 1) ** 2
+            k = min(top_k, (max_evaluations - evaluations) // per_window)
+            if k < 1:
+                break
+
+            offsets = np.arange(-half, half + 1) * step_m
+            top = self._spread_top(candidates, k, 2 * spacing_m, m_per_deg_lat, m_per_deg_lon)
+            d_lat = offsets / m_per_deg_lat
+            d_lon = offsets / m_per_deg_lon
+            lats = (candidates['lat'][top][:, None, None] + d_lat[None, :, None]).repeat(len(offsets), axis=2).ravel()
+            lons = (candidates['lon'][top][:, None, None] + d_lon[None, None, :]).repeat(len(offsets), axis=1).ravel()
+            inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+
+            run_stage(lats[inside], lons[inside], step_m)
+            candidates = np.concatenate(found)
+            self.score_candidates(candidates, weights)
+            report(candidates)
+            evaluations = len(candidates)
+            spacing_m = step_m
+            converged = spacing_m <= target_m
+
+        return candidates, stages, converged
+
+    def _spread_top(self, candidates, k, min_dist_m, m_per_deg_lat, m_per_deg_lon):
+        """
+        Best candidates, skipping any within min_dist_m of a better pick.
+        """
+        ranked = self.top_candidates(candidates, k * 16)
+        y = candidates['lat'][ranked] * m_per_deg_lat
+        x = candidates['lon'][ranked] * m_per_deg_lon
+        picked = []
+        for i in range(len(ranked)):
+            if all(math.hypot(y[i] - y[j], x[i] - x[j]) >= min_dist_m for j in picked):
+                picked.append(i)
+                if len(picked) == k:
+                    break
+        return ranked[picked]
+
+    @staticmethod
+    def candidate_records(candidates, idx):
+        """
+        Candidates as response dicts (fresnel_factor kept for older clients).
+        """
+        return [
+            {
+                "lat": float(c['lat']), "lon": float(c['lon']),
+                "elevation": float(c['elevation']), "prominence": float(c['prominence']),
+                "fresnel_factor": float(c['fresnel']), "fresnel": float(c['fresnel']),
+                "score": float(c['score'])
+            }
+            for c in candidates[idx]
+        ]
+
+    def optimize_location(self, params, on_stage=None):
+        """
+        One /optimize-location run over validated OptimizeRequest fields.
+
+        on_stage(progress, batch, candidates, cols), when given, is called after
+        every chunk of the grid search (CHUNK_SIZE candidates, whole rows) or
+        stage of the adaptive search: progress is 0-1, batch the candidates just
+        evaluated (cols per row, 0 for scattered points) and candidates all of
+        them so far, scored over what has been evaluated. It may raise to stop
+        the run.
+        """
+        weights = params['weights']
+        prominence_method = params['prominence_method']
+        # Indexed once, queried for every batch of candidates
+        nodes = NodeIndex(params['existing_nodes'])
+        max_link_km = params.get('max_link_km') or self.DEFAULT_MAX_LINK_KM
+
+        # Adaptive Grid
+        # Calculate dimensions in km
+        dist_lat_km = rf_physics.haversine_distance(params['min_lat'], params['min_lon'], params['max_lat'], params['min_lon']) / 1000.0
+        dist_lon_km = rf_physics.haversine_distance(params['min_lat'], params['min_lon'], params['min_lat'], params['max_lon']) / 1000.0
+
+        # Target resolution: 150m (0.15 km) unless the request asks for another
+        target_res_km = (params.get('resolution_m') or 150.0) / 1000.0
+
+        steps_lat = max(10, int(dist_lat_km / target_res_km))
+        steps_lon = max(10, int(dist_lon_km / target_res_km))
+
+        # Safety Cap: coarsen evenly to at most MAX_OPTIMIZE_CANDIDATES points
+        count = (steps_lat + 1) * (steps_lon + 1)
+        if count > MAX_OPTIMIZE_CANDIDATES:
+            factor = math.sqrt(count / MAX_OPTIMIZE_CANDIDATES)
+            steps_lat = max(10, int(steps_lat / factor))
+            steps_lon = max(10, int(steps_lon / factor))
+        spacing_m = max(dist_lat_km / steps_lat, dist_lon_km / steps_lon) * 1000
+
+        # One terrain raster (bbox + prominence radius) serves prominence for
+        # every candidate (and elevation on the grid search)
+        started = time.perf_counter()
+        window = self.load_window(
+            params['min_lat'], params['min_lon'], params['max_lat'], params['max_lon'],
+            resolution_m=min(target_res_km * 1000, spacing_m), margin_km=5.0
+        )
+        prominence = self.prominence_grid(window, radius_km=5.0, method=prominence_method)
+        terrain_seconds = round(time.perf_counter() - started, 3)
+
+        def evaluate(candidates, elevations, step_m):
+            candidates['elevation'] = elevations
+            candidates['prominence'] = self.sample_prominence(
+                window, prominence, candidates['lat'], candidates['lon'], spacing_m=step_m, method=prominence_method
+            )
+            self.fresnel_clearances(
+                candidates, nodes, params['tx_height'], params['frequency_mhz'],
+                k_factor=params['k_factor'], clutter_height=params['clutter_height'], max_link_km=max_link_km
+            )
+            return candidates
+
+        if params['search'] == "adaptive":
+            # Coarse scan, then finer windows around the best cells; elevations
+            # come from tiles at each stage's spacing, finer than the raster
+            def evaluate_points(lats, lons, step_m):
+                elevations = self.tile_manager.get_elevations_batch(np.column_stack((lats, lons)), resolution_m=step_m)
+                return evaluate(self.candidates_at(lats, lons), elevations, step_m)
+
+            candidates, stages, converged = self.refine_search(
+                params['min_lat'], params['min_lon'], params['max_lat'], params['max_lon'], evaluate_points, weights,
+                target_m=target_res_km * 1000, max_evaluations=params['max_evaluations'], on_stage=on_stage
+            )
+            grid = None
+        else:
+            started = time.perf_counter()
+            candidates = self.candidate_grid(
+                params['min_lat'], params['min_lon'], params['max_lat'], params['max_lon'], steps_lat, steps_lon
+            )
+            rows, cols = steps_lat + 1, steps_lon + 1
+            # Whole rows per chunk; unfollowed runs take the grid in one go
+            block = rows if on_stage is None else max(1, self.CHUNK_SIZE // cols)
+            for row in range(0, rows, block):
+                batch = candidates[row * cols:(row + block) * cols]
+                elevations = sample_grid(window.elevation, window.lats, window.lons, batch['lat'], batch['lon'])
+                evaluate(batch, elevations, spacing_m)
+                if on_stage is not None:
+                    done = candidates[:row * cols + len(batch)]
+                    self.score_candidates(done, weights)
+                    on_stage(len(done) / len(candidates), batch, done, cols)
+            stages = [{
+                "stage": 0,
+                "spacing_m": round(spacing_m, 1),
+                "evaluations": len(candidates),
+                "seconds": round(time.perf_counter() - started, 3)
+            }]
+            converged = True
+            grid = {"rows": rows, "cols": cols, "spacing_m": round(spacing_m, 1)}
+
+        # Normalize and Calculate Final Score
+        max_elev, max_prom = self.score_candidates(candidates, weights)
+
+        # Take top 5 for "Ghost Nodes"
+        top = self.top_candidates(candidates, 5)
+
+        response = {
+            "status": "success",
+            "locations": self.candidate_records(candidates, top),
+            "metadata": {
+                "max_elevation": max_elev,
+                "max_prominence": max_prom,
+                "candidates": len(candidates),
+                "grid": grid,
+                "search": {
+                    "method": params['search'],
+                    "stages": stages,
+                    "evaluations": len(candidates),
+                    "converged": converged,
+                    "terrain_seconds": terrain_seconds
+                },
+                "prominence_method": prominence_method,
+                "terrain_window": {
+                    "rows": len(window.lats),
+                    "cols": len(window.lons),
+                    "resolution_m": round(window.resolution_m, 1)
+                }
+            }
+        }
+
+        if params['return_heatmap']:
+            if grid is None:
+                # Refined points do not form a grid
+                response["heatmap"] = self.heatmap(candidates, 0, 0, "points")
+            else:
+                response["heatmap"] = self.heatmap(candidates, grid["rows"], grid["cols"], params['heatmap_format'])
+
+        return response
+
+    @staticmethod
+    def heatmap(candidates, rows, cols, heatmap_format="points"):
+        """
+        Candidate scores for the heatmap, straight from the candidate arrays.
+        'points': [{lat, lon, score}] (rounded to save bandwidth)
+        'grid':   row-major scores on lats x lons axes, south-west first
+        """
+        if heatmap_format == "grid":
+            return {
+                "rows": rows,
+                "cols": cols,
+                "lats": np.round(candidates['lat'][::cols], 5).tolist(),
+                "lons": np.round(candidates['lon'][:cols], 5).tolist(),
+                "scores": candidates['score'].tolist()
+            }
+        return [
+            {"lat": lat, "lon": lon, "score": score}
+            for lat, lon, score in zip(
+                np.round(candidates['lat'], 5).tolist(),
+                np.round(candidates['lon'], 5).tolist(),
+                candidates['score'].tolist()
+            )
+        ]
+
     def check_fresnel_clearance(self, tx_lat, tx_lon, tx_h_m, rx_list, freq_mhz, k_factor=1.333, clutter_height=0.0):
         """
         Check Fresnel zone clearance to a list of existing nodes.
@@ -53,37 +549,28 @@ class OptimizationService:
         if not rx_list:
             return 1.0 # No nodes to block, assume clear
             
-        total_clearance = 0
-        count = 0
-        
-        for rx in rx_list:
-            dist_m = rf_physics.haversine_distance(tx_lat, tx_lon, rx['lat'], rx['lon'])
-            if dist_m < 100: continue # Skip too close
-            
-            # Get profile
-            profile = self.tile_manager.get_elevation_profile(
-                tx_lat, tx_lon, rx['lat'], rx['lon'], samples=20
-            )
-            
-            # Analyze
-            res = rf_physics.analyze_link(
-                profile, dist_m, freq_mhz, tx_h_m, rx['height'],
-                k_factor=k_factor, clutter_height=clutter_height
-            )
-            
-            # Use min_clearance_ratio from rf_physics
-            min_ratio = res.get('min_clearance_ratio', 0)
-            
-            if min_ratio < 0:
-                clearance = 0.0 # Blocked
-            else:
-                # Clamp at 1.0 (100% clearance)
-                clearance = min(1.0, min_ratio)
-                
-            total_clearance += clearance
-            count += 1
-            
-        return total_clearance / count if count > 0 else 1.0
+        rx_lats = np.array([rx['lat'] for rx in rx_list], dtype=np.float64)
+        rx_lons = np.array([rx['lon'] for rx in rx_list], dtype=np.float64)
+        rx_heights = np.array([rx['height'] for rx in rx_list], dtype=np.float64)
+
+        dist_m = rf_physics.haversine_distance_batch(tx_lat, tx_lon, rx_lats, rx_lons)
+        keep = dist_m >= 100 # Skip too close
+        if not keep.any():
+            return 1.0
+
+        # All profiles in one lookup, all links in one pass
+        ends = np.column_stack((rx_lats[keep], rx_lons[keep]))
+        profiles = self.tile_manager.get_elevation_profiles(
+            np.broadcast_to((tx_lat, tx_lon), ends.shape), ends, samples=20
+        )
+        res = rf_physics.analyze_links_batch(
+            profiles, dist_m[keep], freq_mhz, tx_h_m, rx_heights[keep],
+            k_factor=k_factor, clutter_height=clutter_height, model=None
+        )
+
+        # Blocked links count as 0, clearance is clamped at 1.0 (100%)
+        clearance = np.clip(res['min_clearance_ratio'], 0.0, 1.0)
+        return float(np.mean(clearance))
 
     def score_candidate(self, candidate, weights, rx_list=None, tx_height=10.0, rx_height=2.0, freq_mhz=915.0, k_factor=1.333, clutter_height=0.0):
         """
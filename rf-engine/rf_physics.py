@@ -2,9 +2,14 @@
 import numpy as np
 import math
 
+import itm
+
 # Constants
 EARTH_RADIUS_KM = 6371.0
 
+# Models calculate_path_loss dispatches on
+PATH_LOSS_MODELS = ('bullington', 'fspl', 'hata', 'itm', 'itm_wasm')
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     R = EARTH_RADIUS_KM * 1000 # Meters
     phi1, phi2 = math.radians(lat1), math.radians(lat2)
@@ -127,10 +132,22 @@ def calculate_hata_loss(dist_m, freq_mhz, tx_h, rx_h, environment='urban_small')
     return max(0.0, loss)
 
 
-def calculate_path_loss(dist_m, elevs, freq_mhz, tx_h, rx_h, model='bullington', environment='suburban', k_factor=1.333, clutter_height=0.0):
+def calculate_itm_loss(dist_m, elevs, freq_mhz, tx_h, rx_h, itm_params=None):
+    """
+    ITM (Longley-Rice) point-to-point basic transmission loss in dB, or NaN
+    where ITM rejects the inputs (e.g. antenna heights below 0.5 m).
+    itm_params: optional overrides for itm.p2p_loss (climate, N_0, pol,
+    epsilon, sigma, mdvar, time, location, situation).
+    """
+    return float(calculate_itm_loss_batch(elevs, dist_m, freq_mhz, tx_h, rx_h, itm_params)[0])
+
+
+def calculate_path_loss(dist_m, elevs, freq_mhz, tx_h, rx_h, model='bullington', environment='suburban', k_factor=1.333, clutter_height=0.0, itm_params=None):
     """
     Generic Path Loss Calculator.
     Dispatches to specific model implementations.
+    ITM derives refractivity from N_0 (itm_params), so k_factor and
+    clutter_height only apply to Bullington.
     """
     dist_km = dist_m / 1000.0
     if dist_km < 0.001: return 0.0
@@ -145,8 +162,15 @@ def calculate_path_loss(dist_m, elevs, freq_mhz, tx_h, rx_h, model='bullington',
     if model == 'fspl':
         return fspl
         
-    # 3. Bullington (Terrain-Aware Diffraction)
-    if model == 'bullington' or model == 'itm' or model == 'itm_wasm':
+    # 3. Longley-Rice; falls through to Bullington for inputs ITM rejects
+    if model == 'itm' or model == 'itm_wasm':
+        loss = calculate_itm_loss(dist_m, elevs, freq_mhz, tx_h, rx_h, itm_params)
+        if not math.isnan(loss):
+            return loss
+        model = 'bullington'
+
+    # 4. Bullington (Terrain-Aware Diffraction)
+    if model == 'bullington':
         # Bullington is Diffraction ADDED to FSPL
         diffraction = calculate_bullington_loss(dist_m, elevs, freq_mhz, tx_h, rx_h, k_factor, clutter_height)
         return fspl + diffraction
@@ -155,62 +179,265 @@ def calculate_path_loss(dist_m, elevs, freq_mhz, tx_h, rx_h, model='bullington',
     return fspl
 
 
-def analyze_link(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor=1.333, clutter_height=0.0):
-    # Standard Analysis
-    elevs = np.array(elevs)
+def _link_geometry(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor, clutter_height):
+    """
+    Terrain (with earth bulge + clutter), LOS line and first Fresnel radius
+    along an evenly sampled profile. Fresnel radius is 0 within 1m of either end.
+    """
     num_points = len(elevs)
     dists = np.linspace(0, dist_m, num_points)
-    
-    k = k_factor
-    R_eff = k * EARTH_RADIUS_KM * 1000
-    
+
+    R_eff = k_factor * EARTH_RADIUS_KM * 1000
+
     d_tx = dists
     d_rx = dist_m - dists
     bulge = (d_tx * d_rx) / (2 * R_eff)
-    
+
     terrain_h = elevs + bulge + clutter_height
-    
+
     tx_alt = elevs[0] + tx_h
     rx_alt = elevs[-1] + rx_h
     los_h = np.linspace(tx_alt, rx_alt, num_points)
-    
-    clearance = los_h - terrain_h
-    
-    min_clearance_ratio = 100.0
-    
-    for i in range(num_points):
-        d1 = dists[i]
-        d2 = dist_m - d1
-        if d1 < 1 or d2 < 1: continue
-            
-        f1 = calculate_fresnel_zone(dist_m, freq_mhz, d1, d2)
-        ratio = clearance[i] / f1
-        if ratio < min_clearance_ratio:
-            min_clearance_ratio = ratio
-            
-    status = "viable"
+
+    # Same arithmetic as calculate_fresnel_zone, for every sample at once
+    valid = (d_tx >= 1) & (d_rx >= 1)
+    wavelength = 2.99792e8 / (freq_mhz * 1e6)
+    fresnel = np.zeros(num_points)
+    fresnel[valid] = np.sqrt((wavelength * d_tx[valid] * d_rx[valid]) / dist_m)
+
+    return terrain_h, los_h, fresnel, valid
+
+
+def _min_clearance_ratio(clearance, fresnel, valid):
+    ratios = clearance[valid] / fresnel[valid]
+    ratios = ratios[~np.isnan(ratios)]
+    # 100.0 when no interior sample exists (very short links)
+    return min(100.0, float(ratios.min())) if ratios.size else 100.0
+
+
+def _link_status(min_clearance_ratio):
     if min_clearance_ratio < 0:
-        status = "blocked"
-    elif min_clearance_ratio < 0.6:
-        status = "degraded"
-        
-    # Calculate arrays for visualization
-    fresnel_zones = []
-    for i in range(num_points):
-        d1 = dists[i]
-        d2 = dist_m - d1
-        if d1 < 1 or d2 < 1:
-            fresnel_zones.append(0.0)
-        else:
-            fresnel_zones.append(calculate_fresnel_zone(dist_m, freq_mhz, d1, d2))
-            
+        return "blocked"
+    if min_clearance_ratio < 0.6:
+        return "degraded"
+    return "viable"
+
+
+def analyze_link_metrics(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor=1.333, clutter_height=0.0):
+    """
+    analyze_link without the per-sample profile lists, for callers that
+    only need the clearance verdict (viewshed cells, inter-node links).
+    """
+    elevs = np.asarray(elevs, dtype=np.float64)
+    terrain_h, los_h, fresnel, valid = _link_geometry(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor, clutter_height)
+    min_clearance_ratio = _min_clearance_ratio(los_h - terrain_h, fresnel, valid)
+
     return {
         "dist_km": dist_m / 1000,
-        "status": status,
-        "min_clearance_ratio": float(min_clearance_ratio),
+        "status": _link_status(min_clearance_ratio),
+        "min_clearance_ratio": min_clearance_ratio,
+        "path_loss_db": 0.0
+    }
+
+
+def analyze_link(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor=1.333, clutter_height=0.0):
+    # Standard Analysis
+    elevs = np.array(elevs)
+    terrain_h, los_h, fresnel, valid = _link_geometry(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor, clutter_height)
+    min_clearance_ratio = _min_clearance_ratio(los_h - terrain_h, fresnel, valid)
+
+    return {
+        "dist_km": dist_m / 1000,
+        "status": _link_status(min_clearance_ratio),
+        "min_clearance_ratio": min_clearance_ratio,
         "path_loss_db": 0.0,
         "profile": elevs.tolist(),
         "los_profile": los_h.tolist(),
-        "fresnel_profile": fresnel_zones,
+        "fresnel_profile": fresnel.tolist(),
         "terrain_profile": terrain_h.tolist() # Includes curvature + clutter
     }
+
+
+# --- Batch API ---
+# Each function takes an (M, S) matrix of evenly sampled profiles (one link
+# per row). Per-link parameters may be scalars or length-M arrays and are
+# broadcast, so a whole ring of viewshed cells or every node pair can be
+# evaluated in one NumPy pass.
+
+def haversine_distance_batch(lat1, lon1, lat2, lon2):
+    R = EARTH_RADIUS_KM * 1000 # Meters
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(np.asarray(lat2) - lat1)
+    dlambda = np.radians(np.asarray(lon2) - lon1)
+
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    return R * c
+
+
+def _batch_args(elevs, *params):
+    elevs = np.atleast_2d(np.asarray(elevs, dtype=np.float64))
+    m = elevs.shape[0]
+    return (elevs,) + tuple(np.broadcast_to(np.asarray(p, dtype=np.float64), (m,)) for p in params)
+
+
+def calculate_bullington_loss_batch(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor=1.333, clutter_height=0.0):
+    """
+    Vectorized calculate_bullington_loss. Returns diffraction loss (dB) per row.
+    """
+    elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor, clutter_height = _batch_args(
+        elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor, clutter_height
+    )
+    m, num_points = elevs.shape
+    if num_points < 3:
+        return np.zeros(m)
+
+    dists = np.linspace(0, dist_m, num_points, axis=-1)
+    d = dist_m[:, None]
+
+    tx_alt = elevs[:, 0] + tx_h
+    rx_alt = elevs[:, -1] + rx_h
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (rx_alt - tx_alt) / dist_m
+
+    R_eff = (k_factor * EARTH_RADIUS_KM * 1000)[:, None]
+    d1 = dists
+    d2 = d - dists
+    bulge = (d1 * d2) / (2 * R_eff)
+
+    effective_terrain = elevs + bulge + clutter_height[:, None]
+    los_h = (slope[:, None] * dists) + tx_alt[:, None]
+    h_vec = effective_terrain - los_h
+
+    wavelength = (2.99792e8 / (freq_mhz * 1e6))[:, None]
+    valid_mask = (d1 > 1.0) & (d2 > 1.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        geom = np.sqrt((2 * d) / (wavelength * d1 * d2))
+        v_vec = np.where(valid_mask, h_vec * geom, -np.inf)
+    max_v = v_vec.max(axis=1)
+
+    term = max_v - 0.1
+    with np.errstate(invalid='ignore'):
+        loss = 6.9 + 20 * np.log10(np.sqrt(term**2 + 1) + term)
+    return np.where(max_v <= -0.78, 0.0, np.maximum(0.0, loss))
+
+
+def calculate_hata_loss_batch(dist_m, freq_mhz, tx_h, rx_h, environment='urban_small'):
+    """
+    Vectorized calculate_hata_loss (environment is shared by all links).
+    """
+    d = np.maximum(0.1, np.asarray(dist_m, dtype=np.float64) / 1000.0)
+    f = np.asarray(freq_mhz, dtype=np.float64)
+    hb = np.maximum(1, tx_h)
+    hm = np.maximum(1, rx_h)
+
+    logF = np.log10(f)
+    logHb = np.log10(hb)
+    logD = np.log10(d)
+
+    a_hm = (1.1 * logF - 0.7) * hm - (1.56 * logF - 0.8)
+    if environment == 'urban_large':
+        a_hm = np.where(
+            f >= 400,
+            3.2 * (np.log10(11.75 * hm)**2) - 4.97,
+            8.29 * (np.log10(1.54 * hm)**2) - 1.1
+        )
+
+    loss = 69.55 + 26.16 * logF - 13.82 * logHb - a_hm + (44.9 - 6.55 * logHb) * logD
+
+    if environment == 'suburban':
+        loss = loss - 2 * (np.log10(f / 28)**2) - 5.4
+    elif environment == 'rural':
+        loss = loss - 4.78 * (logF**2) + 18.33 * logF - 40.94
+
+    return np.maximum(0.0, loss)
+
+
+def calculate_itm_loss_batch(elevs, dist_m, freq_mhz, tx_h, rx_h, itm_params=None):
+    """
+    Vectorized calculate_itm_loss. freq_mhz may be (M, F) to evaluate every
+    profile at F frequencies; the terrain analysis runs once per profile.
+    """
+    elevs, dist_m, tx_h, rx_h = _batch_args(elevs, dist_m, tx_h, rx_h)
+    return itm.p2p_tls(elevs, dist_m, freq_mhz, tx_h, rx_h, **(itm_params or {}))
+
+
+def calculate_path_loss_batch(dist_m, elevs, freq_mhz, tx_h, rx_h, model='bullington', environment='suburban', k_factor=1.333, clutter_height=0.0, itm_params=None):
+    """
+    Vectorized calculate_path_loss. Returns path loss (dB) per row of elevs.
+    """
+    elevs, dist_m, freq_mhz, tx_h, rx_h = _batch_args(elevs, dist_m, freq_mhz, tx_h, rx_h)
+    dist_km = dist_m / 1000.0
+    too_close = dist_km < 0.001
+
+    if model == 'hata':
+        loss = calculate_hata_loss_batch(dist_m, freq_mhz, tx_h, rx_h, environment)
+        return np.where(too_close, 0.0, loss)
+
+    with np.errstate(divide='ignore'):
+        fspl = 20 * np.log10(dist_km) + 20 * np.log10(freq_mhz) + 32.45
+
+    if model in ('itm', 'itm_wasm'):
+        loss = calculate_itm_loss_batch(elevs, dist_m, freq_mhz, tx_h, rx_h, itm_params)
+        rejected = np.isnan(loss)
+        if rejected.any():
+            bullington = fspl + calculate_bullington_loss_batch(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor, clutter_height)
+            loss = np.where(rejected, bullington, loss)
+        return np.where(too_close, 0.0, loss)
+
+    if model == 'bullington':
+        fspl = fspl + calculate_bullington_loss_batch(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor, clutter_height)
+
+    return np.where(too_close, 0.0, fspl)
+
+
+def analyze_links_batch(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor=1.333, clutter_height=0.0, model='bullington', environment='suburban', itm_params=None):
+    """
+    Vectorized analyze_link_metrics plus path loss.
+    Returns {"min_clearance_ratio", "status", "path_loss_db"} as length-M arrays;
+    model=None skips the path loss (path_loss_db is None).
+    """
+    elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor, clutter_height = _batch_args(
+        elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor, clutter_height
+    )
+    num_points = elevs.shape[1]
+    dists = np.linspace(0, dist_m, num_points, axis=-1)
+    d = dist_m[:, None]
+
+    R_eff = (k_factor * EARTH_RADIUS_KM * 1000)[:, None]
+    d_tx = dists
+    d_rx = d - dists
+    bulge = (d_tx * d_rx) / (2 * R_eff)
+    terrain_h = elevs + bulge + clutter_height[:, None]
+
+    tx_alt = elevs[:, 0] + tx_h
+    rx_alt = elevs[:, -1] + rx_h
+    los_h = np.linspace(tx_alt, rx_alt, num_points, axis=-1)
+
+    valid = (d_tx >= 1) & (d_rx >= 1)
+    wavelength = (2.99792e8 / (freq_mhz * 1e6))[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fresnel = np.sqrt((wavelength * d_tx * d_rx) / d)
+        ratios = (los_h - terrain_h) / fresnel
+    ratios = np.where(valid & ~np.isnan(ratios), ratios, np.inf)
+    min_clearance_ratio = np.minimum(100.0, ratios.min(axis=1))
+
+    status = np.where(
+        min_clearance_ratio < 0, "blocked",
+        np.where(min_clearance_ratio < 0.6, "degraded", "viable")
+    )
+
+    path_loss_db = None
+    if model is not None:
+        path_loss_db = calculate_path_loss_batch(
+            dist_m, elevs, freq_mhz, tx_h, rx_h,
+            model=model, environment=environment, k_factor=k_factor, clutter_height=clutter_height,
+            itm_params=itm_params
+        )
+
+    return {
+        "min_clearance_ratio": min_clearance_ratio,
+        "status": status,
+        "path_loss_db": path_loss_db
+    }
@@ -29,9 +29,14 @@ app.add_middleware(
 
 # --- Dependencies ---
 import redis
+import redis.asyncio as redis_async
 from tile_manager import TileManager
 import rf_physics
-from optimization_service import OptimizationService
+from optimization_service import OptimizationService, MAX_OPTIMIZE_CANDIDATES
+from artifact_store import ArtifactStore
+from task_events import TaskEventHub, publish_event, request_cancel
+from core.terrain import PROMINENCE_METHODS
+from core.selection import METHODS as SELECTION_METHODS
 
 # --- Initialization ---
 REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
@@ -40,6 +45,7 @@ REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "changeme")
 redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, password=REDIS_PASSWORD)
 tile_manager = TileManager(redis_client)
 optimization_service = OptimizationService(tile_manager)
+artifact_store = ArtifactStore(redis_client, ttl=int(os.environ.get("ARTIFACT_TTL", 24 * 60 * 60)))
 
 class LinkRequest(BaseModel):
     tx_lat: float
@@ -49,10 +55,14 @@ class LinkRequest(BaseModel):
     frequency_mhz: float
     tx_height: float
     rx_height: float
-    model: str = "bullington" # bullington, fspl
+    model: str = "bullington" # bullington, fspl, hata, itm
     environment: str = "suburban"
     k_factor: float = 1.333
     clutter_height: float = 0.0
+    # ITM ground / climate (defaults match the frontend's "Average Ground")
+    epsilon: float = 15.0
+    sigma: float = 0.005
+    climate: int = 5
 
     @field_validator('tx_lat', 'rx_lat')
     @classmethod
@@ -81,13 +91,13 @@ def calculate_link_endpoint(req: LinkRequest):
     )
     
     # Get elevation profile along path
-    elevs = tile_manager.get_elevation_profile(
-        req.tx_lat, req.tx_lon,
-        req.rx_lat, req.rx_lon,
-        samples=100 # Increased samples for ITM accuracy
-    )
+    with tile_manager.track_degraded() as degraded:
+        elevs = tile_manager.get_elevation_profile(
+            req.tx_lat, req.tx_lon,
+            req.rx_lat, req.rx_lon,
+            samples=100 # Increased samples for ITM accuracy
+        )
     
-    # Calculate Path Loss (ITM or FSPL)
     # Calculate Path Loss (Generic Dispatcher)
     path_loss_db = rf_physics.calculate_path_loss(
         dist_m,
@@ -98,7 +108,8 @@ def calculate_link_endpoint(req: LinkRequest):
         model=req.model,
         environment=req.environment,
         k_factor=req.k_factor,
-        clutter_height=req.clutter_height
+        clutter_height=req.clutter_height,
+        itm_params={"epsilon": req.epsilon, "sigma": req.sigma, "climate": req.climate}
     )
     
     # Analyze link with correct signature
@@ -114,6 +125,7 @@ def calculate_link_endpoint(req: LinkRequest):
     
     result['path_loss_db'] = float(path_loss_db)
     result['model_used'] = req.model
+    result['degraded_tiles'] = sorted(degraded)
     
     return result
 
@@ -140,8 +152,9 @@ def get_elevation_endpoint(req: ElevationRequest):
     """
     Get elevation for a single point.
     """
-    elevation = tile_manager.get_elevation(req.lat, req.lon)
-    return {"elevation": elevation}
+    with tile_manager.track_degraded() as degraded:
+        elevation = tile_manager.get_elevation(req.lat, req.lon)
+    return {"elevation": elevation, "degraded_tiles": sorted(degraded)}
 
 
 class BatchElevationRequest(BaseModel):
@@ -166,18 +179,20 @@ def get_batch_elevation(req: BatchElevationRequest, request: Request):
                 coords.append((lat, lng))
         
         # Fetch elevations in parallel
-        elevs = tile_manager.get_elevations_batch(coords)
+        with tile_manager.track_degraded() as degraded:
+            elevs = tile_manager.get_elevations_batch(coords)
         
         results = []
         for i, (lat, lon) in enumerate(coords):
             results.append({
-                "elevation": elevs[i],
+                "elevation": float(elevs[i]),
                 "location": {"lat": lat, "lng": lon}
             })
         
         return {
             "status": "OK",
-            "results": results
+            "results": results,
+            "degraded_tiles": sorted(degraded)
         }
     except Exception as e:
         from fastapi.responses import JSONResponse
@@ -189,7 +204,11 @@ def get_batch_elevation(req: BatchElevationRequest, request: Request):
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "tile_cache": tile_manager.cache_stats(),
+        "elevation_backend": tile_manager.backend_stats()
+    }
 
 @app.get("/tiles/{z}/{x}/{y}.png")
 def get_elevation_tile(z: int, x: int, y: int):
@@ -232,6 +251,16 @@ class ScanRequest(BaseModel):
     rx_height: float = 2.0
     k_factor: float = 1.333
     clutter_height: float = 0.0
+    engine: str = "profile" # profile, radial
+    mode: str = "visibility" # visibility, rssi
+    selection: str = "lazy" # greedy, lazy, stochastic (only with optimize_n)
+    # RSSI mode link budget
+    model: str = "bullington" # bullington, fspl, hata, itm
+    environment: str = "suburban"
+    tx_power_dbm: float = 20.0
+    tx_gain_dbi: float = 2.15
+    rx_gain_dbi: float = 2.15
+    rx_sensitivity_dbm: float = -120.0
 
     @field_validator('radius')
     @classmethod
@@ -240,6 +269,34 @@ class ScanRequest(BaseModel):
             raise ValueError('Radius must be between 100 and 50000 meters')
         return v
 
+    @field_validator('engine')
+    @classmethod
+    def validate_engine(cls, v):
+        if v not in ("profile", "radial"):
+            raise ValueError("engine must be 'profile' or 'radial'")
+        return v
+
+    @field_validator('mode')
+    @classmethod
+    def validate_mode(cls, v):
+        if v not in ("visibility", "rssi"):
+            raise ValueError("mode must be 'visibility' or 'rssi'")
+        return v
+
+    @field_validator('selection')
+    @classmethod
+    def validate_selection(cls, v):
+        if v not in SELECTION_METHODS:
+            raise ValueError(f'selection must be one of {SELECTION_METHODS}')
+        return v
+
+    @field_validator('model')
+    @classmethod
+    def validate_model(cls, v):
+        if v not in rf_physics.PATH_LOSS_MODELS:
+            raise ValueError(f'model must be one of {rf_physics.PATH_LOSS_MODELS}')
+        return v
+
 @app.post("/scan/start")
 @limiter.limit("5/minute")
 def start_scan_endpoint(req: ScanRequest, request: Request):
@@ -260,45 +317,137 @@ def start_scan_endpoint(req: ScanRequest, request: Request):
             "frequency_mhz": req.frequency_mhz,
             "rx_height": req.rx_height,
             "k_factor": req.k_factor,
-            "clutter_height": req.clutter_height
+            "clutter_height": req.clutter_height,
+            "engine": req.engine,
+            "mode": req.mode,
+            "selection": req.selection,
+            "model": req.model,
+            "environment": req.environment,
+            "tx_power_dbm": req.tx_power_dbm,
+            "tx_gain_dbi": req.tx_gain_dbi,
+            "rx_gain_dbi": req.rx_gain_dbi,
+            "rx_sensitivity_dbm": req.rx_sensitivity_dbm
         }
     })
     
     return {"status": "started", "task_id": task.id}
 
 
+MAX_PREFETCH_TILES = int(os.environ.get("MAX_PREFETCH_TILES", 20000))
+
+class PrefetchRequest(BaseModel):
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+    zoom: Optional[int] = None
+    concurrency: int = 8
+
+    @field_validator('concurrency')
+    @classmethod
+    def validate_concurrency(cls, v):
+        if not 1 <= v <= 32:
+            raise ValueError('Concurrency must be between 1 and 32')
+        return v
+
+@app.post("/tiles/prefetch")
+@limiter.limit("2/minute")
+def prefetch_tiles_endpoint(req: PrefetchRequest, request: Request):
+    """
+    Start warming the tile cache for a bounding box (Celery).
+    Progress is reported through /task_status/{task_id}.
+    """
+    from tasks.prefetch import prefetch_tiles
+
+    bbox = [req.min_lon, req.min_lat, req.max_lon, req.max_lat]
+    tile_count = tile_manager.count_tiles(bbox, req.zoom)
+    if tile_count > MAX_PREFETCH_TILES:
+        return {"status": "error", "message": f"Area covers {tile_count} tiles (max {MAX_PREFETCH_TILES})"}
+
+    task = prefetch_tiles.delay({"bbox": bbox, "zoom": req.zoom, "concurrency": req.concurrency})
+    return {"status": "started", "task_id": task.id, "tiles": tile_count}
+
+
+def _task_state_event(task_id):
+    """
+    Current state of a task from the Celery result backend, as a task event.
+    """
+    from celery.result import AsyncResult
+    from worker import celery_app
+
+    task = AsyncResult(task_id, app=celery_app)
+    if task.state == 'PROGRESS':
+        return {"event": "progress", "data": task.info or {}}
+    if task.state == 'SUCCESS':
+        return {"event": "complete", "data": task.result}
+    if task.state == 'FAILURE':
+        return {"event": "error", "data": str(task.info)}
+    if task.state == 'REVOKED':
+        return {"event": "cancelled", "data": {"status": "cancelled"}}
+    return {"event": "progress", "data": {"progress": 0}}
+
+# One pub/sub subscription per followed task, shared by all its SSE clients
+task_event_hub = TaskEventHub(
+    redis_async.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, password=REDIS_PASSWORD),
+    fallback=_task_state_event
+)
+
 @app.get("/task_status/{task_id}")
 async def task_status_endpoint(task_id: str):
     """
     SSE Endpoint for Task Progress.
+    Replays the task's last known state, then relays the events its worker
+    publishes until it completes or fails.
     """
     from sse_starlette.sse import EventSourceResponse
-    from celery.result import AsyncResult
-    from worker import celery_app
     import json
-    import asyncio
 
     async def event_generator():
-        task = AsyncResult(task_id, app=celery_app)
-        while True:
-            # Check status
-            if task.state == 'PENDING':
-                yield json.dumps({"event": "progress", "data": {"progress": 0}})
-            elif task.state == 'PROGRESS':
-                meta = task.info or {}
-                yield json.dumps({"event": "progress", "data": meta})
-            elif task.state == 'SUCCESS':
-                yield json.dumps({"event": "complete", "data": task.result})
-                break
-            elif task.state == 'FAILURE':
-                yield json.dumps({"event": "error", "data": str(task.info)})
-                break
-            
-            await asyncio.sleep(0.5)
+        async for event in task_event_hub.subscribe(task_id):
+            yield json.dumps(event)
 
     return EventSourceResponse(event_generator())
 
 
+@app.post("/tasks/{task_id}/cancel")
+def cancel_task_endpoint(task_id: str):
+    """
+    Cancel a background task (scan, tile prefetch or optimize-location job).
+    Queued tasks are revoked; running ones stop at their next cancellation
+    check. Followers of /task_status/{task_id} get a "cancelled" event.
+    """
+    from celery.result import AsyncResult
+    from worker import celery_app
+
+    task = AsyncResult(task_id, app=celery_app)
+    if task.ready():
+        return {"status": "finished", "state": task.state}
+
+    request_cancel(redis_client, task_id)
+    celery_app.control.revoke(task_id)
+    if task.state == 'PENDING':
+        # A revoked task that never starts publishes nothing itself
+        publish_event(redis_client, task_id, "cancelled", {"status": "cancelled"})
+    return {"status": "cancelling", "task_id": task_id}
+
+
+@app.get("/artifacts/{artifact_id}")
+def get_artifact_endpoint(artifact_id: str):
+    """
+    Raster or image produced by a task, referenced by id from its result
+    (e.g. composite.image_id of a scan).
+    """
+    from fastapi import HTTPException
+
+    artifact = artifact_store.get(artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found or expired")
+    data, content_type = artifact
+    # Ids are content hashes, so an id always maps to the same bytes
+    return Response(content=data, media_type=content_type,
+                    headers={"Cache-Control": f"private, max-age={artifact_store.ttl}, immutable"})
+
+
 class OptimizeRequest(BaseModel):
     min_lat: float
     min_lon: float
@@ -310,6 +459,12 @@ class OptimizeRequest(BaseModel):
     k_factor: float = 1.333
     clutter_height: float = 0.0
     return_heatmap: bool = False
+    heatmap_format: str = "points" # points, grid
+    resolution_m: Optional[float] = None # candidate spacing, default 150m
+    prominence_method: str = "focal" # focal, topographic
+    search: str = "grid" # grid, adaptive (coarse-to-fine refinement)
+    max_evaluations: int = 20000 # adaptive search work budget
+    max_link_km: float = 50.0 # existing nodes farther away count as blocked
     weights: dict = {"elevation": 0.5, "prominence": 0.3, "fresnel": 0.2}
     existing_nodes: list = [] # List of {lat, lon, height}
 
@@ -327,6 +482,48 @@ class OptimizeRequest(BaseModel):
             raise ValueError('Longitude must be between -180 and 180')
         return v
 
+    @field_validator('resolution_m')
+    @classmethod
+    def validate_resolution(cls, v):
+        if v is not None and v < 10:
+            raise ValueError('resolution_m must be at least 10 meters')
+        return v
+
+    @field_validator('heatmap_format')
+    @classmethod
+    def validate_heatmap_format(cls, v):
+        if v not in ("points", "grid"):
+            raise ValueError("heatmap_format must be 'points' or 'grid'")
+        return v
+
+    @field_validator('search')
+    @classmethod
+    def validate_search(cls, v):
+        if v not in ("grid", "adaptive"):
+            raise ValueError("search must be 'grid' or 'adaptive'")
+        return v
+
+    @field_validator('max_evaluations')
+    @classmethod
+    def validate_max_evaluations(cls, v):
+        if not 100 <= v <= MAX_OPTIMIZE_CANDIDATES:
+            raise ValueError(f'max_evaluations must be between 100 and {MAX_OPTIMIZE_CANDIDATES}')
+        return v
+
+    @field_validator('max_link_km')
+    @classmethod
+    def validate_max_link_km(cls, v):
+        if not 0.1 <= v <= 500:
+            raise ValueError('max_link_km must be between 0.1 and 500 km')
+        return v
+
+    @field_validator('prominence_method')
+    @classmethod
+    def validate_prominence_method(cls, v):
+        if v not in PROMINENCE_METHODS:
+            raise ValueError(f'prominence_method must be one of {PROMINENCE_METHODS}')
+        return v
+
 @app.post("/optimize-location")
 @limiter.limit("10/minute")
 def optimize_location_endpoint(req: OptimizeRequest, request: Request):
@@ -334,101 +531,13 @@ def optimize_location_endpoint(req: OptimizeRequest, request: Request):
     Find best location using multi-criteria analysis (elevation, prominence, fresnel).
     """
     try:
-        # Adaptive Grid
-        # Calculate dimensions in km
-        dist_lat_km = rf_physics.haversine_distance(req.min_lat, req.min_lon, req.max_lat, req.min_lon) / 1000.0
-        dist_lon_km = rf_physics.haversine_distance(req.min_lat, req.min_lon, req.min_lat, req.max_lon) / 1000.0
-        
-        # Target resolution: 150m (0.15 km)
-        target_res_km = 0.15
-        
-        steps_lat = int(dist_lat_km / target_res_km)
-        steps_lon = int(dist_lon_km / target_res_km)
-        
-        # Safety Caps (Min 10, Max 50 -> 2500 points max)
-        steps_lat = max(10, min(50, steps_lat))
-        steps_lon = max(10, min(50, steps_lon))
-        
-        lat_step = (req.max_lat - req.min_lat) / steps_lat
-        lon_step = (req.max_lon - req.min_lon) / steps_lon
-        
-        coords = []
-        for i in range(steps_lat + 1):
-            for j in range(steps_lon + 1):
-                lat = req.min_lat + (i * lat_step)
-                lon = req.min_lon + (j * lon_step)
-                coords.append((lat, lon))
-                
-        # Batch fetch elevations
-        elevs = tile_manager.get_elevations_batch(coords)
-        
-        candidates = []
-        for i, (lat, lon) in enumerate(coords):
-            # Basic Candidate
-            cand = {
-                "lat": lat, 
-                "lon": lon, 
-                "elevation": elevs[i]
-            }
-            # Score Components
-            metrics = optimization_service.score_candidate(
-                cand, 
-                req.weights, 
-                req.existing_nodes,
-                tx_height=req.tx_height,
-                rx_height=req.rx_height,
-                freq_mhz=req.frequency_mhz,
-                k_factor=req.k_factor,
-                clutter_height=req.clutter_height
-            )
-            cand.update(metrics) # Adds prominence, fresnel
-            candidates.append(cand)
-
-        # Normalize and Calculate Final Score
-        if not candidates:
-             return {"status": "success", "locations": []}
-             
-        max_elev = max([c['elevation'] for c in candidates]) or 1.0
-        max_prom = max([c['prominence'] for c in candidates]) or 1.0
-        # Fresnel is already 0-1
-        
-        w_elev = req.weights.get("elevation", 0.3)
-        w_prom = req.weights.get("prominence", 0.4)
-        w_fres = req.weights.get("fresnel", 0.3)
-        
-        for c in candidates:
-            norm_elev = c['elevation'] / max_elev if max_elev > 0 else 0
-            norm_prom = c['prominence'] / max_prom if max_prom > 0 else 0
-            
-            c['score'] = (norm_elev * w_elev) + (norm_prom * w_prom) + (c['fresnel'] * w_fres)
-            # Scale to 0-100 for display
-            c['score'] = round(c['score'] * 100, 1)
-
-        # Sort by Score desc
-        candidates.sort(key=lambda x: x["score"], reverse=True)
-        
-        # Take top 5 for "Ghost Nodes"
-        top_results = candidates[:5]
-
-        response = {
-            "status": "success",
-            "locations": top_results,
-            "metadata": {
-                "max_elevation": max_elev,
-                "max_prominence": max_prom
-            }
-        }
-        
-        if req.return_heatmap:
-            # Send simplified data for heatmap (lat, lon, score)
-            # To save bandwidth, maybe round lat/lon?
-            heatmap_data = [
-                {"lat": round(c['lat'], 5), "lon": round(c['lon'], 5), "score": c['score']}
-                for c in candidates
-            ]
-            response["heatmap"] = heatmap_data
-
-        return response
+        from fastapi.responses import JSONResponse
+        with tile_manager.track_degraded() as degraded:
+            response = optimization_service.optimize_location(req.model_dump())
+        response["degraded_tiles"] = sorted(degraded)
+        # Plain JSON: the heatmap can hold hundreds of thousands of points,
+        # too many for FastAPI's per-object encoder
+        return JSONResponse(content=response)
     except Exception as e:
         print(f"Optimize Error: {e}")
         from fastapi.responses import JSONResponse
@@ -437,6 +546,20 @@ def optimize_location_endpoint(req: OptimizeRequest, request: Request):
             content={"status": "error", "message": f"Server Error: {str(e)}"}
         )
 
+@app.post("/optimize-location/start")
+@limiter.limit("10/minute")
+def start_optimize_location_endpoint(req: OptimizeRequest, request: Request):
+    """
+    Start /optimize-location as a cancellable background job (Celery).
+    Progress, provisional top locations and heatmap chunks are reported
+    through /task_status/{task_id}; the final heatmap is an artifact
+    (heatmap_id).
+    """
+    from tasks.optimize import optimize_location
+
+    task = optimize_location.delay(req.model_dump())
+    return {"status": "started", "task_id": task.id}
+
 class ExportRequest(BaseModel):
     locations: list
     format: str = "csv" # csv, kml
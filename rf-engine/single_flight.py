@@ -0,0 +1,100 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    In-process call coalescing. Concurrent do(key, fn) calls for the same key
+    share a single execution of fn; the in-flight entry is dropped as soon as
+    that execution finishes, so the map only ever holds active keys.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def do(self, key, fn):
+        """
+        Returns (result, leader) where leader is True for the caller that
+        actually ran fn. Exceptions from fn propagate to every waiter.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return future.result(), False
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, True
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._inflight)
+
+
+# Delete the lease only while it still holds our token, in one step
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """
+    Cross-process fetch lease: SET NX with a TTL so exactly one process
+    performs an upstream fetch while the others wait for its result.
+    The TTL bounds how long waiters can be stalled by a crashed holder.
+    """
+
+    def __init__(self, redis_client, ttl_ms=15000, poll_interval=0.1):
+        self.redis = redis_client
+        self.ttl_ms = ttl_ms
+        self.poll_interval = poll_interval
+
+    def acquire(self, key):
+        """
+        Returns a token if the lease was taken, otherwise None.
+        """
+        token = uuid.uuid4().hex
+        if self.redis.set(f"lease:{key}", token, nx=True, px=self.ttl_ms):
+            return token
+        return None
+
+    def release(self, key, token):
+        """
+        Drop the lease if this token still holds it. Atomic, so a lease that
+        expired and was taken by another process is left alone.
+        """
+        self.redis.eval(_RELEASE_SCRIPT, 1, f"lease:{key}", token)
+
+    def wait(self, key, check):
+        """
+        Poll check() until it returns a value or the lease is released or
+        expires. Returns the value, or None if the holder gave up.
+        """
+        deadline = time.monotonic() + self.ttl_ms / 1000.0
+        lease_key = f"lease:{key}"
+        while time.monotonic() < deadline:
+            value = check()
+            if value is not None:
+                return value
+            if not self.redis.exists(lease_key):
+                return check()
+            time.sleep(self.poll_interval)
+        return None
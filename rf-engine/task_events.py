@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+
+from celery import Task
+from celery.exceptions import Ignore
+
+logger = logging.getLogger(__name__)
+
+# Terminal events end a task's stream
+TERMINAL_EVENTS = ("complete", "error", "cancelled")
+EVENT_TTL = 60 * 60
+
+
+def channel_name(task_id):
+    return f"task_events:{task_id}"
+
+
+def last_event_key(task_id):
+    return f"task_events_last:{task_id}"
+
+
+def cancel_key(task_id):
+    return f"task_cancel:{task_id}"
+
+
+class TaskCancelled(Exception):
+    """
+    Raised inside an EventTask once its cancellation was requested.
+    """
+
+
+def request_cancel(redis_client, task_id):
+    """
+    Ask a running EventTask to stop at its next check_cancelled().
+    """
+    redis_client.set(cancel_key(task_id), 1, ex=EVENT_TTL)
+
+
+def cancel_requested(redis_client, task_id):
+    """
+    For helpers working on another task's behalf (e.g. scan node subtasks).
+    """
+    return bool(redis_client.exists(cancel_key(task_id)))
+
+
+def publish_event(redis_client, task_id, event, data):
+    """
+    Push one {"event", "data"} message to the task's channel and keep it as
+    the task's last known state for clients that connect later.
+    """
+    message = json.dumps({"event": event, "data": data})
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.set(last_event_key(task_id), message, ex=EVENT_TTL)
+    pipe.publish(channel_name(task_id), message)
+    pipe.execute()
+
+
+class EventTask(Task):
+    """
+    Celery base for tasks followed through /task_status: PROGRESS states,
+    the final result and failures are also published as task events.
+    Publishing reuses the result backend's Redis client and never fails
+    the task.
+
+    Revoking only drops tasks that have not started, so long tasks call
+    check_cancelled() between steps: after request_cancel() it raises
+    TaskCancelled, and the task ends REVOKED with a "cancelled" event.
+    """
+
+    def check_cancelled(self):
+        if cancel_requested(self.backend.client, self.request.id):
+            raise TaskCancelled(self.request.id)
+
+    def __call__(self, *args, **kwargs):
+        try:
+            return super().__call__(*args, **kwargs)
+        except TaskCancelled:
+            task_id = self.request.id
+            self.backend.mark_as_revoked(task_id, "cancelled", request=self.request)
+            self._publish(task_id, "cancelled", {"status": "cancelled"})
+            # Keep the REVOKED state instead of storing a result
+            raise Ignore()
+
+    def _publish(self, task_id, event, data):
+        try:
+            publish_event(self.backend.client, task_id, event, data)
+        except Exception as e:
+            logger.warning(f"Publishing {event} for task {task_id} failed: {e}")
+
+    def update_state(self, task_id=None, state=None, meta=None, **kwargs):
+        super().update_state(task_id=task_id, state=state, meta=meta, **kwargs)
+        if state == 'PROGRESS':
+            self._publish(task_id or self.request.id, "progress", meta or {})
+
+    def on_success(self, retval, task_id, args, kwargs):
+        self._publish(task_id, "complete", retval)
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        self._publish(task_id, "error", str(exc))
+
+
+class TaskEventHub:
+    """
+    Async fan-out of task events for SSE. All listeners of one task in this
+    process share a single pub/sub subscription, opened with the first
+    listener and closed with the last one.
+
+    fallback(task_id) is a blocking callable returning the task's current
+    event from the result backend; it covers tasks that have not published
+    anything yet (or whose last event expired), and is re-checked every
+    reconcile_seconds in case a message was missed.
+    """
+
+    def __init__(self, redis_client, fallback, reconcile_seconds=10.0):
+        self.redis = redis_client
+        self.fallback = fallback
+        self.reconcile_seconds = reconcile_seconds
+        self._channels = {}
+
+    async def _last_event(self, task_id):
+        raw = await self.redis.get(last_event_key(task_id))
+        if raw:
+            return json.loads(raw)
+        return await asyncio.to_thread(self.fallback, task_id)
+
+    async def _read(self, task_id, listeners, ready):
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(channel_name(task_id))
+            ready.set()
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                event = json.loads(message["data"])
+                for queue in list(listeners):
+                    queue.put_nowait(event)
+                if event["event"] in TERMINAL_EVENTS:
+                    break
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Event subscription for task {task_id} failed: {e}")
+        finally:
+            ready.set()
+            await pubsub.reset()
+
+    async def subscribe(self, task_id):
+        """
+        Async generator of the task's events, starting with its last known
+        state and ending after a terminal event.
+        """
+        queue = asyncio.Queue()
+        entry = self._channels.get(task_id)
+        if entry is None:
+            listeners, ready = set(), asyncio.Event()
+            reader = asyncio.create_task(self._read(task_id, listeners, ready))
+            entry = self._channels[task_id] = (listeners, ready, reader)
+        listeners, ready, reader = entry
+        listeners.add(queue)
+        try:
+            # Subscribed before reading the last state, so nothing falls in between
+            await ready.wait()
+            event = await self._last_event(task_id)
+            while True:
+                yield event
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=self.reconcile_seconds)
+                except asyncio.TimeoutError:
+                    event = await self._last_event(task_id)
+        finally:
+            listeners.discard(queue)
+            if not listeners and self._channels.get(task_id) is entry:
+                del self._channels[task_id]
+                reader.cancel()
@@ -1,7 +1,18 @@
 from worker import celery_app
+from task_events import EventTask
+import json
 import time
+from celery.utils.log import get_task_logger
+from optimization_service import OptimizationService
 
-@celery_app.task(bind=True)
+# Share the worker's TileManager and artifact store
+from tasks.viewshed import tile_manager, artifact_store
+
+logger = get_task_logger(__name__)
+
+optimization_service = OptimizationService(tile_manager)
+
+@celery_app.task(bind=True, base=EventTask)
 def run_optimization(self, params):
     """
     Placeholder for NSGA-II optimization.
@@ -9,3 +20,49 @@ def run_optimization(self, params):
     self.update_state(state='PROGRESS', meta={'progress': 0})
     time.sleep(2)
     return {"status": "completed", "pareto_front": []}
+
+@celery_app.task(bind=True, base=EventTask)
+def optimize_location(self, params):
+    """
+    /optimize-location as a background job, followed through /task_status.
+    params: validated OptimizeRequest fields.
+
+    Every grid chunk or refinement stage is published as a PROGRESS event
+    with the provisional top 5 locations and, with return_heatmap, that
+    chunk's heatmap cells. Cancellation is checked between them.
+    """
+    return _optimize_location(self, params)
+
+
+def _optimize_location(task, params):
+    logger.info(f"Optimizing location in {params['min_lat']},{params['min_lon']} - {params['max_lat']},{params['max_lon']} ({params['search']} search)")
+    task.check_cancelled()
+    task.update_state(state='PROGRESS', meta={'progress': 0, 'message': 'Loading terrain...'})
+
+    def on_stage(progress, batch, candidates, cols):
+        task.check_cancelled()
+        meta = {
+            'progress': int(progress * 100),
+            'message': f"Evaluated {len(candidates)} candidates",
+            'evaluations': len(candidates),
+            # Scores are normalized over the candidates evaluated so far
+            'locations': OptimizationService.candidate_records(
+                candidates, OptimizationService.top_candidates(candidates, 5)
+            )
+        }
+        if params['return_heatmap']:
+            if cols:
+                meta['heatmap_chunk'] = OptimizationService.heatmap(batch, len(batch) // cols, cols, params['heatmap_format'])
+            else:
+                meta['heatmap_chunk'] = OptimizationService.heatmap(batch, 0, 0, "points")
+        task.update_state(state='PROGRESS', meta=meta)
+
+    with tile_manager.track_degraded() as degraded:
+        response = optimization_service.optimize_location(params, on_stage=on_stage)
+    response["degraded_tiles"] = sorted(degraded)
+
+    # The full heatmap is returned by reference, like scan rasters
+    heatmap = response.pop("heatmap", None)
+    if heatmap is not None:
+        response["heatmap_id"] = artifact_store.put(json.dumps(heatmap).encode(), "application/json")
+    return response
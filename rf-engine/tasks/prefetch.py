@@ -0,0 +1,41 @@
+from worker import celery_app
+from task_events import EventTask
+import time
+from celery.utils.log import get_task_logger
+
+# Share the worker's TileManager (connection pool, in-process tile cache)
+from tasks.viewshed import tile_manager
+
+logger = get_task_logger(__name__)
+
+@celery_app.task(bind=True, base=EventTask)
+def prefetch_tiles(self, params):
+    """
+    Warm the tile cache for a bounding box.
+    params: { "bbox": [west, south, east, north], "zoom": 12, "concurrency": 8 }
+    """
+    bbox = params['bbox']
+    zoom = params.get('zoom')
+    concurrency = int(params.get('concurrency', 8))
+
+    logger.info(f"Prefetching tiles for bbox {bbox} at zoom {zoom or tile_manager.zoom}")
+    self.update_state(state='PROGRESS', meta={'progress': 0, 'message': 'Checking cached tiles...'})
+
+    last_update = [0.0]
+
+    def report(done, total, stats):
+        # Throttle result-backend writes; always report the last tile
+        now = time.monotonic()
+        if done < total and now - last_update[0] < 0.5:
+            return
+        last_update[0] = now
+        # Raising here drops the tiles still queued
+        self.check_cancelled()
+        self.update_state(state='PROGRESS', meta={
+            'progress': int(done / total * 100),
+            'message': f"Fetched {done}/{total} tiles ({stats['tiles_per_sec']} tiles/s)",
+            **stats
+        })
+
+    stats = tile_manager.prefetch(bbox, zoom=zoom, concurrency=concurrency, progress_cb=report)
+    return {"status": "completed", **stats}
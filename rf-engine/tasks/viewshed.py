@@ -1,13 +1,19 @@
 from worker import celery_app
+from task_events import EventTask, cancel_requested, publish_event
 import time
 import numpy as np
 
 import os
 import redis
 import json
+from celery import chord, group
 from celery.utils.log import get_task_logger
-from core.algorithms import calculate_viewshed
+from core.algorithms import calculate_viewshed, calculate_viewshed_radial, calculate_rssi_grid
+from core.coverage import MasterGrid, marginal_gain, popcount
+from core.selection import select_sites
 from tile_manager import TileManager
+from artifact_store import ArtifactStore
+from viewshed_cache import ViewshedCache, viewshed_key, KIND_RSSI, KIND_VISIBILITY
 from models import NodeConfig
 import rf_physics
 
@@ -28,32 +34,158 @@ pool = redis.ConnectionPool(
 )
 redis_client = redis.Redis(connection_pool=pool)
 tile_manager = TileManager(redis_client)
+# Per-node viewsheds, reused across scans with the same node parameters
+viewshed_cache = ViewshedCache(
+    redis_client,
+    ttl=int(os.environ.get("VIEWSHED_CACHE_TTL", 7 * 24 * 60 * 60)),
+    enabled=os.environ.get("VIEWSHED_CACHE", "1") == "1"
+)
+
+# Composite rasters are returned by reference, not inside the task result
+artifact_store = ArtifactStore(redis_client, ttl=int(os.environ.get("ARTIFACT_TTL", 24 * 60 * 60)))
+
+# Retries per node subtask of a fanned-out scan
+NODE_MAX_RETRIES = int(os.environ.get("SCAN_NODE_RETRIES", 2))
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, base=EventTask)
 def calculate_batch_viewshed(self, params):
     """
     Calculate viewsheds for a list of nodes.
     params: { "nodes": [ {lat, lon, height, ...} ], "options": {"radius": 5000, "optimize_n": 3} }
+
+    Several nodes fan out as a chord: one viewshed_node subtask per node, then
+    aggregate_viewshed, which inherits this task's id so /task_status/{task_id}
+    follows the whole scan. options.parallel=False keeps it in this task.
+    Nodes whose viewshed is already in the viewshed cache are not recomputed;
+    only the misses fan out.
     """
-    from core.algorithms import calculate_viewshed
-    import base64
-    from io import BytesIO
-    from PIL import Image
+    nodes_data = params.get('nodes', [])
+    options = params.get('options', {})
+    if not nodes_data:
+        return {"status": "completed", "results": [], "degraded_tiles": []}
+
+    self.check_cancelled()
+    layout = _scan_layout(nodes_data, float(options.get('radius', 5000)))
+    cached = _cached_viewsheds(nodes_data, options, layout)
+    missing = [i for i, entry in enumerate(cached) if entry is None]
+    if len(missing) < 2 or not options.get('parallel', True):
+        with tile_manager.track_degraded() as degraded:
+            result = _batch_viewshed(self, params, layout, cached)
+        # Tiles that failed to load were treated as sea level
+        result["degraded_tiles"] = sorted(set(result["degraded_tiles"]) | degraded)
+        return result
+
+    total = len(nodes_data)
+    hits = total - len(missing)
+    logger.info(f"Fanning out batch viewshed for {len(missing)} of {total} nodes ({hits} cached)")
+    self.update_state(state='PROGRESS', meta={'progress': 0, 'message': _progress_message(hits, total, hits)})
+    cached_artifacts = [
+        _node_artifact(i, nodes_data[i], options, layout, cached=entry)
+        for i, entry in enumerate(cached) if entry is not None
+    ]
+    if hits:
+        # Cached nodes count as done in the shared progress counter
+        redis_client.set(f"scan_progress:{self.request.id}", hits, ex=3600)
+    header = group(
+        viewshed_node.s(self.request.id, i, total, nodes_data[i], options, layout, hits)
+        for i in missing
+    )
+    return self.replace(chord(header, aggregate_viewshed.s(params, layout, cached_artifacts)))
+
+@celery_app.task(bind=True, max_retries=NODE_MAX_RETRIES)
+def viewshed_node(self, scan_id, index, total, node_data, options, layout, hits=0):
+    """
+    One node of a fanned-out scan, retried on its own. Once retries are used
+    up it returns {"index", "error"} so the rest of the scan still completes.
+    Nodes of a cancelled scan are skipped; aggregate_viewshed then stops it.
+    """
+    if cancel_requested(redis_client, scan_id):
+        return {"index": index, "error": "cancelled"}
+    try:
+        # The scan already looked this node up and missed
+        artifact = _node_artifact(index, node_data, options, layout, lookup=False)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Node {index} failed ({e}), retry {self.request.retries + 1}/{self.max_retries}")
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+        logger.error(f"Error processing node {index}: {e}")
+        artifact = {"index": index, "error": str(e)}
+
+    _report_node_done(scan_id, total, hits)
+    return artifact
 
+@celery_app.task(bind=True, base=EventTask)
+def aggregate_viewshed(self, artifacts, params, layout, cached_artifacts=()):
+    """
+    Chord body: selection, inter-node links and compositing over the node
+    artifacts, both the computed ones and those read from the viewshed cache.
+    """
+    self.check_cancelled()
+    failed = [a['index'] for a in artifacts if 'error' in a]
+    if failed:
+        logger.warning(f"Aggregating without failed nodes {failed}")
+
+    # Back in node order so selection ties break as in a serial scan
+    artifacts = sorted(
+        [a for a in artifacts if 'error' not in a] + list(cached_artifacts),
+        key=lambda a: a['index']
+    )
+    with tile_manager.track_degraded() as aggregate_degraded:
+        result = _aggregate(self, artifacts, params, layout)
+    result["degraded_tiles"] = sorted(set(result["degraded_tiles"]) | aggregate_degraded)
+    redis_client.delete(f"scan_progress:{self.request.id}")
+    return result
+
+def _report_node_done(scan_id, total, hits=0):
+    """
+    Node subtasks share the scan's progress: count finished nodes in Redis
+    and publish it as the scan task's PROGRESS state and event (first 50%).
+    """
+    try:
+        key = f"scan_progress:{scan_id}"
+        done = redis_client.incr(key)
+        redis_client.expire(key, 3600)
+        meta = {'progress': int(done / total * 50), 'message': _progress_message(done, total, hits)}
+        celery_app.backend.store_result(scan_id, meta, 'PROGRESS')
+        publish_event(redis_client, scan_id, 'progress', meta)
+    except Exception as e:
+        logger.warning(f"Progress update for scan {scan_id} failed: {e}")
+
+def _progress_message(done, total, hits):
+    message = f'Analyzed candidates {done}/{total}'
+    return f'{message} ({hits} cached)' if hits else message
+
+def _batch_viewshed(task, params, layout=None, cached=None):
     logger.info(f"Starting batch viewshed for {len(params.get('nodes', []))} nodes")
-    self.update_state(state='PROGRESS', meta={'progress': 0, 'message': 'Initializing...'})
+    task.update_state(state='PROGRESS', meta={'progress': 0, 'message': 'Initializing...'})
     
     nodes_data = params.get('nodes', [])
     options = params.get('options', {})
-    radius = float(options.get('radius', 5000))
-    optimize_n = options.get('optimize_n')
-    rx_height = float(options.get('rx_height', 2.0))
-    freq = float(options.get('frequency_mhz', 915.0))
-    
-    # 1. Determine Bounding Box for Composite
     if not nodes_data:
-        return {"status": "completed", "results": []}
+        return {"status": "completed", "results": [], "degraded_tiles": []}
+
+    if layout is None:
+        layout = _scan_layout(nodes_data, float(options.get('radius', 5000)))
+    if cached is None:
+        cached = _cached_viewsheds(nodes_data, options, layout)
+    hits = sum(entry is not None for entry in cached)
+    artifacts = []
+    total = len(nodes_data)
+    for i, node_data in enumerate(nodes_data):
+        task.check_cancelled()
+        try:
+            artifacts.append(_node_artifact(i, node_data, options, layout, cached=cached[i], lookup=False))
+            progress = int((i + 1) / total * 50) # First 50% for individual calcs
+            task.update_state(state='PROGRESS', meta={'progress': progress, 'message': _progress_message(i + 1, total, hits)})
+        except Exception as e:
+            logger.error(f"Error processing node {i}: {e}")
+
+    return _aggregate(task, artifacts, params, layout)
 
+def _scan_layout(nodes_data, radius):
+    """
+    Master grid covering every node's radius: bounds, size and resolution.
+    """
     # Calculate center latitude for projection scaling
     lats = [float(n['lat']) for n in nodes_data]
     lons = [float(n['lon']) for n in nodes_data]
@@ -108,149 +240,221 @@ def calculate_batch_viewshed(self, params):
     else:
         res_m = target_res_m
     
-    master_grid = np.zeros((rows, cols), dtype=np.uint8)
-    
-    # Coordinate mapping functions
-    def lat_to_y(lat):
-        return int((max_lat - lat) / (max_lat - min_lat) * (rows - 1))
-    def lon_to_x(lon):
-        return int((lon - min_lon) / (max_lon - min_lon) * (cols - 1))
-
-    # Pre-calculate individual viewsheds if we need to optimize
-    # Or just calculate all and keep track of visibility
-    all_node_results = []
-    
-    total = len(nodes_data)
-    for i, node_data in enumerate(nodes_data):
+    return {
+        "min_lat": min_lat, "max_lat": max_lat,
+        "min_lon": min_lon, "max_lon": max_lon,
+        "rows": rows, "cols": cols, "res_m": res_m
+    }
+
+def _master_grid(layout):
+    return MasterGrid(layout['min_lat'], layout['max_lat'], layout['min_lon'], layout['max_lon'], layout['rows'], layout['cols'])
+
+def _viewshed_key(node_data, options, res_m):
+    """
+    Viewshed cache key for one node: every input of its grid plus the terrain
+    dataset. rx_sensitivity_dbm is left out since rssi grids are cached raw.
+    """
+    mode = options.get('mode', 'visibility')
+    params = {
+        "lat": float(node_data.get('lat')),
+        "lon": float(node_data.get('lon')),
+        "height": float(node_data.get('height', 10)),
+        "radius": float(options.get('radius', 5000)),
+        "rx_height": float(options.get('rx_height', 2.0)),
+        "freq": float(options.get('frequency_mhz', 915.0)),
+        "k_factor": float(options.get('k_factor', 1.333)),
+        "clutter_height": float(options.get('clutter_height', 0.0)),
+        "resolution": float(res_m),
+        "mode": mode
+    }
+    if mode == 'rssi':
+        params.update({
+            "model": options.get('model', 'bullington'),
+            "environment": options.get('environment', 'suburban'),
+            "tx_power_dbm": float(options.get('tx_power_dbm', 20.0)),
+            "tx_gain_dbi": float(options.get('tx_gain_dbi', 2.15)),
+            "rx_gain_dbi": float(options.get('rx_gain_dbi', 2.15))
+        })
+    else:
+        params["engine"] = options.get('engine', 'profile')
+    return viewshed_key(params, tile_manager.dataset_fingerprint())
+
+def _cached_viewsheds(nodes_data, options, layout):
+    """
+    Cached NodeViewshed (or None) per node, in one Redis round trip.
+    A cache that cannot be read just means every node is computed.
+    """
+    try:
+        keys = [_viewshed_key(n, options, layout['res_m']) for n in nodes_data]
+        return viewshed_cache.get_many(keys)
+    except Exception as e:
+        logger.warning(f"Viewshed cache lookup failed: {e}")
+        return [None] * len(nodes_data)
+
+def _node_artifact(index, node_data, options, layout, cached=None, lookup=True):
+    """
+    Viewshed of one node reduced to what aggregation needs: metadata plus the
+    covered master-grid pixels (and the best RSSI per pixel in rssi mode).
+    JSON-safe so it can travel through the result backend.
+    cached: the node's NodeViewshed from the viewshed cache. Without it the
+    cache is looked up (unless lookup=False) and filled after computing.
+    """
+    radius = float(options.get('radius', 5000))
+    rx_height = float(options.get('rx_height', 2.0))
+    freq = float(options.get('frequency_mhz', 915.0))
+    res_m = layout['res_m']
+    # 'profile' = per-pixel profile analysis, 'radial' = single-raster LOS sweep
+    engine = options.get('engine', 'profile')
+    viewshed_fn = calculate_viewshed_radial if engine == 'radial' else calculate_viewshed
+    # 'visibility' = binary LOS grid, 'rssi' = received power from the selected model
+    mode = options.get('mode', 'visibility')
+    if mode == 'rssi' and engine == 'radial':
+        logger.warning("RSSI mode needs per-cell path loss; using the profile engine")
+
+    lat = float(node_data.get('lat'))
+    lon = float(node_data.get('lon'))
+    height = float(node_data.get('height', 10))
+
+    key = None
+    if cached is None:
         try:
-            lat = float(node_data.get('lat'))
-            lon = float(node_data.get('lon'))
-            height = float(node_data.get('height', 10))
-            
-            # Simple viewshed
-            grid, grid_lats, grid_lons = calculate_viewshed(
-                tile_manager, lat, lon, height, radius, 
-                rx_h=rx_height, freq_mhz=freq, resolution_m=res_m
-            )
-            
-            coverage_count = int(np.sum(grid))
-            source_elev = tile_manager.get_elevation(lat, lon)
-            
-            node_res = {
-                "lat": lat, "lon": lon,
-                "name": node_data.get('name', f'Site {i + 1}'),
-                "height": height,
-                "elevation": round(float(source_elev), 1),
-                "coverage_area_km2": round((coverage_count * (res_m * res_m)) / 1_000_000.0, 2),
-                "grid": grid,
-                "grid_lats": grid_lats,
-                "grid_lons": grid_lons
-            }
-            all_node_results.append(node_res)
-            
-            progress = int((i + 1) / total * 50) # First 50% for individual calcs
-            self.update_state(state='PROGRESS', meta={'progress': progress, 'message': f'Analyzed candidates {i+1}/{total}'})
-            
+            key = _viewshed_key(node_data, options, res_m)
+            if lookup:
+                cached = viewshed_cache.get(key)
         except Exception as e:
-            logger.error(f"Error processing node {i}: {e}")
+            logger.warning(f"Viewshed cache lookup for node {index} failed: {e}")
+
+    degraded = set()
+    from_cache = cached is not None
+    if from_cache:
+        grid, grid_lats, grid_lons, source_elev = cached
+    else:
+        with tile_manager.track_degraded() as degraded:
+            if mode == 'rssi':
+                grid, grid_lats, grid_lons = calculate_rssi_grid(
+                    tile_manager, lat, lon, height, radius,
+                    rx_h=rx_height, freq_mhz=freq, resolution_m=res_m,
+                    model=options.get('model', 'bullington'),
+                    k_factor=float(options.get('k_factor', 1.333)),
+                    clutter_height=float(options.get('clutter_height', 0.0)),
+                    tx_power_dbm=float(options.get('tx_power_dbm', 20.0)),
+                    tx_gain_dbi=float(options.get('tx_gain_dbi', 2.15)),
+                    rx_gain_dbi=float(options.get('rx_gain_dbi', 2.15)),
+                    environment=options.get('environment', 'suburban')
+                )
+            else:
+                # Simple viewshed
+                grid, grid_lats, grid_lons = viewshed_fn(
+                    tile_manager, lat, lon, height, radius,
+                    rx_h=rx_height, freq_mhz=freq, resolution_m=res_m,
+                    k_factor=float(options.get('k_factor', 1.333)),
+                    clutter_height=float(options.get('clutter_height', 0.0))
+                )
+            source_elev = tile_manager.get_elevation(lat, lon)
+        # Grids built on tiles that failed to load are not kept
+        if key is not None and not degraded:
+            try:
+                viewshed_cache.put(key, grid, grid_lats, grid_lons, source_elev,
+                                   KIND_RSSI if mode == 'rssi' else KIND_VISIBILITY)
+            except Exception as e:
+                logger.warning(f"Viewshed cache write for node {index} failed: {e}")
+
+    rssi = None
+    if mode == 'rssi':
+        rssi = grid
+        # Covered = link budget closes (NaN outside the radius compares False)
+        with np.errstate(invalid='ignore'):
+            grid = (rssi >= float(options.get('rx_sensitivity_dbm', -120.0))).astype(np.float64)
+
+    coverage_count = int(np.sum(grid))
+    # Project onto the master grid once; aggregation only sees master pixels
+    master_idx = _master_grid(layout).project(grid_lats, grid_lons)
+
+    artifact = {
+        "index": index,
+        "lat": lat, "lon": lon,
+        "name": node_data.get('name', f'Site {index + 1}'),
+        "height": height,
+        "elevation": round(float(source_elev), 1),
+        "coverage_area_km2": round((coverage_count * (res_m * res_m)) / 1_000_000.0, 2),
+        "covered": _pack(np.unique(master_idx[(grid > 0) & (master_idx >= 0)]), '<i4'),
+        "cached": from_cache,
+        "degraded_tiles": sorted(degraded)
+    }
+    if rssi is not None:
+        in_range = np.isfinite(rssi) & (master_idx >= 0)
+        flat = master_idx[in_range]
+        vals = rssi[in_range]
+        # Several node cells can land on one master pixel: keep the max
+        order = np.lexsort((-vals, flat))
+        flat, vals = flat[order], vals[order]
+        first = np.ones(len(flat), dtype=bool)
+        first[1:] = flat[1:] != flat[:-1]
+        artifact["rssi_idx"] = _pack(flat[first], '<i4')
+        artifact["rssi"] = _pack(vals[first], '<f4')
+    return artifact
+
+def _pack(arr, dtype):
+    import base64
+    return base64.b64encode(np.ascontiguousarray(arr, dtype=dtype).tobytes()).decode()
+
+def _unpack(data, dtype):
+    import base64
+    return np.frombuffer(base64.b64decode(data), dtype=dtype)
+
+def _aggregate(task, artifacts, params, layout):
+    from io import BytesIO
+    from PIL import Image
+
+    options = params.get('options', {})
+    optimize_n = options.get('optimize_n')
+    freq = float(options.get('frequency_mhz', 915.0))
+    mode = options.get('mode', 'visibility')
+    model = options.get('model', 'bullington')
+    sensitivity = float(options.get('rx_sensitivity_dbm', -120.0))
+
+    min_lat, max_lat = layout['min_lat'], layout['max_lat']
+    min_lon, max_lon = layout['min_lon'], layout['max_lon']
+    rows, cols, res_m = layout['rows'], layout['cols'], layout['res_m']
+    master = _master_grid(layout)
+
+    all_node_results = []
+    for artifact in artifacts:
+        res = dict(artifact)
+        res['bits'] = master.bitmap(_unpack(artifact['covered'], '<i4'))
+        if 'rssi' in artifact:
+            res['rssi_idx'] = _unpack(artifact['rssi_idx'], '<i4')
+            res['rssi'] = _unpack(artifact['rssi'], '<f4')
+        all_node_results.append(res)
 
     # 2. Greedy Optimization (Marginal Gain)
     selected_results = all_node_results
+    selection = None
     if optimize_n and 0 < optimize_n < len(all_node_results):
-        selected_results = []
-        covered_points = set() # Set of (y, x) tuples on master_grid
-        
-        # Pre-compute pixel sets for all candidates
-        candidate_sets = []
-        for res in all_node_results:
-            pixels = set()
-            g = res['grid']
-            lats = res['grid_lats']
-            lons = res['grid_lons']
-            
-            # Optimization: Vectorized coordinate mapping
-            # Get indices where grid > 0
-            rows_idx, cols_idx = np.nonzero(g > 0)
-            
-            if len(rows_idx) > 0:
-                # Vectorized lookup of lat/lon
-                pixel_lats = lats[rows_idx]
-                pixel_lons = lons[cols_idx]
-                
-                # Vectorized mapping to master grid coordinates
-                # y = int((max_lat - lat) / (max_lat - min_lat) * (rows - 1))
-                y_vals = ((max_lat - pixel_lats) / (max_lat - min_lat) * (rows - 1)).astype(int)
-                
-                # x = int((lon - min_lon) / (max_lon - min_lon) * (cols - 1))
-                x_vals = ((pixel_lons - min_lon) / (max_lon - min_lon) * (cols - 1)).astype(int)
-                
-                # Filter valid
-                valid_mask = (y_vals >= 0) & (y_vals < rows) & (x_vals >= 0) & (x_vals < cols)
-                y_vals = y_vals[valid_mask]
-                x_vals = x_vals[valid_mask]
-                
-                # Convert to set of tuples
-                # Creating a set of tuples from 2D array is still somewhat costly but faster than pure Python loop
-                if len(y_vals) > 0:
-                    coords = np.column_stack((y_vals, x_vals))
-                    # Use a set comprehension or map for speed
-                    pixels = set(map(tuple, coords))
-            
-            candidate_sets.append(pixels)
-
-        # Greedy Loop
-        remaining_indices = list(range(len(all_node_results)))
-        
-        for _ in range(optimize_n):
-            best_idx = -1
-            best_marginal_gain = -1
-            
-            for idx in remaining_indices:
-                cand_pixels = candidate_sets[idx]
-                # Calculate new pixels that are NOT in covered_points
-                # len(cand_pixels - covered_points)
-                # Set difference is fast
-                new_coverage = len(cand_pixels.difference(covered_points))
-                
-                if new_coverage > best_marginal_gain:
-                    best_marginal_gain = new_coverage
-                    best_idx = idx
-            
-            if best_idx != -1 and best_marginal_gain > 0:
-                selected_results.append(all_node_results[best_idx])
-                covered_points.update(candidate_sets[best_idx])
-                remaining_indices.remove(best_idx)
-            else:
-                # No more gain to be had (or empty)
-                break
+        picked = select_sites(
+            [res['bits'] for res in all_node_results], optimize_n,
+            method=options.get('selection', 'lazy'), seed=options.get('seed')
+        )
+        selected_results = [all_node_results[idx] for idx in picked['indices']]
+        km2_per_pixel = (res_m * res_m) / 1_000_000.0
+        selection = {
+            "method": options.get('selection', 'lazy'),
+            "evaluations": picked['evaluations'],
+            "evaluations_saved": picked['evaluations_saved'],
+            "guarantee": round(picked['guarantee'], 3),
+            "optimum_upper_bound_km2": round(picked['upper_bound'] * km2_per_pixel, 2),
+            "fraction_of_bound": round(picked['coverage'] / picked['upper_bound'], 3) if picked['upper_bound'] > 0 else 1.0
+        }
+        logger.info(f"Site selection ({selection['method']}): {picked['evaluations']} gain evaluations, {picked['evaluations_saved']} saved")
 
     # 3. Compute marginal coverage for each selected node (in selection order)
-    covered_so_far = set()
+    covered_so_far = master.empty()
     for res in selected_results:
-        g = res['grid']
-        lats_g = res['grid_lats']
-        lons_g = res['grid_lons']
-        rows_idx, cols_idx = np.nonzero(g > 0)
-        node_pixels = set()
-        if len(rows_idx) > 0:
-            pixel_lats = lats_g[rows_idx]
-            pixel_lons = lons_g[cols_idx]
-            
-            y_vals = ((max_lat - pixel_lats) / (max_lat - min_lat) * (rows - 1)).astype(int)
-            x_vals = ((pixel_lons - min_lon) / (max_lon - min_lon) * (cols - 1)).astype(int)
-            
-            valid_mask = (y_vals >= 0) & (y_vals < rows) & (x_vals >= 0) & (x_vals < cols)
-            y_vals = y_vals[valid_mask]
-            x_vals = x_vals[valid_mask]
-            
-            if len(y_vals) > 0:
-                coords = np.column_stack((y_vals, x_vals))
-                node_pixels = set(map(tuple, coords))
-        marginal_pixels = len(node_pixels - covered_so_far)
-        covered_so_far.update(node_pixels)
+        marginal_pixels = marginal_gain(res['bits'], covered_so_far)
+        covered_so_far |= res['bits']
         res['marginal_coverage_km2'] = round((marginal_pixels * (res_m * res_m)) / 1_000_000.0, 2)
 
-    total_unique_km2 = round((len(covered_so_far) * (res_m * res_m)) / 1_000_000.0, 2)
+    total_unique_km2 = round((popcount(covered_so_far) * (res_m * res_m)) / 1_000_000.0, 2)
     for res in selected_results:
         total_cov = res['coverage_area_km2']
         res['unique_coverage_pct'] = round(
@@ -258,83 +462,80 @@ def calculate_batch_viewshed(self, params):
         )
 
     # 3a. Compute pairwise inter-node link quality
-    self.update_state(state='PROGRESS', meta={'progress': 55, 'message': 'Analyzing inter-node links...'})
+    task.update_state(state='PROGRESS', meta={'progress': 55, 'message': 'Analyzing inter-node links...'})
     inter_node_links = []
     n_selected = len(selected_results)
-    for i in range(n_selected):
-        for j in range(i + 1, n_selected):
-            node_a = selected_results[i]
-            node_b = selected_results[j]
-            try:
-                dist_m = rf_physics.haversine_distance(
-                    node_a['lat'], node_a['lon'],
-                    node_b['lat'], node_b['lon']
-                )
-                elevs = tile_manager.get_elevation_profile(
-                    node_a['lat'], node_a['lon'],
-                    node_b['lat'], node_b['lon'],
-                    samples=50
-                )
-                h_a = node_a.get('height', 10.0)
-                h_b = node_b.get('height', 10.0)
-                link_result = rf_physics.analyze_link(
-                    elevs, dist_m, freq, h_a, h_b,
-                    k_factor=options.get('k_factor', 1.333),
-                    clutter_height=options.get('clutter_height', 0.0)
-                )
-                path_loss_db = rf_physics.calculate_path_loss(
-                    dist_m, elevs, freq, h_a, h_b,
-                    model='bullington',
-                    k_factor=options.get('k_factor', 1.333),
-                    clutter_height=options.get('clutter_height', 0.0)
-                )
-                inter_node_links.append({
-                    "node_a_idx": i,
-                    "node_b_idx": j,
-                    "node_a_name": node_a.get('name', f'Site {i + 1}'),
-                    "node_b_name": node_b.get('name', f'Site {j + 1}'),
-                    "dist_km": round(dist_m / 1000, 2),
-                    "status": link_result['status'],
-                    "path_loss_db": round(float(path_loss_db), 1),
-                    "min_clearance_ratio": round(float(link_result['min_clearance_ratio']), 2)
-                })
-            except Exception as e:
-                logger.error(f"Link analysis failed for nodes {i}-{j}: {e}")
+    pairs = [(i, j) for i in range(n_selected) for j in range(i + 1, n_selected)]
+    if pairs:
+        pair_a = np.array([p[0] for p in pairs])
+        pair_b = np.array([p[1] for p in pairs])
+        node_lat = np.array([n['lat'] for n in selected_results], dtype=np.float64)
+        node_lon = np.array([n['lon'] for n in selected_results], dtype=np.float64)
+        node_h = np.array([n.get('height', 10.0) for n in selected_results], dtype=np.float64)
+        try:
+            # Every pair's profile in one lookup, all links in one pass
+            dist_m = rf_physics.haversine_distance_batch(
+                node_lat[pair_a], node_lon[pair_a], node_lat[pair_b], node_lon[pair_b]
+            )
+            elevs = tile_manager.get_elevation_profiles(
+                np.column_stack((node_lat[pair_a], node_lon[pair_a])),
+                np.column_stack((node_lat[pair_b], node_lon[pair_b])),
+                samples=50
+            )
+            links = rf_physics.analyze_links_batch(
+                elevs, dist_m, freq, node_h[pair_a], node_h[pair_b],
+                k_factor=options.get('k_factor', 1.333),
+                clutter_height=options.get('clutter_height', 0.0),
+                model=model,
+                environment=options.get('environment', 'suburban')
+            )
+            for k, (i, j) in enumerate(pairs):
                 inter_node_links.append({
                     "node_a_idx": i,
                     "node_b_idx": j,
                     "node_a_name": selected_results[i].get('name', f'Site {i + 1}'),
                     "node_b_name": selected_results[j].get('name', f'Site {j + 1}'),
-                    "dist_km": 0,
-                    "status": "unknown",
-                    "path_loss_db": 0,
-                    "min_clearance_ratio": 0
+                    "dist_km": round(float(dist_m[k]) / 1000, 2),
+                    "status": str(links['status'][k]),
+                    "path_loss_db": round(float(links['path_loss_db'][k]), 1),
+                    "min_clearance_ratio": round(float(links['min_clearance_ratio'][k]), 2)
                 })
+        except Exception as e:
+            logger.error(f"Inter-node link analysis failed: {e}")
+            inter_node_links = [{
+                "node_a_idx": i,
+                "node_b_idx": j,
+                "node_a_name": selected_results[i].get('name', f'Site {i + 1}'),
+                "node_b_name": selected_results[j].get('name', f'Site {j + 1}'),
+                "dist_km": 0,
+                "status": "unknown",
+                "path_loss_db": 0,
+                "min_clearance_ratio": 0
+            } for i, j in pairs]
 
-    # 4. Blit to Master Grid and generate Composite
-    for res in selected_results:
-        g = res['grid']
-        lats = res['grid_lats']
-        lons = res['grid_lons']
+    # 4. Composite: union of the selected coverage bitmaps
+    master_grid = master.to_mask(covered_so_far).astype(np.uint8) * 255
+
+    # 4a. Best-server composite: strongest signal per pixel and which node provides it
+    rssi_composite = None
+    if mode == 'rssi':
+        best_rssi = np.full(master.size, -np.inf, dtype=np.float32)
+        best_server = np.full(master.size, -1, dtype=np.int16)
+        for k, res in enumerate(selected_results):
+            flat = res['rssi_idx']
+            vals = res['rssi']
+            # Pixels are unique per node (max taken in the node task)
+            prev = best_rssi[flat]
+            better = vals > prev
+            best_rssi[flat[better]] = vals[better]
+            best_server[flat[better]] = k
         
-        # Vectorized Blit
-        rows_idx, cols_idx = np.nonzero(g > 0)
-        if len(rows_idx) > 0:
-            pixel_lats = lats[rows_idx]
-            pixel_lons = lons[cols_idx]
-            
-            y_vals = ((max_lat - pixel_lats) / (max_lat - min_lat) * (rows - 1)).astype(int)
-            x_vals = ((pixel_lons - min_lon) / (max_lon - min_lon) * (cols - 1)).astype(int)
-            
-            valid_mask = (y_vals >= 0) & (y_vals < rows) & (x_vals >= 0) & (x_vals < cols)
-            y_vals = y_vals[valid_mask]
-            x_vals = x_vals[valid_mask]
-            
-            if len(y_vals) > 0:
-                # Numpy advanced indexing for fast update
-                master_grid[y_vals, x_vals] = 255 # Visible
-                        
-    # 4. Generate PNG Base64 (Neon Cyan RGBA)
+        best_rssi = best_rssi.reshape(rows, cols)
+        best_server = best_server.reshape(rows, cols)
+        master_grid = (best_rssi >= sensitivity).astype(np.uint8) * 255
+        rssi_composite = _encode_rssi(best_rssi, best_server)
+    
+    # 4. Generate PNG (Neon Cyan RGBA)
     # Create RGBA array
     # rows, cols from master_grid.shape
     height, width = master_grid.shape
@@ -348,15 +549,21 @@ def calculate_batch_viewshed(self, params):
     visible_mask = master_grid > 0
     
     # Apply colors where visible
-    rgba_grid[visible_mask, 0] = cyan_r
-    rgba_grid[visible_mask, 1] = cyan_g
-    rgba_grid[visible_mask, 2] = cyan_b
+    if mode == 'rssi':
+        # Red at the sensitivity floor -> yellow -> green at 20 dB of margin
+        t = np.clip((best_rssi[visible_mask] - sensitivity) / 20.0, 0.0, 1.0)
+        rgba_grid[visible_mask, 0] = np.where(t < 0.5, 255, 255 * (1 - t) * 2).astype(np.uint8)
+        rgba_grid[visible_mask, 1] = np.where(t < 0.5, 255 * t * 2, 255).astype(np.uint8)
+    else:
+        rgba_grid[visible_mask, 0] = cyan_r
+        rgba_grid[visible_mask, 1] = cyan_g
+        rgba_grid[visible_mask, 2] = cyan_b
     rgba_grid[visible_mask, 3] = opacity
     
     img = Image.fromarray(rgba_grid, mode='RGBA')
     buffered = BytesIO()
     img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
+    image_id = artifact_store.put(buffered.getvalue(), "image/png")
     
     # 5. Build Final Output
     final_results = []
@@ -370,6 +577,11 @@ def calculate_batch_viewshed(self, params):
             "marginal_coverage_km2": res.get("marginal_coverage_km2", res["coverage_area_km2"]),
             "unique_coverage_pct": res.get("unique_coverage_pct", 100.0)
         })
+        if mode == 'rssi':
+            # The node's own signal on the master grid (same layout as composite.rssi)
+            node_rssi = np.full(master.size, np.nan, dtype=np.float32)
+            node_rssi[res['rssi_idx']] = res['rssi']
+            final_results[-1]["rssi"] = _rssi_artifact(node_rssi)
 
     # Compute connectivity score per node (# of viable/degraded links)
     connectivity = [0] * len(final_results)
@@ -380,19 +592,61 @@ def calculate_batch_viewshed(self, params):
     for idx, res in enumerate(final_results):
         res["connectivity_score"] = connectivity[idx]
 
+    # Rasters are served from GET /artifacts/{id}
+    composite = {
+        "image_id": image_id,
+        "bounds": {
+            "north": max_lat,
+            "south": min_lat,
+            "east": max_lon,
+            "west": min_lon
+        }
+    }
+    if rssi_composite:
+        composite.update(rssi_composite)
+        composite["rx_sensitivity_dbm"] = sensitivity
+
     return {
         "status": "completed",
+        "mode": mode,
         "results": final_results,
         "inter_node_links": inter_node_links,
         "total_unique_coverage_km2": total_unique_km2,
-        "composite": {
-            "image": img_str,
-            "bounds": {
-                "north": max_lat,
-                "south": min_lat,
-                "east": max_lon,
-                "west": min_lon
-            }
+        "selection": selection,
+        "viewshed_cache": {
+            "hits": sum(1 for a in artifacts if a.get('cached')),
+            "computed": sum(1 for a in artifacts if not a.get('cached'))
+        },
+        "composite": composite,
+        "degraded_tiles": sorted({key for a in artifacts for key in a.get('degraded_tiles', [])})
+    }
+
+def _rssi_artifact(rssi):
+    """
+    Store an RSSI raster (dBm, non-finite = not reached) as int16 in 0.1 dBm steps.
+    """
+    rssi = np.where(np.isfinite(rssi), np.round(rssi * 10), -32768)
+    rssi = np.clip(rssi, -32768, 32767).astype('<i2')
+    return {
+        "id": artifact_store.put(rssi.tobytes(), "application/octet-stream"),
+        "dtype": "int16",
+        "scale": 0.1,
+        "nodata": -32768
+    }
+
+def _encode_rssi(best_rssi, best_server):
+    """
+    Store the best-server rasters for the client: int16 little-endian, row 0 = north.
+    rssi is in 0.1 dBm steps with -32768 where no node reaches.
+    """
+    return {
+        "width": int(best_rssi.shape[1]),
+        "height": int(best_rssi.shape[0]),
+        "rssi": _rssi_artifact(best_rssi),
+        "best_server": {
+            "id": artifact_store.put(best_server.astype('<i2').tobytes(), "application/octet-stream"),
+            "dtype": "int16",
+            "nodata": -1
         }
     }
 
@@ -0,0 +1,40 @@
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.coverage import MasterGrid, marginal_gain, popcount
+
+
+class TestMasterGrid:
+    def setup_method(self):
+        # 10 x 13 pixels (odd size so the packed tail byte is partial)
+        self.master = MasterGrid(45.0, 45.1, -122.0, -121.87, 10, 13)
+
+    def test_project_matches_pixel_formula(self):
+        lats = np.array([45.099, 45.05, 44.9])
+        lons = np.array([-122.0, -121.95, -121.5])
+        idx = self.master.project(lats, lons)
+
+        assert idx.shape == (3, 3)
+        y = int((45.1 - 45.05) / 0.1 * 9)
+        x = int((-121.95 + 122.0) / 0.13 * 12)
+        assert idx[1, 1] == y * 13 + x
+        # Outside the master bounds
+        assert np.all(idx[2, :] == -1)
+        assert np.all(idx[:, 2] == -1)
+
+    def test_bitmap_roundtrip_and_gain(self):
+        a = self.master.bitmap(np.array([0, 5, 5, 129]))
+        b = self.master.bitmap(np.array([5, 6, 100]))
+
+        assert popcount(a) == 3
+        assert popcount(a | b) == 5
+        assert marginal_gain(b, a) == 2
+        assert marginal_gain(a, self.master.empty()) == 3
+
+        mask = self.master.to_mask(a | b)
+        assert mask.shape == (10, 13)
+        assert set(np.flatnonzero(mask)) == {0, 5, 6, 100, 129}
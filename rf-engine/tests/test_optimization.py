@@ -1,4 +1,5 @@
 
+import numpy as np
 import pytest
 from unittest.mock import MagicMock
 import sys
@@ -7,7 +8,8 @@ import os
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from optimization_service import OptimizationService
+from optimization_service import OptimizationService, NodeIndex
+import rf_physics
 
 @pytest.fixture
 def mock_tile_manager():
@@ -81,3 +83,255 @@ class TestOptimizationService:
             0, 0, 20.0, rx_list, 433.0
         )
         assert metrics['fresnel'] == 0.5
+
+
+class TestTerrainWindow:
+    def test_window_is_one_lookup_with_margin(self, mock_tile_manager):
+        mock_tile_manager.get_elevation_grid.side_effect = lambda lats, lons, resolution_m=None: (
+            np.add.outer(np.asarray(lats) * 0, np.asarray(lons) * 0) + 50.0
+        )
+        service = OptimizationService(mock_tile_manager)
+        window = service.load_window(45.0, -122.0, 45.05, -121.95, resolution_m=150, margin_km=5.0)
+
+        assert mock_tile_manager.get_elevation_grid.call_count == 1
+        assert window.elevation.shape == (len(window.lats), len(window.lons))
+        assert window.lats[0] < 45.0 - 0.04 and window.lats[-1] > 45.05 + 0.04
+        assert window.resolution_m == 150
+
+        # Flat terrain: no prominence either way
+        for method in ("focal", "topographic"):
+            prom = service.prominence_grid(window, method=method)
+            assert prom.shape == window.elevation.shape
+        assert not service.prominence_grid(window).any()
+
+    def test_large_window_is_coarsened(self, mock_tile_manager):
+        mock_tile_manager.get_elevation_grid.side_effect = lambda lats, lons, resolution_m=None: np.zeros((len(lats), len(lons)))
+        service = OptimizationService(mock_tile_manager)
+        window = service.load_window(44.0, -123.0, 46.0, -121.0, resolution_m=150)
+        assert max(window.elevation.shape) <= OptimizationService.MAX_WINDOW_DIM
+        assert window.resolution_m > 150
+
+    def test_focal_grid_matches_point_prominence(self, mock_tile_manager):
+        # Cone peaking at (45.0, -122.0)
+        def cone(lats, lons):
+            lat_g, lon_g = np.meshgrid(lats, lons, indexing='ij')
+            return np.maximum(0.0, 500.0 - 50000.0 * np.hypot(lat_g - 45.0, (lon_g + 122.0) * 0.707))
+
+        mock_tile_manager.get_elevation_grid.side_effect = lambda lats, lons, resolution_m=None: cone(lats, lons)
+        service = OptimizationService(mock_tile_manager)
+        window = service.load_window(44.99, -122.01, 45.01, -121.99, resolution_m=100)
+        prom = service.prominence_grid(window, radius_km=5.0)
+        peak = service.sample_prominence(window, prom, [45.0], [-122.0])[0]
+
+        # The summit clears its surroundings by most of its height
+        assert 300.0 < peak < 500.0
+        assert service.sample_prominence(window, prom, [45.04], [-122.0])[0] == 0.0
+
+
+class TestCandidateArrays:
+    def reference_scores(self, rows, weights):
+        # Previous per-dict implementation
+        max_elev = max(c['elevation'] for c in rows) or 1.0
+        max_prom = max(c['prominence'] for c in rows) or 1.0
+        return [
+            round(((c['elevation'] / max_elev) * weights['elevation']
+                   + (c['prominence'] / max_prom) * weights['prominence']
+                   + c['fresnel'] * weights['fresnel']) * 100, 1)
+            for c in rows
+        ]
+
+    def test_scores_match_per_candidate_formula(self):
+        rng = np.random.default_rng(7)
+        candidates = OptimizationService.candidate_grid(45.0, -122.0, 45.1, -121.9, 12, 15)
+        candidates['elevation'] = rng.uniform(50, 900, len(candidates))
+        candidates['prominence'] = rng.uniform(0, 120, len(candidates))
+        candidates['fresnel'] = rng.uniform(0, 1, len(candidates))
+        weights = {"elevation": 0.5, "prominence": 0.3, "fresnel": 0.2}
+
+        rows = [dict(zip(candidates.dtype.names, map(float, c))) for c in candidates]
+        max_elev, max_prom = OptimizationService.score_candidates(candidates, weights)
+
+        assert len(candidates) == 13 * 16
+        assert max_elev == candidates['elevation'].max()
+        np.testing.assert_allclose(candidates['score'], self.reference_scores(rows, weights))
+
+    def test_top_k_matches_stable_sort(self):
+        candidates = OptimizationService.candidate_grid(0.0, 0.0, 1.0, 1.0, 10, 10)
+        candidates['score'] = np.random.default_rng(3).integers(0, 8, len(candidates))
+        expected = sorted(range(len(candidates)), key=lambda i: candidates['score'][i], reverse=True)[:5]
+
+        top = OptimizationService.top_candidates(candidates, 5)
+        assert top.tolist() == expected
+        assert OptimizationService.top_candidates(candidates[:3], 5).tolist() == sorted(
+            range(3), key=lambda i: -candidates['score'][i]
+        )
+
+    def test_records_are_plain_floats(self):
+        candidates = OptimizationService.candidate_grid(0.0, 0.0, 1.0, 1.0, 10, 10)
+        records = OptimizationService.candidate_records(candidates, np.array([4, 0]))
+        assert [r['lon'] for r in records] == [0.4, 0.0]
+        assert all(type(v) is float for r in records for v in r.values())
+
+
+class TestRefineSearch:
+    PEAK = (45.0123, -121.9877)
+
+    def evaluate(self, lats, lons, spacing_m):
+        candidates = OptimizationService.candidates_at(lats, lons)
+        d_m = np.hypot((lats - self.PEAK[0]) * 111320.0, (lons - self.PEAK[1]) * 78700.0)
+        # Broad hill with a narrow summit the coarse grid cannot resolve
+        candidates['elevation'] = 300.0 - d_m * 0.01 + 40.0 * np.exp(-(d_m / 150.0) ** 2)
+        return candidates
+
+    def test_refines_to_target_near_summit(self, mock_tile_manager):
+        service = OptimizationService(mock_tile_manager)
+        weights = {"elevation": 1.0, "prominence": 0.0, "fresnel": 0.0}
+        candidates, stages, converged = service.refine_search(
+            45.0, -122.0, 45.04, -121.96, self.evaluate, weights, target_m=10.0, max_evaluations=5000
+        )
+
+        assert converged
+        spacings = [s["spacing_m"] for s in stages]
+        assert spacings == sorted(spacings, reverse=True) and spacings[-1] == 10.0
+        assert sum(s["evaluations"] for s in stages) == len(candidates) <= 5000
+        # Every point is evaluated once
+        assert len(set(zip(candidates['lat'].round(7), candidates['lon'].round(7)))) == len(candidates)
+
+        best = candidates[OptimizationService.top_candidates(candidates, 1)[0]]
+        err_m = np.hypot((best['lat'] - self.PEAK[0]) * 111320.0, (best['lon'] - self.PEAK[1]) * 78700.0)
+        assert err_m < 10.0
+
+    def test_budget_stops_refinement(self, mock_tile_manager):
+        service = OptimizationService(mock_tile_manager)
+        candidates, stages, converged = service.refine_search(
+            45.0, -122.0, 45.04, -121.96, self.evaluate, {"elevation": 1.0},
+            target_m=1.0, max_evaluations=1500
+        )
+        assert not converged
+        assert len(candidates) <= 1500
+
+
+class TestOptimizeLocation:
+    PARAMS = {
+        "min_lat": 45.0, "min_lon": -122.0, "max_lat": 45.03, "max_lon": -121.97,
+        "frequency_mhz": 915.0, "tx_height": 10.0, "rx_height": 2.0, "k_factor": 1.333,
+        "clutter_height": 0.0, "return_heatmap": True, "heatmap_format": "grid", "resolution_m": 50.0,
+        "prominence_method": "focal", "search": "grid", "max_evaluations": 2000,
+        "weights": {"elevation": 0.5, "prominence": 0.3, "fresnel": 0.2}, "existing_nodes": []
+    }
+
+    @staticmethod
+    def hills(lats, lons):
+        return 300.0 + 80.0 * np.sin(np.asarray(lats) * 700.0) * np.cos(np.asarray(lons) * 500.0)
+
+    @pytest.fixture
+    def service(self, mock_tile_manager):
+        mock_tile_manager.get_elevation_grid.side_effect = lambda lats, lons, resolution_m=None: (
+            self.hills(*np.meshgrid(lats, lons, indexing='ij'))
+        )
+        mock_tile_manager.get_elevations_batch.side_effect = lambda points, resolution_m=None: (
+            self.hills(points[:, 0], points[:, 1])
+        )
+        service = OptimizationService(mock_tile_manager)
+        service.CHUNK_SIZE = 300
+        return service
+
+    def test_followed_grid_streams_chunks_and_matches(self, service):
+        reports = []
+        followed = service.optimize_location(
+            self.PARAMS, on_stage=lambda progress, batch, done, cols: reports.append((progress, len(batch), len(done), cols))
+        )
+        plain = service.optimize_location(self.PARAMS)
+
+        grid = plain["metadata"]["grid"]
+        assert len(reports) > 1
+        assert [r[0] for r in reports] == sorted(r[0] for r in reports) and reports[-1][0] == 1.0
+        assert sum(r[1] for r in reports) == reports[-1][2] == grid["rows"] * grid["cols"]
+        assert all(r[1] % grid["cols"] == 0 and r[3] == grid["cols"] for r in reports[:-1])
+        assert followed["locations"] == plain["locations"]
+        assert followed["heatmap"] == plain["heatmap"]
+
+    def test_adaptive_reports_every_stage(self, service):
+        reports = []
+        result = service.optimize_location(
+            dict(self.PARAMS, search="adaptive", resolution_m=20.0),
+            on_stage=lambda progress, batch, done, cols: reports.append((progress, cols))
+        )
+        stages = result["metadata"]["search"]["stages"]
+        assert len(reports) == len(stages) > 1
+        assert all(cols == 0 for _, cols in reports)
+        assert result["metadata"]["search"]["converged"] and reports[-1][0] == 1.0
+
+    def test_on_stage_can_stop_the_run(self, service):
+        class Stop(Exception):
+            pass
+
+        calls = []
+
+        def on_stage(progress, batch, done, cols):
+            calls.append(progress)
+            raise Stop()
+
+        with pytest.raises(Stop):
+            service.optimize_location(self.PARAMS, on_stage=on_stage)
+        assert calls == [calls[0]] and calls[0] < 1.0
+
+
+class TestNodeIndex:
+    NODES = [
+        {"lat": 45.02, "lon": -121.99, "height": 12.0},
+        {"lat": 45.05, "lon": -122.03, "height": 25.0},
+        {"lat": 45.0105, "lon": -121.9855, "height": 5.0},
+        {"lat": 46.5, "lon": -120.0, "height": 30.0} # ~220 km away
+    ]
+
+    @staticmethod
+    def profiles(starts, ends, samples=50, resolution_m=None):
+        lats = np.linspace(starts[:, 0], ends[:, 0], samples, axis=-1)
+        lons = np.linspace(starts[:, 1], ends[:, 1], samples, axis=-1)
+        return TestOptimizeLocation.hills(lats, lons)
+
+    def test_pairs_match_haversine_range(self):
+        index = NodeIndex(self.NODES)
+        lats, lons = np.array([45.0, 45.04]), np.array([-122.0, -122.02])
+        cand, node = index.pairs(lats, lons, 5000.0)
+
+        expected = {
+            (i, j) for i in range(2) for j in range(len(self.NODES))
+            if rf_physics.haversine_distance(lats[i], lons[i], self.NODES[j]['lat'], self.NODES[j]['lon']) <= 5000.0
+        }
+        assert set(zip(cand.tolist(), node.tolist())) == expected
+        assert len(NodeIndex([]).pairs(lats, lons, 5000.0)[0]) == 0
+
+    def test_matches_per_candidate_check_in_one_lookup(self, mock_tile_manager):
+        mock_tile_manager.get_elevation_profiles.side_effect = self.profiles
+        service = OptimizationService(mock_tile_manager)
+        candidates = OptimizationService.candidate_grid(45.0, -122.0, 45.03, -121.97, 6, 6)
+        # One candidate within 100m of node 2
+        candidates['lat'][0], candidates['lon'][0] = 45.0103, -121.9853
+
+        service.fresnel_clearances(candidates, NodeIndex(self.NODES), 10.0, 915.0, max_link_km=500.0)
+        assert mock_tile_manager.get_elevation_profiles.call_count == 1
+        expected = [
+            service.check_fresnel_clearance(float(c['lat']), float(c['lon']), 10.0, self.NODES, 915.0)
+            for c in candidates
+        ]
+        np.testing.assert_allclose(candidates['fresnel'], expected)
+
+    def test_out_of_range_nodes_count_as_blocked(self, mock_tile_manager):
+        mock_tile_manager.get_elevation_profiles.side_effect = self.profiles
+        service = OptimizationService(mock_tile_manager)
+        candidates = OptimizationService.candidate_grid(45.0, -122.0, 45.03, -121.97, 4, 4)
+        near = NodeIndex(self.NODES[:3])
+
+        service.fresnel_clearances(candidates, near, 10.0, 915.0)
+        in_range = candidates['fresnel'].copy()
+        service.fresnel_clearances(candidates, NodeIndex(self.NODES), 10.0, 915.0)
+
+        # The far node is never profiled, and dilutes the mean as a blocked link
+        ends = mock_tile_manager.get_elevation_profiles.call_args.args[1]
+        assert not np.any(np.isclose(ends[:, 0], 46.5))
+        np.testing.assert_allclose(candidates['fresnel'], in_range * 3 / 4)
+
+        service.fresnel_clearances(candidates, NodeIndex([]), 10.0, 915.0)
+        assert (candidates['fresnel'] == 1.0).all()
@@ -0,0 +1,68 @@
+import json
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tasks.optimize as optimize
+from artifact_store import ArtifactStore
+from optimization_service import OptimizationService
+from task_events import TaskCancelled
+import test_optimization
+from test_scan_tasks import DictRedis
+
+PARAMS = test_optimization.TestOptimizeLocation.PARAMS
+hills = test_optimization.TestOptimizeLocation.hills
+
+
+@pytest.fixture
+def optimize_env(monkeypatch):
+    tm = MagicMock()
+    tm.get_elevation_grid.side_effect = lambda lats, lons, resolution_m=None: (
+        hills(*np.meshgrid(lats, lons, indexing='ij'))
+    )
+
+    @contextmanager
+    def track_degraded():
+        yield {"12/1/2"}
+
+    tm.track_degraded.side_effect = track_degraded
+    service = OptimizationService(tm)
+    service.CHUNK_SIZE = 300
+    store = ArtifactStore(DictRedis())
+    monkeypatch.setattr(optimize, "tile_manager", tm)
+    monkeypatch.setattr(optimize, "optimization_service", service)
+    monkeypatch.setattr(optimize, "artifact_store", store)
+    return service, store
+
+
+def test_progress_streams_locations_and_heatmap_chunks(optimize_env):
+    service, store = optimize_env
+    task = MagicMock()
+    result = optimize._optimize_location(task, PARAMS)
+
+    metas = [c.kwargs["meta"] for c in task.update_state.call_args_list]
+    chunks = [m["heatmap_chunk"] for m in metas if "heatmap_chunk" in m]
+    assert len(chunks) > 1 and metas[-1]["progress"] == 100
+    assert all(len(m["locations"]) == 5 for m in metas[1:])
+    assert sum(len(c["scores"]) for c in chunks) == result["metadata"]["candidates"]
+
+    # Final heatmap by reference, same as the synchronous endpoint's
+    assert "heatmap" not in result and result["degraded_tiles"] == ["12/1/2"]
+    data, content_type = store.get(result["heatmap_id"])
+    assert content_type == "application/json"
+    assert json.loads(data) == service.optimize_location(PARAMS)["heatmap"]
+
+
+def test_cancellation_stops_between_chunks(optimize_env):
+    task = MagicMock()
+    task.check_cancelled.side_effect = [None, None, TaskCancelled("t1")]
+    with pytest.raises(TaskCancelled):
+        optimize._optimize_location(task, PARAMS)
+    # Start, first chunk, then stopped before reporting the second
+    assert task.update_state.call_count == 2
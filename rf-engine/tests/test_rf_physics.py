@@ -0,0 +1,84 @@
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rf_physics
+
+
+def reference_analyze_link(elevs, dist_m, freq_mhz, tx_h, rx_h, k_factor=1.333, clutter_height=0.0):
+    # Per-sample loop version the vectorized code must match exactly
+    elevs = np.array(elevs)
+    dists = np.linspace(0, dist_m, len(elevs))
+    R_eff = k_factor * rf_physics.EARTH_RADIUS_KM * 1000
+    terrain_h = elevs + (dists * (dist_m - dists)) / (2 * R_eff) + clutter_height
+    los_h = np.linspace(elevs[0] + tx_h, elevs[-1] + rx_h, len(elevs))
+    clearance = los_h - terrain_h
+
+    min_ratio = 100.0
+    fresnel = []
+    for i, d1 in enumerate(dists):
+        d2 = dist_m - d1
+        if d1 < 1 or d2 < 1:
+            fresnel.append(0.0)
+            continue
+        f1 = rf_physics.calculate_fresnel_zone(dist_m, freq_mhz, d1, d2)
+        fresnel.append(f1)
+        min_ratio = min(min_ratio, clearance[i] / f1)
+    return min_ratio, fresnel, los_h.tolist(), terrain_h.tolist()
+
+
+class TestAnalyzeLink:
+    def test_matches_reference_loop(self):
+        rng = np.random.default_rng(42)
+        for _ in range(200):
+            n = int(rng.integers(2, 100))
+            args = (rng.normal(200, 80, n), float(rng.uniform(50, 30000)),
+                    float(rng.uniform(100, 3000)), float(rng.uniform(1, 40)), float(rng.uniform(1, 40)),
+                    1.333, float(rng.uniform(0, 10)))
+            min_ratio, fresnel, los, terrain = reference_analyze_link(*args)
+
+            result = rf_physics.analyze_link(*args)
+            assert result["min_clearance_ratio"] == min_ratio
+            assert result["fresnel_profile"] == fresnel
+            assert result["los_profile"] == los
+            assert result["terrain_profile"] == terrain
+
+    def test_metrics_variant_matches(self):
+        elevs = [100, 120, 180, 130, 110]
+        full = rf_physics.analyze_link(elevs, 5000, 915, 10, 2)
+        metrics = rf_physics.analyze_link_metrics(elevs, 5000, 915, 10, 2)
+
+        assert "profile" not in metrics
+        assert full["status"] == metrics["status"] == "blocked"
+        assert full["min_clearance_ratio"] == metrics["min_clearance_ratio"]
+
+    def test_short_link_has_no_interior_samples(self):
+        result = rf_physics.analyze_link_metrics([10, 10], 1.5, 915, 10, 2)
+        assert result["min_clearance_ratio"] == 100.0
+        assert result["status"] == "viable"
+
+
+class TestBatchAPI:
+    def test_batch_matches_scalar_functions(self):
+        rng = np.random.default_rng(7)
+        m, samples = 64, 30
+        elevs = rng.normal(200, 60, (m, samples))
+        dist = rng.uniform(50, 30000, m)
+        tx_h = rng.uniform(1, 40, m)
+
+        for model in ('bullington', 'fspl', 'hata'):
+            # Shared frequency/rx height broadcast against per-link arrays
+            result = rf_physics.analyze_links_batch(elevs, dist, 915.0, tx_h, 2.0, model=model)
+            for i in range(m):
+                single = rf_physics.analyze_link_metrics(elevs[i], dist[i], 915.0, tx_h[i], 2.0)
+                loss = rf_physics.calculate_path_loss(dist[i], elevs[i], 915.0, tx_h[i], 2.0, model=model)
+                assert result["status"][i] == single["status"]
+                assert np.isclose(result["min_clearance_ratio"][i], single["min_clearance_ratio"])
+                assert np.isclose(result["path_loss_db"][i], loss)
+
+    def test_bullington_batch_short_profiles(self):
+        loss = rf_physics.calculate_bullington_loss_batch(np.zeros((3, 2)), 1000.0, 915.0, 10.0, 2.0)
+        assert np.array_equal(loss, np.zeros(3))
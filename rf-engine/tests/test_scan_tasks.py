@@ -0,0 +1,223 @@
+import json
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tasks.viewshed as viewshed
+from artifact_store import ArtifactStore
+from viewshed_cache import ViewshedCache
+from test_viewshed import make_tile_manager
+
+
+def rolling_terrain(lat, lon):
+    return 100 + 60 * np.sin(lat * 900) * np.cos(lon * 700)
+
+
+@pytest.fixture
+def scan_env(monkeypatch):
+    tm = make_tile_manager(rolling_terrain)
+    tm.get_elevation.return_value = 100.0
+
+    @contextmanager
+    def track_degraded():
+        yield set()
+
+    tm.track_degraded.side_effect = track_degraded
+    tm.dataset_fingerprint.return_value = "test:srtm30m:12/16:int16"
+    monkeypatch.setattr(viewshed, "tile_manager", tm)
+    monkeypatch.setattr(viewshed, "redis_client", MagicMock())
+    monkeypatch.setattr(viewshed, "viewshed_cache", ViewshedCache(MagicMock(), enabled=False))
+    monkeypatch.setattr(viewshed, "artifact_store", ArtifactStore(DictRedis()))
+    return tm
+
+
+class DictRedis:
+    """
+    The slice of the Redis client the viewshed cache and artifact store
+    use, backed by a dict. Pipelines run commands immediately.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(
+            {k.encode(): v if isinstance(v, bytes) else v.encode() for k, v in mapping.items()}
+        )
+
+    def hgetall(self, key):
+        return self.data.get(key, {})
+
+    def expire(self, key, ttl):
+        return key in self.data
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+
+NODES = [{"lat": 45.0 + 0.01 * i, "lon": -122.0 + 0.013 * (i % 3), "height": 10 + i} for i in range(5)]
+
+
+class TestNodeArtifacts:
+    def test_artifact_is_json_safe(self, scan_env):
+        options = {"radius": 3000, "mode": "rssi", "rx_sensitivity_dbm": -105}
+        layout = viewshed._scan_layout(NODES, 3000)
+        artifact = viewshed._node_artifact(0, NODES[0], options, layout)
+
+        assert json.loads(json.dumps(artifact)) == artifact
+        covered = viewshed._unpack(artifact["covered"], '<i4')
+        rssi_idx = viewshed._unpack(artifact["rssi_idx"], '<i4')
+        rssi = viewshed._unpack(artifact["rssi"], '<f4')
+
+        # One value per master pixel, covered pixels are those above sensitivity
+        assert len(np.unique(rssi_idx)) == len(rssi_idx)
+        assert set(covered) == set(rssi_idx[rssi >= -105])
+
+    def test_aggregate_of_artifacts_matches_serial_scan(self, scan_env):
+        params = {"nodes": NODES, "options": {"radius": 3000, "optimize_n": 2}}
+        serial = viewshed._batch_viewshed(MagicMock(), params)
+
+        # What the chord does: artifacts through JSON, one node lost
+        layout = json.loads(json.dumps(viewshed._scan_layout(NODES, 3000)))
+        artifacts = [
+            json.loads(json.dumps(viewshed._node_artifact(i, n, params["options"], layout)))
+            for i, n in enumerate(NODES)
+        ]
+        assert viewshed._aggregate(MagicMock(), artifacts, params, layout) == serial
+
+        partial = viewshed._aggregate(MagicMock(), artifacts[1:], params, layout)
+        assert "Site 1" not in [r["name"] for r in partial["results"]]
+
+
+class TestViewshedCache:
+    @pytest.mark.parametrize("mode", ["visibility", "rssi"])
+    def test_rerun_reads_cache_and_matches(self, scan_env, monkeypatch, mode):
+        monkeypatch.setattr(viewshed, "viewshed_cache", ViewshedCache(DictRedis()))
+        params = {"nodes": NODES[:3], "options": {"radius": 3000, "optimize_n": 2, "mode": mode}}
+        first = viewshed._batch_viewshed(MagicMock(), params)
+        calls = scan_env.get_elevation_profiles.call_count
+
+        # One node added: only that one is computed
+        params["nodes"] = NODES[:4]
+        second = viewshed._batch_viewshed(MagicMock(), params)
+        assert first["viewshed_cache"] == {"hits": 0, "computed": 3}
+        assert second["viewshed_cache"] == {"hits": 3, "computed": 1}
+        assert scan_env.get_elevation_profiles.call_count > calls
+
+        calls = scan_env.get_elevation_profiles.call_count
+        third = viewshed._batch_viewshed(MagicMock(), params)
+        assert third["viewshed_cache"] == {"hits": 4, "computed": 0}
+        # Only the inter-node link profiles are fetched
+        assert scan_env.get_elevation_profiles.call_count == calls + 1
+        third.pop("viewshed_cache")
+        second.pop("viewshed_cache")
+        assert third == second
+
+    def test_key_covers_parameters(self, scan_env):
+        base = {"radius": 3000, "mode": "rssi"}
+        key = viewshed._viewshed_key(NODES[0], base, 100.0)
+        assert key == viewshed._viewshed_key(dict(NODES[0]), dict(base), 100)
+        assert key != viewshed._viewshed_key(NODES[0], dict(base, tx_power_dbm=27), 100.0)
+        assert key != viewshed._viewshed_key(NODES[0], base, 120.0)
+        # Sensitivity is applied to the cached raw rssi grid
+        assert key == viewshed._viewshed_key(NODES[0], dict(base, rx_sensitivity_dbm=-100), 100.0)
+
+        scan_env.dataset_fingerprint.return_value = "test:srtm90m:12/16:int16"
+        assert key != viewshed._viewshed_key(NODES[0], base, 100.0)
+
+
+class TestResultArtifacts:
+    def test_rasters_are_stored_by_reference(self, scan_env):
+        params = {"nodes": NODES[:3], "options": {"radius": 3000, "mode": "rssi", "rx_sensitivity_dbm": -105}}
+        result = viewshed._batch_viewshed(MagicMock(), params)
+        composite = result["composite"]
+        assert "image" not in composite
+
+        png, content_type = viewshed.artifact_store.get(composite["image_id"])
+        assert content_type == "image/png" and png.startswith(b"\x89PNG")
+
+        rssi, content_type = viewshed.artifact_store.get(composite["rssi"]["id"])
+        assert content_type == "application/octet-stream"
+        assert len(rssi) == composite["width"] * composite["height"] * 2
+        assert viewshed.artifact_store.get("not-an-id") is None
+
+    def test_per_node_rssi_rasters_are_published(self, scan_env):
+        params = {"nodes": NODES[:3], "options": {"radius": 3000, "mode": "rssi", "rx_sensitivity_dbm": -105}}
+        result = viewshed._batch_viewshed(MagicMock(), params)
+        composite = result["composite"]
+
+        def raster(spec):
+            data, _ = viewshed.artifact_store.get(spec["id"])
+            return np.frombuffer(data, dtype='<i2')
+
+        nodes = [raster(r["rssi"]) for r in result["results"]]
+        assert all(len(n) == composite["width"] * composite["height"] for n in nodes)
+        # The composite is the best node per pixel
+        np.testing.assert_array_equal(np.max(nodes, axis=0), raster(composite["rssi"]))
+
+        visibility = viewshed._batch_viewshed(MagicMock(), dict(params, options={"radius": 3000}))
+        assert all("rssi" not in r for r in visibility["results"])
+
+
+class TestScanRequest:
+    @pytest.mark.parametrize("field,value", [
+        ("engine", "raidal"), ("mode", "rsi"), ("selection", "greddy"), ("model", "okumura")
+    ])
+    def test_unknown_options_are_rejected(self, field, value):
+        from pydantic import ValidationError
+        from server import ScanRequest
+
+        nodes = [{"id": "n1", "lat": 45.0, "lon": -122.0}]
+        assert ScanRequest(nodes=nodes).selection == "lazy"
+        with pytest.raises(ValidationError, match=field):
+            ScanRequest(nodes=nodes, **{field: value})
+
+
+class TestScanCancellation:
+    def test_serial_scan_stops_between_nodes(self, scan_env):
+        from task_events import TaskCancelled
+
+        task = MagicMock()
+        task.check_cancelled.side_effect = [None, None, TaskCancelled("scan")]
+        params = {"nodes": NODES, "options": {"radius": 3000, "parallel": False}}
+        with pytest.raises(TaskCancelled):
+            viewshed._batch_viewshed(task, params)
+        # Two nodes computed, then nothing more
+        assert task.update_state.call_count == 3
+
+    def test_fanned_out_scan_skips_nodes_and_ends_revoked(self, scan_env, monkeypatch):
+        from task_events import cancel_key
+
+        redis = MagicMock()
+        redis.exists.side_effect = lambda key: key == cancel_key("scan-1")
+        monkeypatch.setattr(viewshed, "redis_client", redis)
+        layout = viewshed._scan_layout(NODES, 3000)
+        calls = scan_env.get_elevation_profiles.call_count
+
+        artifact = viewshed.viewshed_node.run("scan-1", 0, len(NODES), NODES[0], {"radius": 3000}, layout)
+        assert artifact == {"index": 0, "error": "cancelled"}
+        assert scan_env.get_elevation_profiles.call_count == calls
+
+        backend = MagicMock()
+        backend.client = redis
+        monkeypatch.setattr(viewshed.aggregate_viewshed, "backend", backend)
+        result = viewshed.aggregate_viewshed.apply(
+            args=([artifact], {"nodes": NODES, "options": {"radius": 3000}}, layout), task_id="scan-1"
+        )
+        assert result.state == "IGNORED"
+        assert backend.mark_as_revoked.call_args.args == ("scan-1", "cancelled")
@@ -0,0 +1,73 @@
+import itertools
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.coverage import bitmap, popcount
+from core.selection import select_sites, GREEDY_GUARANTEE
+
+
+def random_bitmaps(n, size=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        # Clustered footprints so candidates overlap like real viewsheds
+        center = rng.integers(0, size)
+        spread = rng.integers(20, 300)
+        idx = np.clip(rng.normal(center, spread, size=spread).astype(int), 0, size - 1)
+        out.append(bitmap(idx, size))
+    return out
+
+
+class TestSelectSites:
+    def test_lazy_matches_plain_greedy_with_fewer_evaluations(self):
+        bitmaps = random_bitmaps(120)
+        plain = select_sites(bitmaps, 8, method='greedy')
+        lazy = select_sites(bitmaps, 8, method='lazy')
+
+        assert lazy['indices'] == plain['indices']
+        assert lazy['gains'] == plain['gains']
+        assert lazy['coverage'] == plain['coverage']
+        assert plain['evaluations_saved'] == 0
+        assert lazy['evaluations'] < plain['evaluations']
+        assert lazy['evaluations_saved'] == plain['evaluations'] - lazy['evaluations']
+
+    def test_upper_bound_covers_optimum(self):
+        bitmaps = random_bitmaps(12, size=400, seed=3)
+        k = 3
+        optimum = 0
+        for combo in itertools.combinations(range(len(bitmaps)), k):
+            union = np.bitwise_or.reduce([bitmaps[i] for i in combo])
+            optimum = max(optimum, popcount(union))
+
+        for method in ('greedy', 'lazy'):
+            picked = select_sites(bitmaps, k, method=method)
+            assert picked['guarantee'] == pytest.approx(GREEDY_GUARANTEE)
+            assert picked['coverage'] >= GREEDY_GUARANTEE * optimum
+            assert picked['coverage'] <= optimum <= picked['upper_bound']
+
+    def test_stochastic_samples_and_is_reproducible(self):
+        bitmaps = random_bitmaps(200, seed=5)
+        a = select_sites(bitmaps, 5, method='stochastic', epsilon=0.2, seed=42)
+        b = select_sites(bitmaps, 5, method='stochastic', epsilon=0.2, seed=42)
+
+        assert a['indices'] == b['indices']
+        assert len(set(a['indices'])) == 5
+        # ceil(200 / 5 * ln 5) = 65 candidates per round instead of 200..196
+        assert a['evaluations'] == 5 * 65
+        assert a['guarantee'] == pytest.approx(GREEDY_GUARANTEE - 0.2)
+
+    def test_stops_when_nothing_left_to_gain(self):
+        bitmaps = [bitmap([0, 1], 16), bitmap([1], 16), bitmap([], 16)]
+        for method in ('greedy', 'lazy'):
+            picked = select_sites(bitmaps, 3, method=method)
+            assert picked['indices'] == [0]
+            assert picked['upper_bound'] == picked['coverage'] == 2
+
+    def test_rejects_unknown_method(self):
+        with pytest.raises(ValueError):
+            select_sites(random_bitmaps(3), 2, method='exhaustive')
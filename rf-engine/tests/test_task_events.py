@@ -0,0 +1,149 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_events import TaskEventHub, channel_name, last_event_key, publish_event
+
+
+class FakeAsyncRedis:
+    """
+    In-memory GET / pub-sub, enough for TaskEventHub.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = []
+        self.subscriptions = 0
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    def publish(self, task_id, event, data):
+        message = json.dumps({"event": event, "data": data})
+        self.values[last_event_key(task_id)] = message
+        for pubsub in self.subscribers:
+            if channel_name(task_id) in pubsub.channels:
+                pubsub.queue.put_nowait({"type": "message", "data": message})
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.channels = set()
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+        self.redis.subscribers.append(self)
+        self.redis.subscriptions += 1
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def reset(self):
+        if self in self.redis.subscribers:
+            self.redis.subscribers.remove(self)
+
+
+def pending(task_id):
+    return {"event": "progress", "data": {"progress": 0}}
+
+
+def test_listeners_share_one_subscription_and_get_replay():
+    async def scenario():
+        redis = FakeAsyncRedis()
+        hub = TaskEventHub(redis, fallback=pending)
+        redis.publish("t1", "progress", {"progress": 20})
+
+        async def collect():
+            return [e async for e in hub.subscribe("t1")]
+
+        first = asyncio.create_task(collect())
+        second = asyncio.create_task(collect())
+        await asyncio.sleep(0.05)
+        redis.publish("t1", "progress", {"progress": 60})
+        redis.publish("t1", "complete", {"status": "completed"})
+        results = await asyncio.gather(first, second)
+
+        assert redis.subscriptions == 1
+        assert redis.subscribers == []
+        return results
+
+    for events in asyncio.run(scenario()):
+        assert [e["data"].get("progress") for e in events[:2]] == [20, 60]
+        assert events[-1] == {"event": "complete", "data": {"status": "completed"}}
+
+
+def test_finished_task_replays_terminal_event_only():
+    async def scenario():
+        redis = FakeAsyncRedis()
+        redis.publish("t2", "error", "boom")
+        hub = TaskEventHub(redis, fallback=pending)
+        return [e async for e in hub.subscribe("t2")]
+
+    assert asyncio.run(scenario()) == [{"event": "error", "data": "boom"}]
+
+
+def test_missed_messages_are_reconciled():
+    async def scenario():
+        redis = FakeAsyncRedis()
+        hub = TaskEventHub(redis, fallback=pending, reconcile_seconds=0.05)
+        events = []
+
+        async def collect():
+            async for e in hub.subscribe("t3"):
+                events.append(e)
+
+        listener = asyncio.create_task(collect())
+        await asyncio.sleep(0.02)
+        # Stored but never delivered on the channel
+        redis.values[last_event_key("t3")] = json.dumps({"event": "complete", "data": {}})
+        await asyncio.wait_for(listener, 1.0)
+        return events
+
+    events = asyncio.run(scenario())
+    assert events[0] == pending("t3")
+    assert events[-1]["event"] == "complete"
+
+
+def test_publish_event_sets_last_state_and_publishes():
+    client = MagicMock()
+    pipe = client.pipeline.return_value
+    publish_event(client, "t4", "progress", {"progress": 5})
+    message = json.dumps({"event": "progress", "data": {"progress": 5}})
+    pipe.set.assert_called_once_with(last_event_key("t4"), message, ex=3600)
+    pipe.publish.assert_called_once_with(channel_name("t4"), message)
+
+
+def test_cancelled_task_is_revoked_with_event():
+    from celery import Celery
+    from task_events import EventTask, cancel_key, request_cancel
+
+    app = Celery("test", set_as_current=False)
+
+    @app.task(bind=True, base=EventTask)
+    def job(self):
+        self.check_cancelled()
+        return "done"
+
+    job.backend = MagicMock()
+    job.backend.client.exists.return_value = 0
+    assert job.apply(task_id="t5").result == "done"
+
+    request_cancel(job.backend.client, "t6")
+    job.backend.client.set.assert_called_once_with(cancel_key("t6"), 1, ex=3600)
+    job.backend.client.exists.return_value = 1
+    assert job.apply(task_id="t6").state == "IGNORED"
+    assert job.backend.mark_as_revoked.call_args.args == ("t6", "cancelled")
+    job.backend.client.pipeline.return_value.publish.assert_called_with(
+        channel_name("t6"), json.dumps({"event": "cancelled", "data": {"status": "cancelled"}})
+    )
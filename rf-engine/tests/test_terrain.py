@@ -0,0 +1,46 @@
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.terrain import focal_prominence, topographic_prominence, sample_grid
+
+
+class TestFocalProminence:
+    def test_flat_terrain_has_none(self):
+        assert not focal_prominence(np.full((9, 9), 120.0), 5, 5).any()
+
+    def test_spike_above_window_mean(self):
+        elev = np.zeros((7, 7))
+        elev[3, 3] = 90.0
+        prom = focal_prominence(elev, 3, 3)
+        assert prom[3, 3] == 80.0
+        # Neighbours sit below their window mean
+        assert prom[3, 2] == 0.0
+
+
+class TestTopographicProminence:
+    def test_key_col_between_two_summits(self):
+        elev = np.array([[0.0, 10.0, 3.0, 7.0, 0.0]])
+        np.testing.assert_array_equal(topographic_prominence(elev), [[0.0, 10.0, 0.0, 4.0, 0.0]])
+
+    def test_ridge_saddle_on_a_raster(self):
+        # Two hills joined by a saddle at 40m
+        y, x = np.mgrid[0:21, 0:41]
+        elev = np.maximum(100 - 6 * np.hypot(x - 10, y - 10), 80 - 6 * np.hypot(x - 30, y - 10))
+        elev = np.maximum(elev, np.where(y == 10, 40.0, 0.0))
+        prom = topographic_prominence(elev)
+
+        assert prom[10, 10] == elev.max() - elev.min()
+        assert prom[10, 30] == 80.0 - 40.0
+        assert np.count_nonzero(prom) == 2
+
+
+def test_sample_grid_bilinear_and_nearest():
+    lats = np.array([0.0, 1.0])
+    lons = np.array([0.0, 1.0, 2.0])
+    grid = np.array([[0.0, 10.0, 20.0], [100.0, 110.0, 120.0]])
+    np.testing.assert_allclose(sample_grid(grid, lats, lons, [0.5, 0.0], [1.5, 5.0]), [65.0, 20.0])
+    np.testing.assert_allclose(sample_grid(grid, lats, lons, [0.4], [1.4], order=0), [10.0])
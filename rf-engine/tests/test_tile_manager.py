@@ -0,0 +1,489 @@
+import pytest
+import time
+from unittest.mock import MagicMock
+import numpy as np
+import msgpack
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tile_manager import TileManager
+from single_flight import SingleFlight
+from circuit_breaker import CircuitBreaker
+from tile_cache import DecodedTile, TileLRUCache
+from tile_codec import encode_tile, decode_tile, is_binary_tile, HEADER
+
+
+class FakeRedis:
+    """
+    Minimal in-memory stand-in for the redis client calls TileManager makes.
+    """
+    def __init__(self):
+        self.store = {}
+        self.mget_calls = 0
+        self.pipelines = 0
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def mget(self, keys):
+        self.mget_calls += 1
+        return [self.store.get(key) for key in keys]
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    def exists(self, *keys):
+        return sum(1 for key in keys if key in self.store)
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.store.pop(key, None) is not None)
+
+    def pipeline(self, transaction=True):
+        self.pipelines += 1
+        return FakePipeline(self)
+
+    def scan_iter(self, match=None, count=None):
+        import fnmatch
+        return (key.encode() for key in list(self.store) if fnmatch.fnmatchcase(key, match))
+
+    def eval(self, script, numkeys, key, token):
+        # Only the lease release script is used
+        if self.store.get(key) == token.encode():
+            return self.delete(key)
+        return 0
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+def ramp_tile():
+    # Elevation rises 1m per lat sample and 100m per lon sample
+    return {"elevation": [float(j * 100 + i) for j in range(16) for i in range(16)]}
+
+
+def ramp_grid():
+    return np.array(ramp_tile()["elevation"], dtype=np.float32).reshape((16, 16))
+
+
+@pytest.fixture
+def tile_manager():
+    tm = TileManager(FakeRedis())
+    tm._fetch_tile_from_backend = MagicMock(side_effect=lambda x, y, z, size: ramp_grid())
+    return tm
+
+
+class TestTileLRUCache:
+    def test_lru_eviction_by_count(self):
+        cache = TileLRUCache(max_tiles=2)
+        tile = DecodedTile(np.zeros((16, 16)), (0, 0, 1, 1))
+
+        cache.put("a", tile)
+        cache.put("b", tile)
+        cache.get("a")           # "b" is now least recently used
+        cache.put("c", tile)
+
+        assert cache.get("b") is None
+        assert cache.get("a") is tile
+        assert cache.stats()["evictions"] == 1
+
+    def test_byte_budget(self):
+        tile = DecodedTile(np.zeros((16, 16)), (0, 0, 1, 1))
+        cache = TileLRUCache(max_tiles=100, max_bytes=tile.nbytes * 3)
+
+        for key in "abcde":
+            cache.put(key, tile)
+
+        stats = cache.stats()
+        assert stats["tiles"] == 3
+        assert stats["bytes"] <= tile.nbytes * 3
+
+
+class TestTileCodec:
+    def test_int16_roundtrip_within_a_decimeter(self):
+        grid = ramp_grid() + np.float32(1234.56)
+
+        payload = encode_tile(grid, 12, 655, 1459)
+        header, decoded = decode_tile(payload)
+
+        assert len(payload) == HEADER.size + 256 * 2
+        assert (header.zoom, header.x, header.y, header.rows, header.cols) == (12, 655, 1459, 16, 16)
+        np.testing.assert_allclose(decoded, grid, atol=0.05)
+
+    def test_float32_is_zero_copy(self):
+        payload = encode_tile(ramp_grid(), 12, 1, 2, dtype="float32")
+        header, decoded = decode_tile(payload)
+
+        np.testing.assert_array_equal(decoded, ramp_grid())
+        assert not decoded.flags.owndata
+
+    def test_large_relief_falls_back_to_float32(self):
+        grid = np.zeros((16, 16), dtype=np.float32)
+        grid[0, 0] = 8848.0
+        grid[1, 1] = -4000.0
+
+        header, decoded = decode_tile(encode_tile(grid, 12, 1, 2))
+
+        np.testing.assert_array_equal(decoded, grid)
+
+
+class TestSingleFlight:
+    def test_concurrent_callers_share_one_call(self):
+        import threading
+        import time
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.05)
+            return "tile"
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert sorted(leader for _, leader in results) == [False] * 7 + [True]
+        assert all(value == "tile" for value, _ in results)
+        # Nothing lingers once the flight has landed
+        assert len(flight) == 0
+
+    def test_errors_reach_waiters_and_are_not_cached(self):
+        flight = SingleFlight()
+
+        with pytest.raises(RuntimeError):
+            flight.do("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+
+        assert flight.do("k", lambda: 42) == (42, True)
+
+
+class TestCircuitBreaker:
+    def test_opens_on_error_rate_and_recovers(self):
+        breaker = CircuitBreaker("test", error_rate=0.5, min_calls=4, open_seconds=0.05)
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED  # below min_calls
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+        import time
+        time.sleep(0.06)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()  # only one trial call
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker("test", min_calls=1, open_seconds=0.0)
+        breaker.record_failure()
+        assert breaker.allow()  # half-open immediately
+        breaker.record_failure()
+        assert breaker._state == CircuitBreaker.OPEN
+
+
+class TestTileManager:
+    def test_decoded_tile_served_from_memory(self, tile_manager):
+        first = tile_manager.get_tile(655, 1459, 12)
+        second = tile_manager.get_tile(655, 1459, 12)
+
+        assert first is second
+        assert first.grid.dtype == np.float32
+        assert tile_manager._fetch_tile_from_backend.call_count == 1
+        # Resolution-qualified key only: no pre-pyramid keys left in Redis
+        assert tile_manager.redis.mget_calls == 1
+        assert tile_manager.cache_stats()["hits"] == 1
+
+    def test_redis_tile_decoded_once(self, tile_manager):
+        tile_manager.redis.store["tile:12:652:1465"] = msgpack.packb(ramp_tile())
+
+        tile_manager.get_elevation(45.52, -122.67)
+        tile_manager.get_elevation(45.521, -122.669)
+
+        assert tile_manager.redis.mget_calls == 2
+        tile_manager._fetch_tile_from_backend.assert_not_called()
+        # Legacy entry was migrated to the binary format and new key
+        assert is_binary_tile(tile_manager.redis.store["tile:12:652:1465:16"])
+
+    def test_fetched_tile_stored_as_binary(self, tile_manager):
+        tile_manager.get_tile(655, 1459, 12)
+
+        assert is_binary_tile(tile_manager.redis.store["tile:12:655:1459:16"])
+
+    def test_bilinear_interpolation(self, tile_manager):
+        tile = tile_manager.get_tile(655, 1459, 12)
+        west, south, east, north = tile.bounds
+
+        lat = south + (north - south) * (2.5 / 15.0)
+        lon = west + (east - west) * (4.0 / 15.0)
+
+        assert tile_manager._extract_elevation_from_tile(tile, lat, lon) == pytest.approx(402.5)
+
+    def test_tile_indices_match_mercantile(self):
+        import mercantile
+        rng = np.random.default_rng(0)
+        lats = rng.uniform(-80, 80, 500)
+        lons = rng.uniform(-179.9, 179.9, 500)
+
+        tile_x, tile_y = TileManager._tile_indices(lats, lons, 12)
+
+        for lat, lon, x, y in zip(lats, lons, tile_x, tile_y):
+            tile = mercantile.tile(lon, lat, 12)
+            assert (tile.x, tile.y) == (x, y)
+
+    def test_batch_matches_scalar_lookup(self, tile_manager):
+        rng = np.random.default_rng(1)
+        coords = np.column_stack((rng.uniform(45.4, 45.6, 300), rng.uniform(-122.8, -122.5, 300)))
+
+        batch = tile_manager.get_elevations_batch(coords)
+
+        assert isinstance(batch, np.ndarray)
+        expected = [tile_manager.get_elevation(lat, lon) for lat, lon in coords]
+        np.testing.assert_allclose(batch, expected)
+        assert len(tile_manager.get_elevations_batch([])) == 0
+
+    def test_bulk_load_single_round_trips(self, tile_manager):
+        tile_manager.redis.store["tile:12:10:10:16"] = encode_tile(ramp_grid(), 12, 10, 10)
+        tile_manager.redis.store["tile:12:11:10"] = msgpack.packb(ramp_tile())
+        coords = [(10, 10), (11, 10), (12, 10), (13, 10)]
+
+        tiles = tile_manager.get_tiles(coords, 12)
+
+        assert all(tile is not None for tile in tiles)
+        # One MGET for current keys, one for the misses' legacy keys
+        assert tile_manager.redis.mget_calls == 2
+        assert tile_manager.redis.pipelines == 1
+        assert tile_manager._fetch_tile_from_backend.call_count == 2
+        # Fetched misses and the migrated legacy entry were written back
+        for x in (11, 12, 13):
+            assert is_binary_tile(tile_manager.redis.store[f"tile:12:{x}:10:16"])
+
+    def test_legacy_lookup_follows_old_keys_in_redis(self, tile_manager):
+        old_key = "tile:12:30:10"
+        tile_manager.redis.store[old_key] = msgpack.packb(ramp_tile())
+
+        # A cold miss elsewhere does not stop the migration
+        tile_manager.get_tiles([(10, 10)], 12)
+        assert tile_manager.get_tiles([(30, 10)], 12)[0] is not None
+        assert tile_manager.redis.mget_calls == 4
+        assert tile_manager._fetch_tile_from_backend.call_count == 1
+        assert is_binary_tile(tile_manager.redis.store["tile:12:30:10:16"])
+
+        # Once no old keys are left (re-checked), a miss is a single MGET
+        del tile_manager.redis.store[old_key]
+        tile_manager.legacy_check_seconds = 0
+        tile_manager.get_tiles([(20, 10)], 12)
+        assert tile_manager.redis.mget_calls == 5
+
+    def test_waits_for_lease_held_by_another_process(self, tile_manager):
+        import threading
+        key = "tile:12:655:1459:16"
+        tile_manager.redis.store[f"lease:{key}"] = b"other-process"
+
+        def other_process_finishes():
+            tile_manager.redis.store[key] = encode_tile(ramp_grid(), 12, 655, 1459)
+            del tile_manager.redis.store[f"lease:{key}"]
+
+        timer = threading.Timer(0.15, other_process_finishes)
+        timer.start()
+        tile = tile_manager.get_tile(655, 1459, 12)
+        timer.join()
+
+        assert tile is not None
+        tile_manager._fetch_tile_from_backend.assert_not_called()
+
+    def test_release_keeps_a_lease_taken_over_by_another_process(self, tile_manager):
+        lease = tile_manager.lease
+        token = lease.acquire("tile:x")
+        lease.release("tile:x", token)
+        assert "lease:tile:x" not in tile_manager.redis.store
+
+        stale = lease.acquire("tile:x")
+        tile_manager.redis.store["lease:tile:x"] = b"other-process"  # expired and re-taken
+        lease.release("tile:x", stale)
+        assert tile_manager.redis.store["lease:tile:x"] == b"other-process"
+
+    def test_waiter_honours_holders_failure(self, tile_manager):
+        key = "tile:12:655:1459:16"
+        tile_manager.lease.ttl_ms = 100
+        tile_manager.redis.store[f"lease:{key}"] = b"other-process"
+        tile_manager.redis.store[f"tile_neg:{key}"] = b"1"  # holder failed, lease not yet expired
+
+        assert tile_manager._fetch_tile_once(key, 655, 1459, 12, 16) == (None, None)
+        tile_manager._fetch_tile_from_backend.assert_not_called()
+
+    def test_waiter_does_not_fetch_without_lease(self, tile_manager):
+        key = "tile:12:655:1459:16"
+        tile_manager.lease.ttl_ms = 100
+        tile_manager.redis.store[f"lease:{key}"] = b"other-process"  # held past our wait
+
+        assert tile_manager._fetch_tile_once(key, 655, 1459, 12, 16) == (None, None)
+        tile_manager._fetch_tile_from_backend.assert_not_called()
+
+    def test_failed_fetch_is_negatively_cached(self, tile_manager):
+        tile_manager._fetch_tile_from_backend.side_effect = lambda x, y, z, size: None
+
+        with tile_manager.track_degraded() as degraded:
+            assert tile_manager.get_tile(655, 1459, 12) is None
+        assert degraded == {"tile:12:655:1459:16"}
+        assert "tile_neg:tile:12:655:1459:16" in tile_manager.redis.store
+
+        # Within the negative TTL the backend is not asked again
+        assert tile_manager.get_tile(655, 1459, 12) is None
+        assert tile_manager._fetch_tile_from_backend.call_count == 1
+
+    def test_open_breaker_skips_backend(self, tile_manager):
+        tile_manager.breaker = CircuitBreaker("test", min_calls=1, open_seconds=60)
+        tile_manager.breaker.record_failure()
+
+        with tile_manager.track_degraded() as degraded:
+            elevs = tile_manager.get_elevations_batch([(45.5, -122.6)])
+        assert elevs[0] == 0.0
+        assert len(degraded) == 1
+        tile_manager._fetch_tile_from_backend.assert_not_called()
+
+    def test_prefetch_skips_cached_tiles(self, tile_manager):
+        import mercantile
+        bbox = (-122.70, 45.45, -122.55, 45.55)
+        tiles = list(mercantile.tiles(*bbox, zooms=12))
+        cached = tiles[0]
+        tile_manager.redis.store[f"tile:12:{cached.x}:{cached.y}:16"] = encode_tile(ramp_grid(), 12, cached.x, cached.y)
+
+        progress = []
+        stats = tile_manager.prefetch(bbox, zoom=12, concurrency=2,
+                                      progress_cb=lambda done, total, s: progress.append((done, total)))
+
+        assert stats["total"] == len(tiles)
+        assert stats["cached"] == 1
+        assert stats["fetched"] == len(tiles) - 1
+        assert stats["failed"] == 0
+        assert tile_manager._fetch_tile_from_backend.call_count == len(tiles) - 1
+        assert progress[-1] == (len(tiles) - 1, len(tiles) - 1)
+        for t in tiles:
+            assert is_binary_tile(tile_manager.redis.store[f"tile:12:{t.x}:{t.y}:16"])
+
+    def test_prefetch_counts_legacy_keys_as_cached(self, tile_manager):
+        import mercantile
+        bbox = (-122.70, 45.45, -122.55, 45.55)
+        tiles = list(mercantile.tiles(*bbox, zooms=12))
+        legacy = tiles[0]
+        tile_manager.redis.store[f"tile:12:{legacy.x}:{legacy.y}"] = msgpack.packb(ramp_tile())
+
+        stats = tile_manager.prefetch(bbox, zoom=12, concurrency=2)
+
+        assert stats["cached"] == 1
+        assert stats["fetched"] == len(tiles) - 1
+        assert tile_manager._fetch_tile_from_backend.call_count == len(tiles) - 1
+
+    def test_prefetch_stops_when_progress_callback_raises(self, tile_manager):
+        bbox = (-122.70, 45.45, -122.55, 45.55)
+
+        class Stop(Exception):
+            pass
+
+        def stop(done, total, stats):
+            raise Stop()
+
+        def slow_fetch(x, y, z, size):
+            time.sleep(0.05)
+            return ramp_grid()
+
+        tile_manager._fetch_tile_from_backend.side_effect = slow_fetch
+        with pytest.raises(Stop):
+            tile_manager.prefetch(bbox, zoom=12, concurrency=1, progress_cb=stop)
+        # At most the tile in flight when the first one finished
+        assert tile_manager._fetch_tile_from_backend.call_count <= 2
+
+    def test_pyramid_level_selection(self, monkeypatch):
+        monkeypatch.setenv("TILE_PYRAMID", "10/16,12/64")
+        tm = TileManager(FakeRedis())
+        tm._fetch_tile_from_backend = MagicMock(
+            side_effect=lambda x, y, z, size: np.full((size, size), float(z), dtype=np.float32)
+        )
+
+        assert tm.select_level() == (12, 64)
+        assert tm.select_level(resolution_m=3000) == (10, 16)
+        assert tm.select_level(resolution_m=10) == (12, 64)
+
+        coords = [(45.5, -122.6)]
+        assert tm.get_elevations_batch(coords)[0] == 12.0
+        assert tm.get_elevations_batch(coords, resolution_m=3000)[0] == 10.0
+        assert any(key.endswith(":64") for key in tm.redis.store)
+        assert tm.get_tile(655, 1459, 12).grid.shape == (64, 64)
+
+
+class TestLocalDEMBackend:
+    @pytest.fixture
+    def dem_dir(self, tmp_path):
+        # 121x121 SRTM-style tile for N45..46, W123..122. Elevation = 1000 * (lat - 45)
+        size = 121
+        lat_rows = 46 - np.arange(size) / (size - 1)
+        grid = np.repeat(((lat_rows - 45) * 1000)[:, None], size, axis=1)
+        (tmp_path / "ned10m").mkdir()
+        grid.astype('>i2').tofile(tmp_path / "ned10m" / "N45W123.hgt")
+        (tmp_path / "config.yaml").write_text(
+            "datasets:\n  - name: ned10m\n    path: ned10m/\n"
+        )
+        return tmp_path
+
+    def test_hgt_bilinear_sampling(self, dem_dir):
+        from elevation_backends import LocalDEMBackend
+        backend = LocalDEMBackend(str(dem_dir / "config.yaml"), "ned10m")
+
+        elevs = backend.fetch_points(np.array([45.25, 45.5, 45.999]), np.array([-122.9, -122.5, -122.1]))
+
+        np.testing.assert_allclose(elevs, [250.0, 500.0, 999.0], atol=1.0)
+        assert backend.fetch_points(np.array([10.0]), np.array([10.0])) is None
+
+    def test_files_open_lazily_once_per_process(self, dem_dir, monkeypatch):
+        from elevation_backends import LocalDEMBackend, _DEMFile
+        backend = LocalDEMBackend(str(dem_dir / "config.yaml"), "ned10m")
+        dem = backend.files[0]
+        assert dem._opened is None
+
+        backend.fetch_points(np.array([45.5]), np.array([-122.5]))
+        handle = dem.handle()
+        backend.fetch_points(np.array([45.6]), np.array([-122.5]))
+        assert dem.handle() is handle
+
+        # A forked worker gets its own handle
+        monkeypatch.setattr(os, "getpid", lambda: -1)
+        assert dem.handle() is not handle
+
+        with pytest.raises(TypeError):
+            _DEMFile("x", 0, 0, 1, 1, 1, 1, 0.0, None)
+
+    def test_tile_manager_uses_local_backend(self, dem_dir, monkeypatch):
+        monkeypatch.setenv("ELEVATION_BACKEND", "local")
+        monkeypatch.setenv("ELEVATION_CONFIG", str(dem_dir / "config.yaml"))
+        monkeypatch.setenv("ELEVATION_DATASET", "ned10m")
+        tm = TileManager(FakeRedis())
+
+        assert tm.backend.name == "local"
+        assert tm.get_elevation(45.52, -122.67) == pytest.approx(520.0, abs=2.0)
@@ -0,0 +1,155 @@
+import pytest
+from unittest.mock import MagicMock
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.algorithms import calculate_viewshed, calculate_viewshed_radial, calculate_rssi_grid, _radial_sweep
+import rf_physics
+
+
+def make_tile_manager(elev_fn):
+    """
+    Fake TileManager whose terrain is an analytic function of (lat, lon).
+    """
+    tm = MagicMock()
+
+    def grid(lats, lons):
+        lat_g, lon_g = np.meshgrid(lats, lons, indexing='ij')
+        return elev_fn(lat_g, lon_g)
+
+    def batch(coords):
+        arr = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        return list(elev_fn(arr[:, 0], arr[:, 1]))
+
+    def profiles(starts, ends, samples=50):
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        lats = np.linspace(starts[:, 0], ends[:, 0], samples, axis=-1)
+        lons = np.linspace(starts[:, 1], ends[:, 1], samples, axis=-1)
+        return elev_fn(lats, lons)
+
+    tm.get_elevation_grid.side_effect = grid
+    tm.get_elevations_batch.side_effect = batch
+    tm.get_elevation_profiles.side_effect = profiles
+    return tm
+
+
+def ridge_terrain(lat, lon):
+    # 200m wall running north-south, 1km east of (45, -122)
+    east_m = (lon + 122.0) * 111320.0 * np.cos(np.radians(45.0))
+    return np.where((east_m > 950) & (east_m < 1050), 300.0, 100.0)
+
+
+class TestProfileViewshed:
+    def test_matches_per_cell_analysis(self):
+        tm = make_tile_manager(ridge_terrain)
+        grid, lats, lons = calculate_viewshed(tm, 45.0, -122.0, 10.0, 3000, resolution_m=150)
+
+        # Reference: one scalar profile + analyze_link per cell
+        expected = np.zeros_like(grid)
+        for r, lat in enumerate(lats):
+            for c, lon in enumerate(lons):
+                dist_m = rf_physics.haversine_distance(45.0, -122.0, lat, lon)
+                if dist_m > 3000 or dist_m < 10:
+                    continue
+                profile = ridge_terrain(np.linspace(45.0, lat, 15), np.linspace(-122.0, lon, 15))
+                link = rf_physics.analyze_link(profile, dist_m, 915.0, 10.0, 2.0)
+                expected[r, c] = 1.0 if link['min_clearance_ratio'] >= 0.0 else 0.0
+
+        assert np.array_equal(grid, expected)
+        assert 0 < grid.sum() < grid.size
+
+
+    def test_unknown_terrain_is_not_visible(self):
+        def holey_terrain(lat, lon):
+            # No data north of the transmitter
+            return np.where(lat > 45.01, np.nan, 100.0)
+
+        tm = make_tile_manager(holey_terrain)
+        grid, lats, lons = calculate_viewshed(tm, 45.0, -122.0, 10.0, 3000, resolution_m=150)
+        assert not grid[lats > 45.01].any()
+        assert grid[lats < 44.99].any()
+
+        # A failed lookup leaves its cells not visible instead of failing the grid
+        tm.get_elevation_profiles.side_effect = RuntimeError("backend down")
+        grid, _, _ = calculate_viewshed(tm, 45.0, -122.0, 10.0, 3000, resolution_m=150)
+        assert not grid.any()
+
+class TestRssiGrid:
+    def test_matches_per_cell_path_loss(self):
+        tm = make_tile_manager(ridge_terrain)
+        grid, lats, lons = calculate_rssi_grid(
+            tm, 45.0, -122.0, 10.0, 3000, resolution_m=300, model='itm',
+            tx_power_dbm=22.0, tx_gain_dbi=3.0, rx_gain_dbi=2.0
+        )
+
+        assert grid.dtype == np.float32
+        for r, lat in enumerate(lats):
+            for c, lon in enumerate(lons):
+                dist_m = rf_physics.haversine_distance(45.0, -122.0, lat, lon)
+                if dist_m > 3000 or dist_m < 10:
+                    assert np.isnan(grid[r, c])
+                    continue
+                profile = ridge_terrain(np.linspace(45.0, lat, 15), np.linspace(-122.0, lon, 15))
+                loss = rf_physics.calculate_path_loss(dist_m, profile, 915.0, 10.0, 2.0, model='itm')
+                assert grid[r, c] == pytest.approx(27.0 - loss, abs=1e-3)
+
+    def test_ridge_costs_signal(self):
+        tm = make_tile_manager(ridge_terrain)
+        grid, lats, lons = calculate_rssi_grid(tm, 45.0, -122.0, 10.0, 3000, resolution_m=150)
+        mid = len(lats) // 2
+        east_m = (lons + 122.0) * 111320.0 * np.cos(np.radians(45.0))
+
+        # Same distance either side of the wall, west side is unobstructed
+        west = grid[mid, np.argmin(np.abs(east_m + 2000))]
+        east = grid[mid, np.argmin(np.abs(east_m - 2000))]
+        assert west > east
+
+
+class TestRadialViewshed:
+    def test_flat_terrain_fully_visible(self):
+        tm = make_tile_manager(lambda lat, lon: np.full(np.shape(lat), 100.0))
+
+        grid, lats, lons = calculate_viewshed_radial(tm, 45.0, -122.0, 10.0, 2000, resolution_m=100)
+
+        assert grid.shape == (len(lats), len(lons))
+        lat_g, lon_g = np.meshgrid(lats, lons, indexing='ij')
+        dy = (lat_g - 45.0) * 111320.0
+        dx = (lon_g + 122.0) * 111320.0 * np.cos(np.radians(45.0))
+        dist = np.sqrt(dx ** 2 + dy ** 2)
+        inside = (dist <= 2000) & (dist >= 10)
+
+        assert np.all(grid[inside] == 1.0)
+        assert np.all(grid[~inside] == 0.0)
+
+    def test_ridge_casts_shadow(self):
+        # 200m wall running north-south, 1km east of the TX
+        def terrain(lat, lon):
+            east_m = (lon + 122.0) * 111320.0 * np.cos(np.radians(45.0))
+            return np.where((east_m > 950) & (east_m < 1050), 300.0, 100.0)
+
+        tm = make_tile_manager(terrain)
+        grid, lats, lons = calculate_viewshed_radial(tm, 45.0, -122.0, 10.0, 3000, resolution_m=50)
+
+        r = np.argmin(np.abs(lats - 45.0))
+        east_m = (lons + 122.0) * 111320.0 * np.cos(np.radians(45.0))
+
+        # West side and the wall face are visible, the lee side is not
+        assert np.all(grid[r, (east_m < -100) & (east_m > -2900)] == 1.0)
+        assert np.all(grid[r, (east_m > 1200) & (east_m < 2900)] == 0.0)
+
+    def test_sweep_respects_rx_height(self):
+        # Single raster row: TX at column 0, 5m bump at column 5
+        elev = np.zeros((1, 11))
+        elev[0, 5] = 5.0
+        dist = np.arange(11, dtype=np.float64)[None, :] * 100.0
+
+        low = _radial_sweep(elev, dist, 0, 0, tx_alt=2.0, rx_h=1.0, k_factor=1e9)
+        high = _radial_sweep(elev, dist, 0, 0, tx_alt=2.0, rx_h=50.0, k_factor=1e9)
+
+        assert not low[0, 8]
+        assert high[0, 8]
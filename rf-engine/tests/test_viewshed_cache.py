@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from viewshed_cache import (
+    KIND_RSSI, KIND_VISIBILITY, decode_viewshed, encode_viewshed, viewshed_key
+)
+
+
+def test_visibility_round_trip_is_bit_packed():
+    lats = np.linspace(45.0, 45.1, 37)
+    lons = np.linspace(-122.1, -122.0, 41)
+    grid = (np.random.default_rng(1).random((37, 41)) > 0.5).astype(np.float64)
+
+    payload = encode_viewshed(grid, lats, lons, 123.4, KIND_VISIBILITY)
+    entry = decode_viewshed(payload)
+
+    assert len(payload) < grid.size // 8 + (37 + 41) * 8 + 32
+    np.testing.assert_array_equal(entry.grid, grid)
+    np.testing.assert_array_equal(entry.lats, lats)
+    np.testing.assert_array_equal(entry.lons, lons)
+    assert entry.elevation == pytest.approx(123.4, abs=1e-4)
+
+
+def test_rssi_round_trip_keeps_nan():
+    grid = np.full((5, 6), np.nan, dtype=np.float32)
+    grid[1:4, 2:5] = -87.25
+    entry = decode_viewshed(encode_viewshed(grid, np.arange(5.0), np.arange(6.0), 0.0, KIND_RSSI))
+    np.testing.assert_array_equal(entry.grid, grid)
+
+
+def test_rejects_foreign_payload():
+    with pytest.raises(ValueError):
+        decode_viewshed(b"MRFT" + bytes(64))
+
+
+def test_key_is_stable_across_number_types():
+    a = viewshed_key({"lat": 45, "height": 10.0, "mode": "rssi"}, "ds")
+    b = viewshed_key({"mode": "rssi", "height": 10, "lat": 45.00000000001}, "ds")
+    assert a == b
+    assert a != viewshed_key({"lat": 45, "height": 10.0, "mode": "rssi"}, "other")
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class DecodedTile:
+    """
+    Elevation tile decoded once and kept as a float32 array.
+    grid[j, i] holds the sample at longitude index j and latitude index i,
+    matching the order tiles are fetched in.
+    bounds: (west, south, east, north) in degrees.
+    """
+    __slots__ = ("grid", "bounds")
+
+    def __init__(self, grid, bounds):
+        self.grid = np.ascontiguousarray(grid, dtype=np.float32)
+        self.bounds = tuple(float(b) for b in bounds)
+
+    @property
+    def nbytes(self):
+        return self.grid.nbytes
+
+
+class TileLRUCache:
+    """
+    Bounded, thread-safe in-process cache of decoded tiles.
+    Sits in front of Redis so a tile is decoded once per process rather than
+    once per lookup. Evicts least recently used entries when either the
+    tile count or the byte budget is exceeded.
+    """
+
+    def __init__(self, max_tiles=4096, max_bytes=64 * 1024 * 1024):
+        self.max_tiles = max_tiles
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            tile = self._entries.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def peek(self, key):
+        """
+        Lookup without touching recency or hit/miss counters.
+        """
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, tile):
+        if self.max_tiles <= 0 or tile.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = tile
+            self._bytes += tile.nbytes
+            while len(self._entries) > self.max_tiles or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "tiles": len(self._entries),
+                "bytes": self._bytes,
+                "max_tiles": self.max_tiles,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
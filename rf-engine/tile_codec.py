@@ -0,0 +1,106 @@
+import struct
+from collections import namedtuple
+
+import msgpack
+import numpy as np
+
+# Binary elevation tile layout (little-endian):
+#   magic    4s   b"MRFT"
+#   version  u8   FORMAT_VERSION
+#   dtype    u8   DTYPE_INT16 / DTYPE_FLOAT32
+#   zoom     u8
+#   (pad)    x
+#   x, y     u32, u32
+#   rows     u16  samples along longitude (grid axis 0)
+#   cols     u16  samples along latitude  (grid axis 1)
+#   scale    f32  elevation = raw * scale + offset (int16 only)
+#   offset   f32
+#   (pad)    4x   keeps the payload 8-byte aligned
+# followed by rows * cols samples.
+MAGIC = b"MRFT"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBBxIIHHff4x")
+
+DTYPE_INT16 = 1
+DTYPE_FLOAT32 = 2
+_NUMPY_DTYPES = {DTYPE_INT16: np.dtype("<i2"), DTYPE_FLOAT32: np.dtype("<f4")}
+_DTYPE_NAMES = {"int16": DTYPE_INT16, "float32": DTYPE_FLOAT32}
+
+INT16_SCALE = 0.1  # decimeters
+INT16_NODATA = -32768
+
+TileHeader = namedtuple("TileHeader", ["version", "dtype", "zoom", "x", "y", "rows", "cols", "scale", "offset"])
+
+
+def is_binary_tile(payload):
+    return payload is not None and bytes(payload[:4]) == MAGIC
+
+
+def encode_tile(grid, zoom, x, y, dtype="int16"):
+    """
+    Pack an elevation grid into the binary tile format.
+    int16 stores decimeters relative to a per-tile offset and falls back to
+    float32 when the tile's relief does not fit in 16 bits.
+    """
+    grid = np.asarray(grid, dtype=np.float32)
+    rows, cols = grid.shape
+    code = _DTYPE_NAMES.get(dtype)
+    if code is None:
+        raise ValueError(f"Unsupported tile dtype '{dtype}'")
+
+    scale, offset = 1.0, 0.0
+    if code == DTYPE_INT16:
+        finite = grid[np.isfinite(grid)]
+        offset = float(np.floor(finite.min())) if finite.size else 0.0
+        span = (float(finite.max()) - offset) if finite.size else 0.0
+        if span / INT16_SCALE > 32767:
+            code = DTYPE_FLOAT32
+        else:
+            scale = INT16_SCALE
+            raw = np.rint((grid - offset) / scale)
+            raw = np.where(np.isfinite(grid), raw, INT16_NODATA)
+            payload = raw.astype("<i2").tobytes()
+
+    if code == DTYPE_FLOAT32:
+        scale, offset = 1.0, 0.0
+        payload = grid.astype("<f4").tobytes()
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, code, zoom, x, y, rows, cols, scale, offset)
+    return header + payload
+
+
+def decode_tile(payload):
+    """
+    Unpack a binary tile. Returns (TileHeader, float32 grid).
+    float32 tiles are returned as a zero-copy view over the payload.
+    """
+    magic, version, code, zoom, x, y, rows, cols, scale, offset = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a binary elevation tile")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported tile format version {version}")
+
+    raw = np.frombuffer(payload, dtype=_NUMPY_DTYPES[code], count=rows * cols, offset=HEADER.size)
+    raw = raw.reshape((rows, cols))
+
+    if code == DTYPE_INT16:
+        grid = raw.astype(np.float32) * np.float32(scale) + np.float32(offset)
+        grid[raw == INT16_NODATA] = np.nan
+    else:
+        grid = raw
+
+    return TileHeader(version, code, zoom, x, y, rows, cols, scale, offset), grid
+
+
+def decode_legacy_tile(payload, size=16):
+    """
+    Read a pre-binary msgpack {"elevation": [floats]} entry into a grid.
+    Returns None when the entry is malformed.
+    """
+    data = msgpack.unpackb(payload)
+    if not data or 'elevation' not in data:
+        return None
+    raw_elev = np.array([e if e is not None else 0.0 for e in data['elevation']], dtype=np.float32)
+    if raw_elev.size != size * size:
+        return None
+    return raw_elev.reshape((size, size))
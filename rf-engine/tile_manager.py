@@ -1,21 +1,73 @@
 import requests
-import msgpack
 import mercantile
 import numpy as np
 import logging
+import math
 import os
+import time
 import scipy.ndimage
-import threading
+import contextlib
+import contextvars
+from collections import namedtuple
 from concurrent.futures import ThreadPoolExecutor
 from requests.adapters import HTTPAdapter
+from tile_cache import DecodedTile, TileLRUCache
+from elevation_backends import create_backend
+from single_flight import SingleFlight, RedisLease
+from circuit_breaker import CircuitBreaker
+from tile_codec import encode_tile, decode_tile, decode_legacy_tile, is_binary_tile
 
 logger = logging.getLogger(__name__)
 
+EARTH_CIRCUMFERENCE_M = 40075016.686
+
+# Tile keys that could not be loaded during the current request
+_degraded_tiles = contextvars.ContextVar('degraded_tiles', default=None)
+
+class TileLevel(namedtuple('TileLevel', ['zoom', 'size'])):
+    """
+    One resolution of the elevation pyramid: web-mercator zoom plus the
+    number of samples per tile side.
+    """
+    __slots__ = ()
+
+    def spacing_m(self, lat=0.0):
+        return EARTH_CIRCUMFERENCE_M * math.cos(math.radians(lat)) / (1 << self.zoom) / (self.size - 1)
+
+def parse_tile_pyramid(spec):
+    """
+    Parse "zoom/size,zoom/size,..." (e.g. "10/16,12/64") into TileLevels.
+    """
+    levels = []
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        zoom, size = part.strip().split('/')
+        levels.append(TileLevel(int(zoom), int(size)))
+    return levels
+
 class TileManager:
     def __init__(self, redis_client):
         self.redis = redis_client
-        self.zoom = 12  # Standard zoom level for 30m resolution approx
+
+        # Single level by default: 16x16 samples at zoom 12 (~600m spacing).
+        # TILE_PYRAMID replaces it with several levels so coarse requests
+        # read low-res tiles and link profiles read the finest one.
+        levels = parse_tile_pyramid(os.environ.get('TILE_PYRAMID', ''))
+        if not levels:
+            levels = [TileLevel(
+                int(os.environ.get('TILE_ZOOM', 12)),
+                int(os.environ.get('TILE_SIZE', 16))
+            )]
+        # Coarsest first
+        self.levels = sorted(set(levels), key=lambda lvl: -lvl.spacing_m())
+        self.default_level = self.levels[-1]
+        self.zoom = self.default_level.zoom
+        self.tile_size = self.default_level.size
+
         self.ttl = 30 * 24 * 60 * 60  # 30 Days
+        # Redis tile encoding: int16 decimeters (compact) or float32 (lossless)
+        self.storage_dtype = os.environ.get('TILE_STORAGE_DTYPE', 'int16')
         
         # Connection pooling for high concurrency
         self.session = requests.Session()
@@ -26,10 +78,344 @@ class TileManager:
         # Separate executors to prevent deadlocks
         self.tile_executor = ThreadPoolExecutor(max_workers=10, thread_name_prefix='tile_')
         self.batch_executor = ThreadPoolExecutor(max_workers=30, thread_name_prefix='batch_')
-        
-        # Request coalescing to prevent thundering herd
-        self.tile_locks = {}
-        self.global_lock = threading.Lock()
+
+        # Where tile misses are sampled from
+        self.backend = create_backend(self.session, self.batch_executor)
+
+        # Failed fetches are remembered briefly and a dead backend fails fast
+        # instead of costing a timeout per tile
+        self.negative_ttl = int(os.environ.get('TILE_NEGATIVE_TTL', 60))
+        self.breaker = CircuitBreaker(
+            self.backend.name,
+            error_rate=float(os.environ.get('BREAKER_ERROR_RATE', 0.5)),
+            min_calls=int(os.environ.get('BREAKER_MIN_CALLS', 5)),
+            open_seconds=float(os.environ.get('BREAKER_OPEN_SECONDS', 30))
+        )
+        
+        # Request coalescing to prevent thundering herd: one fetch per tile
+        # in this process, and (optionally) one per tile across processes
+        self.inflight = SingleFlight()
+        self.lease = None
+        if os.environ.get('TILE_FETCH_LEASE', '1') == '1':
+            self.lease = RedisLease(self.redis, ttl_ms=int(os.environ.get('TILE_LEASE_TTL_MS', 15000)))
+
+        # Per-process L1 of decoded tiles in front of Redis (shared L2)
+        self.tile_cache = TileLRUCache(
+            max_tiles=int(os.environ.get('TILE_CACHE_MAX_TILES', 4096)),
+            max_bytes=int(os.environ.get('TILE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        )
+
+        # 16-sample tiles written before keys carried their resolution are
+        # also looked up under their old key while any remain in Redis
+        self.legacy_check_seconds = float(os.environ.get('TILE_LEGACY_CHECK_SECONDS', 600))
+        self._legacy_checked = (None, True) # (monotonic time, old keys remain)
+
+    def legacy_keys_remain(self):
+        """
+        Whether Redis still holds tiles under the old tile:{z}:{x}:{y} key.
+        SCANs tile:* (stopping at the first old key) at most once every
+        legacy_check_seconds; until a scan finds none, misses at size 16 pay
+        a second MGET for the old keys.
+        """
+        checked_at, remain = self._legacy_checked
+        now = time.monotonic()
+        if checked_at is not None and now - checked_at < self.legacy_check_seconds:
+            return remain
+        try:
+            remain = any(
+                (key.decode() if isinstance(key, bytes) else key).count(":") == 3
+                for key in self.redis.scan_iter(match="tile:*", count=1000)
+            )
+        except Exception as e:
+            logger.warning(f"Legacy tile key check failed: {e}")
+            remain = True
+        self._legacy_checked = (now, remain)
+        return remain
+
+    def select_level(self, resolution_m=None, lat=0.0):
+        """
+        Pick the coarsest pyramid level whose sample spacing still meets
+        resolution_m. Without a resolution (link profiles, point lookups)
+        the finest level is used.
+        """
+        if resolution_m is None:
+            return self.default_level
+        for level in self.levels:
+            if level.spacing_m(lat) <= resolution_m:
+                return level
+        return self.default_level
+
+    def _level_size(self, zoom):
+        for level in self.levels:
+            if level.zoom == zoom:
+                return level.size
+        return self.tile_size
+
+    @staticmethod
+    def _tile_key(zoom, x, y, size):
+        return f"tile:{zoom}:{x}:{y}:{size}"
+
+    def get_tile(self, tile_x, tile_y, zoom=None, size=None):
+        """
+        Returns the decoded tile (float32 grid + bounds), or None if the tile
+        could not be loaded. Checks the in-process cache before Redis.
+        """
+        return self.get_tiles([(tile_x, tile_y)], zoom, size)[0]
+
+    def get_tiles(self, tile_coords, zoom=None, size=None):
+        """
+        Bulk tile loader. tile_coords: list of (x, y) at one zoom level.
+        Returns a list of DecodedTile (or None) in the same order.
+
+        1. In-process cache
+        2. One MGET for everything not in memory (plus negative-cache markers)
+        3. Coalesced upstream fetch for the Redis misses only
+        4. One pipelined SETEX for fetched (and migrated legacy) tiles
+        Tiles that could not be loaded are reported via track_degraded().
+        """
+        zoom = zoom if zoom is not None else self.zoom
+        size = size if size is not None else self._level_size(zoom)
+        keys = [self._tile_key(zoom, x, y, size) for x, y in tile_coords]
+        tiles = [self.tile_cache.get(key) for key in keys]
+
+        pending = [i for i, tile in enumerate(tiles) if tile is None]
+        if not pending:
+            return tiles
+
+        writes = []
+        missing = []
+        lookup = self.redis.mget(
+            [keys[i] for i in pending] + [f"tile_neg:{keys[i]}" for i in pending]
+        )
+        payloads = lookup[:len(pending)]
+        failed_recently = {i for i, marker in zip(pending, lookup[len(pending):]) if marker}
+
+        # Entries written before tile keys carried their resolution
+        migrate = set()
+        if size == 16:
+            legacy = [i for i, packed in zip(pending, payloads) if not packed]
+            if legacy and self.legacy_keys_remain():
+                legacy_payloads = dict(zip(legacy, self.redis.mget(
+                    [f"tile:{zoom}:{tile_coords[i][0]}:{tile_coords[i][1]}" for i in legacy]
+                )))
+                migrate = {i for i, packed in legacy_payloads.items() if packed}
+                payloads = [packed or legacy_payloads.get(i) for i, packed in zip(pending, payloads)]
+
+        for i, packed in zip(pending, payloads):
+            grid = self._decode_cached_tile(packed, size) if packed else None
+            if grid is None:
+                if i not in failed_recently:
+                    missing.append(i)
+                continue
+            if i in migrate or not is_binary_tile(packed):
+                # Legacy key or legacy encoding: rewrite under the new key
+                writes.append((keys[i], grid, tile_coords[i]))
+            tiles[i] = self._make_tile(grid, *tile_coords[i], zoom)
+            self.tile_cache.put(keys[i], tiles[i])
+
+        futures = [
+            self.tile_executor.submit(self._fetch_missing_tile, keys[i], *tile_coords[i], zoom, size)
+            for i in missing
+        ]
+        for i, future in zip(missing, futures):
+            tiles[i], fetched_grid = future.result()
+            if fetched_grid is not None:
+                writes.append((keys[i], fetched_grid, tile_coords[i]))
+
+        if writes:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, grid, (x, y) in writes:
+                pipe.setex(key, self.ttl, encode_tile(grid, zoom, x, y, dtype=self.storage_dtype))
+            pipe.execute()
+
+        degraded = _degraded_tiles.get()
+        if degraded is not None:
+            degraded.update(keys[i] for i, tile in enumerate(tiles) if tile is None)
+
+        return tiles
+
+    @contextlib.contextmanager
+    def track_degraded(self):
+        """
+        Collect the keys of tiles that failed to load (and were read as 0m)
+        while the block runs:
+
+            with tile_manager.track_degraded() as degraded:
+                ...
+            response["degraded_tiles"] = sorted(degraded)
+        """
+        degraded = set()
+        token = _degraded_tiles.set(degraded)
+        try:
+            yield degraded
+        finally:
+            _degraded_tiles.reset(token)
+
+    def _fetch_missing_tile(self, tile_key, tile_x, tile_y, zoom, size):
+        """
+        Upstream fetch for a tile that missed Redis. Concurrent callers in this
+        process share one fetch (single-flight); with the Redis lease enabled,
+        other processes wait for the lease holder instead of fetching too.
+        Returns (tile, grid) where grid is only set when this call fetched the
+        tile and it still has to be written to Redis.
+        """
+        (tile, grid), leader = self.inflight.do(
+            tile_key, lambda: self._fetch_tile_once(tile_key, tile_x, tile_y, zoom, size)
+        )
+        return tile, (grid if leader else None)
+
+    def _fetch_tile_once(self, tile_key, tile_x, tile_y, zoom, size):
+        # A previous flight may have finished between our MGET and now
+        tile = self.tile_cache.peek(tile_key)
+        if tile is not None:
+            return tile, None
+
+        if self.lease is None:
+            return self._fetch_and_wrap(tile_key, tile_x, tile_y, zoom, size)
+
+        token = self.lease.acquire(tile_key)
+        if token is None:
+            # Another process is fetching this tile: wait for it to land in Redis
+            grid = self.lease.wait(tile_key, lambda: self._get_tile_from_cache(tile_key, size))
+            if grid is not None:
+                tile = self._make_tile(grid, tile_x, tile_y, zoom)
+                self.tile_cache.put(tile_key, tile)
+                return tile, None
+            # The holder's fetch failed: honour its negative marker
+            if self.redis.exists(f"tile_neg:{tile_key}"):
+                return None, None
+            # Holder expired; take over, or give up if someone else already did
+            token = self.lease.acquire(tile_key)
+            if token is None:
+                return None, None
+
+        try:
+            tile, grid = self._fetch_and_wrap(tile_key, tile_x, tile_y, zoom, size)
+            if grid is not None:
+                # Publish right away so lease waiters can stop polling
+                self._cache_tile(tile_key, grid, tile_x, tile_y, zoom)
+            return tile, None
+        finally:
+            if token is not None:
+                self.lease.release(tile_key, token)
+
+    def _fetch_and_wrap(self, tile_key, tile_x, tile_y, zoom, size):
+        if not self.breaker.allow():
+            logger.warning(f"Elevation backend '{self.backend.name}' circuit open; skipping tile {tile_key}")
+            return None, None
+
+        logger.info(f"Cache miss for tile {tile_key}. Fetching from {self.backend.name}.")
+        try:
+            grid = self._fetch_tile_from_backend(tile_x, tile_y, zoom, size)
+        except Exception as e:
+            logger.error(f"Elevation backend error for tile {tile_key}: {e}")
+            grid = None
+
+        if grid is None:
+            self.breaker.record_failure()
+            self.redis.setex(f"tile_neg:{tile_key}", self.negative_ttl, b"1")
+            return None, None
+
+        self.breaker.record_success()
+        tile = self._make_tile(grid, tile_x, tile_y, zoom)
+        self.tile_cache.put(tile_key, tile)
+        return tile, grid
+
+    def count_tiles(self, bbox, zoom=None):
+        west, south, east, north = bbox
+        zoom = zoom if zoom is not None else self.zoom
+        return sum(1 for _ in mercantile.tiles(west, south, east, north, zooms=zoom))
+
+    def prefetch(self, bbox, zoom=None, size=None, concurrency=8, progress_cb=None):
+        """
+        Warm Redis with every tile covering bbox (west, south, east, north).
+        Tiles already in Redis are skipped (one pipelined EXISTS); the rest
+        are fetched `concurrency` at a time through the normal coalesced path,
+        so a warm-up running next to live scans never double-fetches a tile.
+
+        progress_cb(done, total, stats) is called after each fetched tile; if
+        it raises, tiles not yet started are dropped and the error propagates.
+        Returns a summary dict with a tiles/sec throughput figure.
+        """
+        import time
+        from concurrent.futures import as_completed
+
+        west, south, east, north = bbox
+        zoom = zoom if zoom is not None else self.zoom
+        size = size if size is not None else self._level_size(zoom)
+        coords = [(t.x, t.y) for t in mercantile.tiles(west, south, east, north, zooms=zoom)]
+        keys = [self._tile_key(zoom, x, y, size) for x, y in coords]
+
+        # Legacy keys count as cached, as in get_tiles (migrated on first read)
+        legacy = size == 16 and self.legacy_keys_remain()
+        pipe = self.redis.pipeline(transaction=False)
+        for key, (x, y) in zip(keys, coords):
+            if legacy:
+                pipe.exists(key, f"tile:{zoom}:{x}:{y}")
+            else:
+                pipe.exists(key)
+        present = pipe.execute()
+        missing = [i for i, exists in enumerate(present) if not exists]
+
+        stats = {
+            "zoom": zoom,
+            "size": size,
+            "total": len(keys),
+            "cached": len(keys) - len(missing),
+            "fetched": 0,
+            "failed": 0,
+            "elapsed_s": 0.0,
+            "tiles_per_sec": 0.0
+        }
+        logger.info(f"Prefetch z{zoom}: {stats['total']} tiles, {stats['cached']} already cached")
+
+        def fetch(i):
+            tile, grid = self._fetch_missing_tile(keys[i], *coords[i], zoom, size)
+            if grid is not None:
+                self._cache_tile(keys[i], grid, *coords[i], zoom)
+            return tile is not None
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='prefetch_') as pool:
+            futures = [pool.submit(fetch, i) for i in missing]
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    try:
+                        ok = future.result()
+                    except Exception as e:
+                        logger.error(f"Prefetch tile failed: {e}")
+                        ok = False
+                    stats["fetched" if ok else "failed"] += 1
+                    elapsed = time.monotonic() - start
+                    stats["elapsed_s"] = round(elapsed, 2)
+                    stats["tiles_per_sec"] = round(done / elapsed, 2) if elapsed > 0 else 0.0
+                    if progress_cb:
+                        progress_cb(done, len(missing), stats)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        logger.info(
+            f"Prefetch z{zoom} done: {stats['fetched']} fetched, {stats['failed']} failed "
+            f"in {stats['elapsed_s']}s ({stats['tiles_per_sec']} tiles/s)"
+        )
+        return stats
+
+    def cache_stats(self):
+        return self.tile_cache.stats()
+
+    def backend_stats(self):
+        return self.breaker.stats()
+
+    def dataset_fingerprint(self):
+        """
+        Identifies the terrain results are computed from: backend, dataset,
+        tile levels and storage precision. Part of derived-result cache keys.
+        """
+        levels = ",".join(f"{lvl.zoom}/{lvl.size}" for lvl in self.levels)
+        dataset = getattr(self.backend, 'dataset', '')
+        return f"{self.backend.name}:{dataset}:{levels}:{self.storage_dtype}"
 
     def get_tile_data(self, lat=None, lon=None, tile_x=None, tile_y=None, zoom=None):
         """
@@ -41,260 +427,219 @@ class TileManager:
             tile = mercantile.tile(lon, lat, self.zoom)
             tile_x, tile_y, zoom = tile.x, tile.y, self.zoom
         
-        zoom = zoom if zoom is not None else self.zoom
-        tile_key = f"tile:{zoom}:{tile_x}:{tile_y}"
-        
-        # 1. Fast check cache
-        data = self._get_tile_from_cache(tile_key)
-        if data:
-            return data
-            
-        # 2. Cache miss - use lock to prevent redundant fetches
-        with self.global_lock:
-            if tile_key not in self.tile_locks:
-                self.tile_locks[tile_key] = threading.Lock()
-            lock = self.tile_locks[tile_key]
-            
-        with lock:
-            # Double check cache inside lock
-            data = self._get_tile_from_cache(tile_key)
-            if data:
-                return data
-                
-            logger.info(f"Cache miss for tile {tile_key}. Fetching from API.")
-            data = self._fetch_tile_from_api(tile_x, tile_y, zoom)
-            if data:
-                self._cache_tile(tile_key, data)
-        
-        return data
+        tile = self.get_tile(tile_x, tile_y, zoom)
+        if tile is None:
+            return None
+        return {"elevation": tile.grid.ravel().tolist()}
 
     def get_elevation(self, lat, lon):
         """
         Get elevation for a specific coordinate. 
         Transparently handles caching and fetching tiles.
         """
-        logger.info(f"Getting elevation for lat={lat}, lon={lon}")
         tile = mercantile.tile(lon, lat, self.zoom)
-        logger.info(f"Tile coordinates: x={tile.x}, y={tile.y}, z={self.zoom}")
-        data = self.get_tile_data(lat=lat, lon=lon)
+        decoded = self.get_tile(tile.x, tile.y, self.zoom)
         
-        if data:
-            logger.info(f"Got tile data, first 5 elevation values: {data.get('elevation', [])[:5] if 'elevation' in data else 'NO ELEVATION KEY'}")
-            result = self._extract_elevation_from_tile(data, lat, lon, tile)
-            logger.info(f"Extracted elevation: {result}")
-            return result
-        logger.warning("No tile data returned!")
+        if decoded is not None:
+            return self._extract_elevation_from_tile(decoded, lat, lon)
+        logger.warning(f"No tile data returned for lat={lat}, lon={lon}")
         return 0.0
 
-    def get_elevation_profile(self, lat1, lon1, lat2, lon2, samples=50):
+    def get_elevation_profile(self, lat1, lon1, lat2, lon2, samples=50, resolution_m=None):
         """
         Get elevation profile along a path between two points (Batch optimized).
+        Reads the finest pyramid level unless resolution_m asks for less.
         """
         lats = np.linspace(lat1, lat2, samples)
         lons = np.linspace(lon1, lon2, samples)
-        coords = list(zip(lats, lons))
         
-        return self.get_elevations_batch(coords)
+        return self.get_elevations_batch(np.column_stack((lats, lons)), resolution_m=resolution_m)
 
+    def get_elevation_profiles(self, starts, ends, samples=50, resolution_m=None):
+        """
+        Profiles for many paths in one batch lookup.
+        starts, ends: (M, 2) arrays of (lat, lon). Returns an (M, samples) array,
+        row i matching get_elevation_profile(*starts[i], *ends[i], samples).
+        """
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+        if len(starts) == 0:
+            return np.zeros((0, samples))
+        lats = np.linspace(starts[:, 0], ends[:, 0], samples, axis=-1)
+        lons = np.linspace(starts[:, 1], ends[:, 1], samples, axis=-1)
 
+        elevs = self.get_elevations_batch(np.column_stack((lats.ravel(), lons.ravel())), resolution_m=resolution_m)
+        return np.asarray(elevs).reshape(len(starts), samples)
 
-    def _fetch_tile_from_api(self, x, y, z):
+    def get_elevation_grid(self, lats, lons, resolution_m=None):
         """
-        Fetch elevation data from OpenTopoData API.
-        Supports custom OpenTopoData instances via ELEVATION_API_URL env variable.
-        Falls back to public OpenTopoData (api.opentopodata.org) if not set.
-        
-        OpenTopoData supports batch requests (up to 100 points per call),
-        which reduces API calls significantly compared to individual point queries.
+        Load a terrain window as a raster in a single batch lookup.
+        Returns a (len(lats), len(lons)) numpy array where grid[r, c] is the
+        elevation at (lats[r], lons[c]).
+        The pyramid level follows the raster spacing unless resolution_m is given.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if resolution_m is None and len(lats) > 1 and len(lons) > 1:
+            mid_lat = float(np.mean(lats))
+            resolution_m = min(
+                abs(lats[1] - lats[0]) * 111320.0,
+                abs(lons[1] - lons[0]) * 111320.0 * math.cos(math.radians(mid_lat))
+            )
+
+        lat_grid, lon_grid = np.meshgrid(lats, lons, indexing='ij')
+        coords = np.column_stack((lat_grid.ravel(), lon_grid.ravel()))
+        return self.get_elevations_batch(coords, resolution_m=resolution_m).reshape(lat_grid.shape)
+
+    def _fetch_tile_from_backend(self, x, y, z, size):
+        """
+        Sample the tile's size x size grid from the configured elevation backend
+        (OpenTopoData HTTP or local DEM files, see ELEVATION_BACKEND).
+        Returns the grid indexed [lon, lat] or None on failure.
         """
         bounds = mercantile.bounds(x, y, z)
         lat_min, lat_max = bounds.south, bounds.north
         lon_min, lon_max = bounds.west, bounds.east
         
-        base_url = os.environ.get('ELEVATION_API_URL', 'http://opentopodata:5000')
-        dataset = os.environ.get('ELEVATION_DATASET', 'srtm30m')
-        
-        # Create 16x16 grid of coordinates
-        lats = np.linspace(lat_min, lat_max, 16)
-        lons = np.linspace(lon_min, lon_max, 16)
+        # Create size x size grid of coordinates
+        lats = np.linspace(lat_min, lat_max, size)
+        lons = np.linspace(lon_min, lon_max, size)
         
         lat_grid, lon_grid = np.meshgrid(lats, lons)
-        lat_flat = lat_grid.flatten()
-        lon_flat = lon_grid.flatten()
-        
-        # OpenTopoData supports up to 100 locations per request
-        # We have 256 points (16x16), so split into 3 batches: 100, 100, 56
-        batch_size = 100
-        
-        batches = []
-        for i in range(0, len(lat_flat), batch_size):
-            batch_lats = lat_flat[i:i + batch_size]
-            batch_lons = lon_flat[i:i + batch_size]
-            locations = "|".join([f"{lat},{lon}" for lat, lon in zip(batch_lats, batch_lons)])
-            batches.append(locations)
-            
-        url = f"{base_url}/v1/{dataset}"
-        
-        def fetch_batch(locations, batch_num):
-            try:
-                # No artificial delay needed for local deployments
-                response = self.session.get(
-                    url,
-                    params={'locations': locations},
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('status') == 'OK' and 'results' in data:
-                        return [result.get('elevation', 0.0) for result in data['results']]
-                    else:
-                        error_msg = data.get('error', 'Unknown error')
-                        logger.error(f"OpenTopoData batch {batch_num} error: {error_msg}")
-                        return None
-                elif response.status_code == 404:
-                    logger.error(f"Dataset '{dataset}' not found. Check ELEVATION_DATASET env var and data files.")
-                    return None
-                else:
-                    logger.warning(f"OpenTopoData batch {batch_num} failed with status {response.status_code}")
-                    return None
-                    
-            except requests.exceptions.Timeout:
-                logger.error(f"OpenTopoData request timed out for batch {batch_num}")
-                return None
-            except requests.exceptions.ConnectionError:
-                logger.error(f"Cannot connect to OpenTopoData at {base_url}. Is the container running?")
-                return None
-            except Exception as e:
-                logger.error(f"Exception fetching OpenTopoData batch {batch_num}: {e}")
-                return None
-
-        # Execute batches in parallel
-        futures = [self.batch_executor.submit(fetch_batch, locs, i) for i, locs in enumerate(batches)]
-        
-        all_elevations = []
-        for future in futures:
-            batch_result = future.result()
-            if batch_result is None:
-                return None
-            all_elevations.extend(batch_result)
-        
-        if len(all_elevations) == 256:
-            logger.info(f"Successfully fetched elevation data from OpenTopoData ({dataset}): min={min(all_elevations):.1f}m, max={max(all_elevations):.1f}m")
-            return {"elevation": all_elevations}
-        else:
-            logger.error(f"Expected 256 elevation points, got {len(all_elevations)}")
+        elevations = self.backend.fetch_points(lat_grid.flatten(), lon_grid.flatten())
+        if elevations is None:
             return None
 
+        logger.info(f"Fetched tile {z}/{x}/{y} from {self.backend.name}: min={np.nanmin(elevations):.1f}m, max={np.nanmax(elevations):.1f}m")
+        return elevations.reshape((size, size))
+
     def get_interpolated_grid(self, x, y, z, size=256):
         """
         Returns a (size, size) numpy array of elevation data for the tile.
-        Upscales the low-res 16x16 fetched data.
+        Upscales the fetched sample grid.
         """
-        data = self.get_tile_data(tile_x=x, tile_y=y, zoom=z)
-        if not data or 'elevation' not in data:
+        tile = self.get_tile(x, y, z)
+        if tile is None:
             return np.zeros((size, size))
-        
-        raw_elev = np.array(data['elevation'])
-        if raw_elev.size != 16*16:
-             return np.zeros((size, size))
              
-        grid_16 = raw_elev.reshape((16, 16)).T
-        grid_16 = np.flipud(grid_16)
+        samples = tile.grid.astype(np.float64).T
+        samples = np.flipud(samples)
         
-        zoom_factor = size / 16.0
-        high_res_grid = scipy.ndimage.zoom(grid_16, zoom_factor, order=1)
+        zoom_factor = size / samples.shape[0]
+        high_res_grid = scipy.ndimage.zoom(samples, zoom_factor, order=1)
         
         return high_res_grid
 
-    def get_elevations_batch(self, coords):
+    def get_elevations_batch(self, coords, resolution_m=None):
         """
-        Efficiently get elevations for a list of (lat, lon) coordinates.
-        Groups by tile and fetches required tiles in parallel.
+        Efficiently get elevations for (lat, lon) coordinates.
+        Accepts a list of pairs or an (N, 2) array and returns an (N,) ndarray.
+        Tile indices are computed with array math, points are bucketed per
+        unique tile and each bucket is interpolated in one vectorized gather.
+        resolution_m: coarsest acceptable sample spacing (selects pyramid level).
         """
+        points = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        results = np.zeros(len(points), dtype=np.float64)
+        if len(points) == 0:
+            return results
+
+        lats, lons = points[:, 0], points[:, 1]
+        level = self.select_level(resolution_m, lat=float(np.mean(lats)))
+        zoom = level.zoom
+
         # 1. Group coordinates by tile
-        tile_to_coords = {}
-        for lat, lon in coords:
-            tile = mercantile.tile(lon, lat, self.zoom)
-            tile_key = (tile.x, tile.y, self.zoom)
-            if tile_key not in tile_to_coords:
-                tile_to_coords[tile_key] = []
-            tile_to_coords[tile_key].append((lat, lon))
-            
-        # 2. Fetch all unique tiles in parallel
-        unique_tiles = list(tile_to_coords.keys())
-        tile_data_map = {}
-        
-        def fetch_single_tile(tx, ty, tz):
-            data = self.get_tile_data(tile_x=tx, tile_y=ty, zoom=tz)
-            return (tx, ty, tz), data
+        tile_x, tile_y = self._tile_indices(lats, lons, zoom)
+        tile_ids = tile_x * (1 << zoom) + tile_y
+        unique_ids, inverse = np.unique(tile_ids, return_inverse=True)
+
+        # 2. Load all unique tiles in bulk
+        unique_tiles = [(int(t >> zoom), int(t & ((1 << zoom) - 1))) for t in unique_ids]
+        tiles = self.get_tiles(unique_tiles, zoom, level.size)
+
+        # 3. Interpolate each tile's bucket of points at once
+        order = np.argsort(inverse, kind='stable')
+        buckets = np.split(order, np.cumsum(np.bincount(inverse))[:-1])
+        for tile, idx in zip(tiles, buckets):
+            if tile is not None:
+                results[idx] = self._interpolate_tile(tile, lats[idx], lons[idx])
 
-        futures = [self.tile_executor.submit(fetch_single_tile, tx, ty, tz) for tx, ty, tz in unique_tiles]
-        
-        for future in futures:
-            key, data = future.result()
-            tile_data_map[key] = data
-            
-        # 3. Extract elevations
-        results = []
-        for lat, lon in coords:
-            tile = mercantile.tile(lon, lat, self.zoom)
-            tile_key = (tile.x, tile.y, self.zoom)
-            data = tile_data_map.get(tile_key)
-            
-            if data:
-                # Need mercantile Tile object for extraction logic
-                elev = self._extract_elevation_from_tile(data, lat, lon, tile)
-                results.append(elev)
-            else:
-                results.append(0.0)
-                
         return results
 
-    def _cache_tile(self, key, data):
-        packed = msgpack.packb(data)
+    @staticmethod
+    def _tile_indices(lats, lons, zoom):
+        """
+        Vectorized equivalent of mercantile.tile for arrays of coordinates.
+        """
+        n = 1 << zoom
+        x = (np.asarray(lons, dtype=np.float64) + 180.0) / 360.0
+        sinlat = np.sin(np.radians(np.clip(lats, -85.051129, 85.051129)))
+        y = 0.5 - 0.25 * np.log((1.0 + sinlat) / (1.0 - sinlat)) / math.pi
+
+        tile_x = np.clip(np.floor(x * n), 0, n - 1).astype(np.int64)
+        tile_y = np.clip(np.floor(y * n), 0, n - 1).astype(np.int64)
+        return tile_x, tile_y
+
+    def _cache_tile(self, key, grid, x, y, z):
+        packed = encode_tile(grid, z, x, y, dtype=self.storage_dtype)
         self.redis.setex(key, self.ttl, packed)
 
-    def _get_tile_from_cache(self, key):
+    def _get_tile_from_cache(self, key, size):
         packed = self.redis.get(key)
-        if packed:
-            return msgpack.unpackb(packed)
-        return None
+        if not packed:
+            return None
+        return self._decode_cached_tile(packed, size)
+
+    def _decode_cached_tile(self, packed, size):
+        """
+        Decode a Redis entry. Legacy msgpack tiles are read transparently;
+        get_tiles rewrites them in the binary format on first use.
+        Returns None if the entry does not hold a size x size grid.
+        """
+        if is_binary_tile(packed):
+            grid = decode_tile(packed)[1]
+            return grid if grid.shape == (size, size) else None
+        return decode_legacy_tile(packed, size)
 
-    def _extract_elevation_from_tile(self, data, lat, lon, tile):
+    def _make_tile(self, grid, x, y, z):
         """
-        Performs bilinear interpolation on the 16x16 grid to find elevation at lat, lon.
+        Wrap an elevation grid with its tile bounds for interpolation.
         """
-        if not data or 'elevation' not in data:
+        bounds = mercantile.bounds(x, y, z)
+        grid = np.nan_to_num(np.asarray(grid, dtype=np.float32), nan=0.0)
+        return DecodedTile(grid, (bounds.west, bounds.south, bounds.east, bounds.north))
+
+    def _extract_elevation_from_tile(self, tile, lat, lon):
+        """
+        Performs bilinear interpolation on the tile grid to find elevation at lat, lon.
+        """
+        if tile is None:
             return 0.0
-            
-        raw_elev = np.array(data['elevation'])
-        if raw_elev.size != 256: 
-             return 0.0
-             
-        grid = raw_elev.reshape((16, 16))
-        
-        bounds = mercantile.bounds(tile)
-        lat_min, lat_max = bounds.south, bounds.north
-        lon_min, lon_max = bounds.west, bounds.east
+        return float(self._interpolate_tile(tile, np.array([lat]), np.array([lon]))[0])
+
+    def _interpolate_tile(self, tile, lats, lons):
+        """
+        Bilinear interpolation of many points inside one tile.
+        lats/lons: arrays of equal length. Returns an ndarray of elevations.
+        """
+        grid = tile.grid
+        lon_min, lat_min, lon_max, lat_max = tile.bounds
         
         if lat_max == lat_min or lon_max == lon_min: 
-            return 0.0
-        
-        u = (lat - lat_min) / (lat_max - lat_min) * 15.0
-        v = (lon - lon_min) / (lon_max - lon_min) * 15.0
+            return np.zeros(len(lats))
+
+        last = grid.shape[0] - 1
         
-        u = np.clip(u, 0, 15)
-        v = np.clip(v, 0, 15)
+        u = np.clip((lats - lat_min) / (lat_max - lat_min) * last, 0, last)
+        v = np.clip((lons - lon_min) / (lon_max - lon_min) * last, 0, last)
         
-        i = int(np.floor(u))
-        j = int(np.floor(v))
+        i = np.floor(u).astype(np.int64)
+        j = np.floor(v).astype(np.int64)
         
         u_ratio = u - i
         v_ratio = v - j
         
-        i_next = min(i + 1, 15)
-        j_next = min(j + 1, 15)
+        i_next = np.minimum(i + 1, last)
+        j_next = np.minimum(j + 1, last)
         
         p00 = grid[j, i]
         p10 = grid[j, i_next]
@@ -304,6 +649,4 @@ class TileManager:
         val_j = (p00 * (1 - u_ratio)) + (p10 * u_ratio)
         val_jnext = (p01 * (1 - u_ratio)) + (p11 * u_ratio)
         
-        final_elev = (val_j * (1 - v_ratio)) + (val_jnext * v_ratio)
-        
-        return float(final_elev)
+        return (val_j * (1 - v_ratio)) + (val_jnext * v_ratio)
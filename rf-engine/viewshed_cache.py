@@ -0,0 +1,128 @@
+import hashlib
+import json
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# Binary per-node viewshed layout (little-endian):
+#   magic      4s   b"MRFV"
+#   version    u8   FORMAT_VERSION
+#   kind       u8   KIND_VISIBILITY / KIND_RSSI
+#   (pad)      2x
+#   rows, cols u16, u16
+#   elevation  f32  ground elevation at the node
+# followed by rows lats (f64), cols lons (f64) and the grid:
+#   visibility: packed bits, one per cell (row-major)
+#   rssi:       rows * cols f32 dBm, NaN outside the radius
+MAGIC = b"MRFV"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBB2xHHf")
+
+KIND_VISIBILITY = 1
+KIND_RSSI = 2
+
+NodeViewshed = namedtuple("NodeViewshed", ["grid", "lats", "lons", "elevation"])
+
+
+def viewshed_key(params, dataset):
+    """
+    Content address of one node's viewshed: hash of everything the grid
+    depends on plus the terrain fingerprint. Floats are rounded so equal
+    inputs from JSON and Python hash alike.
+    """
+    canonical = {
+        k: round(float(v), 7) if isinstance(v, (int, float)) and not isinstance(v, bool) else v
+        for k, v in params.items()
+    }
+    canonical["dataset"] = dataset
+    blob = json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()
+    return f"viewshed:{hashlib.sha256(blob).hexdigest()}"
+
+
+def encode_viewshed(grid, lats, lons, elevation, kind):
+    rows, cols = len(lats), len(lons)
+    if kind == KIND_VISIBILITY:
+        payload = np.packbits(np.asarray(grid) > 0).tobytes()
+    elif kind == KIND_RSSI:
+        payload = np.asarray(grid, dtype="<f4").tobytes()
+    else:
+        raise ValueError(f"Unsupported viewshed kind {kind}")
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, kind, rows, cols, elevation)
+    return (
+        header
+        + np.asarray(lats, dtype="<f8").tobytes()
+        + np.asarray(lons, dtype="<f8").tobytes()
+        + payload
+    )
+
+
+def decode_viewshed(payload):
+    """
+    Returns a NodeViewshed: float64 0/1 grid for visibility, float32 dBm for rssi.
+    """
+    magic, version, kind, rows, cols, elevation = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a viewshed entry")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported viewshed format version {version}")
+
+    offset = HEADER.size
+    lats = np.frombuffer(payload, dtype="<f8", count=rows, offset=offset)
+    offset += rows * 8
+    lons = np.frombuffer(payload, dtype="<f8", count=cols, offset=offset)
+    offset += cols * 8
+    if kind == KIND_VISIBILITY:
+        bits = np.frombuffer(payload, dtype=np.uint8, count=(rows * cols + 7) // 8, offset=offset)
+        grid = np.unpackbits(bits, count=rows * cols).reshape(rows, cols).astype(np.float64)
+    elif kind == KIND_RSSI:
+        grid = np.frombuffer(payload, dtype="<f4", count=rows * cols, offset=offset).reshape(rows, cols)
+    else:
+        raise ValueError(f"Unsupported viewshed kind {kind}")
+    return NodeViewshed(grid, lats, lons, float(elevation))
+
+
+class ViewshedCache:
+    """
+    Per-node viewshed results in Redis, keyed by viewshed_key().
+    Entries expire after ttl seconds; a hit pushes the expiry out again so
+    nodes that keep being re-scanned stay while unused ones age out (Redis'
+    maxmemory policy handles eviction under memory pressure).
+    """
+
+    def __init__(self, redis_client, ttl=7 * 24 * 60 * 60, enabled=True):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.enabled = enabled and ttl > 0
+
+    def get_many(self, keys):
+        """
+        One MGET for all keys. Returns a NodeViewshed (or None) per key.
+        """
+        if not self.enabled or not keys:
+            return [None] * len(keys)
+        results = []
+        hits = []
+        for key, payload in zip(keys, self.redis.mget(keys)):
+            entry = None
+            if payload:
+                try:
+                    entry = decode_viewshed(payload)
+                    hits.append(key)
+                except (ValueError, struct.error):
+                    entry = None
+            results.append(entry)
+        if hits:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in hits:
+                pipe.expire(key, self.ttl)
+            pipe.execute()
+        return results
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def put(self, key, grid, lats, lons, elevation, kind):
+        if not self.enabled:
+            return
+        self.redis.setex(key, self.ttl, encode_viewshed(grid, lats, lons, elevation, kind))
@@ -0,0 +1,56 @@
+"""
+Pre-populate the elevation tile cache for a bounding box, e.g. a county
+before a field planning session:
+
+    python warm_cache.py --bbox -123.2 45.2 -122.3 45.8 --zoom 12
+
+Uses the same Redis / elevation backend settings as the engine
+(REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, ELEVATION_BACKEND, ...).
+"""
+import argparse
+import logging
+import os
+import sys
+
+import redis
+
+from tile_manager import TileManager
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm the elevation tile cache for a bounding box")
+    parser.add_argument("--bbox", nargs=4, type=float, required=True,
+                        metavar=("WEST", "SOUTH", "EAST", "NORTH"), help="Bounding box in degrees")
+    parser.add_argument("--zoom", type=int, default=None, help="Tile zoom (default: finest configured level)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent tile fetches")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the tiles covering the bbox")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    redis_client = redis.Redis(
+        host=os.environ.get("REDIS_HOST", "redis"),
+        port=int(os.environ.get("REDIS_PORT", 6379)),
+        db=0,
+        password=os.environ.get("REDIS_PASSWORD", "changeme")
+    )
+    tile_manager = TileManager(redis_client)
+
+    if args.dry_run:
+        print(f"{tile_manager.count_tiles(args.bbox, args.zoom)} tiles")
+        return 0
+
+    def report(done, total, stats):
+        print(f"\r{done}/{total} tiles  {stats['tiles_per_sec']:.1f} tiles/s  "
+              f"{stats['failed']} failed", end="", flush=True)
+
+    stats = tile_manager.prefetch(args.bbox, zoom=args.zoom, concurrency=args.concurrency, progress_cb=report)
+    print()
+    print(f"zoom {stats['zoom']}: {stats['total']} tiles, {stats['cached']} already cached, "
+          f"{stats['fetched']} fetched, {stats['failed']} failed in {stats['elapsed_s']}s "
+          f"({stats['tiles_per_sec']} tiles/s)")
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,7 +15,7 @@ celery_app = Celery(
     "meshrf_worker",
     broker=BROKER_URL,
     backend=BACKEND_URL,
-    include=["tasks.viewshed", "tasks.optimize"] # Pre-load modules
+    include=["tasks.viewshed", "tasks.optimize", "tasks.prefetch"] # Pre-load modules
 )
 
 celery_app.conf.update(
@@ -572,7 +572,7 @@ const MapComponent = () => {
         {/* Multi-Site Composite Overlay */}
         {compositeOverlay && compositeOverlay.bounds && (
           <ImageOverlay
-            url={`data:image/png;base64,${compositeOverlay.image}`}
+            url={`/api/artifacts/${compositeOverlay.image_id}`}
             bounds={[
               [compositeOverlay.bounds.north, compositeOverlay.bounds.west],
               [compositeOverlay.bounds.south, compositeOverlay.bounds.east]
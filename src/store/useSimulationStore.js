@@ -4,7 +4,7 @@ const useSimulationStore = create((set, get) => ({
   // --- State ---
   nodes: [], // List of candidate nodes: { id, lat, lon, height, name }
   results: null, // Results from batch scan
-  compositeOverlay: null, // { image, bounds } for union of visibility
+  compositeOverlay: null, // { image_id, bounds } for union of visibility (PNG at /api/artifacts/:id)
   interNodeLinks: null, // Pairwise link quality between selected nodes
   totalUniqueCoverageKm2: null, // Total unique coverage area (km²) of selected nodes union
   isScanning: false,